@@ -1,12 +1,24 @@
 import warnings
 
 from download_utils import DownloadUtils
+from modelos_utils import ModelosUtils
+from boveda_utils import BovedaMapeos
+from cache_utils import CacheResultados
+from desofuscar_utils import DesofuscadorStreaming, DesofuscarUtils, SesionesStreaming
+from diccionario_utils import GestorDiccionarios
+from inferencia_utils import ColaLlenaError, EjecutorInferencia, PlanificadorLotes, TiempoAgotadoError
+from preparacion_utils import PreparacionMotores
 warnings.filterwarnings("ignore", category=UserWarning)  # ignore warnings from CUDA
 
 import os
-from fastapi import FastAPI
+import codecs
+import json
+import uuid
+from typing import Optional
+from fastapi import FastAPI, Header, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
@@ -23,9 +35,18 @@ from opentelemetry.instrumentation.requests import RequestsInstrumentor
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Iniciando aplicación...")
-    # Descargar modelos
-    DownloadUtils().download_all()
+    # Validar los modelos aprovisionados en el build (descarga lo que falte salvo con MODELOS_OFFLINE=1)
+    DownloadUtils().asegurar()
+    ModelosUtils.configurar_hilos()
+    # Compilar los diccionarios y vigilar sus cambios; al recargarlos se invalida la caché
+    GestorDiccionarios.instancia().suscribir(CacheResultados.instancia().invalidar)
+    EjecutorInferencia.instancia()
+    # Precargar y calentar en segundo plano los motores indicados (el resto se
+    # construye en el primer uso); /ready responde 200 cuando terminan
+    PreparacionMotores.instancia().iniciar(obtener_ofuscador)
     yield
+    EjecutorInferencia.instancia().cerrar()
+    GestorDiccionarios.instancia().detener()
     print("🛑 Cerrando aplicación...")
 
 # --- FastAPI ---
@@ -73,63 +94,448 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(ColaLlenaError)
+async def cola_llena_handler(request: Request, exc: ColaLlenaError):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Servicio saturado, reintente más tarde"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(TiempoAgotadoError)
+async def tiempo_agotado_handler(request: Request, exc: TiempoAgotadoError):
+    return JSONResponse(
+        status_code=504,
+        content={"error": "La ofuscación superó el tiempo máximo"},
+        headers={"Retry-After": str(EjecutorInferencia.retry_after)},
+    )
+
+# Topes para lo que el cliente puede pedir por lote: cada proceso carga una copia del modelo
+LOTE_MAX_TAMANIO = int(os.getenv("OFUSCAR_LOTE_MAX_TAMANIO", "256"))
+LOTE_MAX_PROCESOS = int(os.getenv("OFUSCAR_LOTE_MAX_PROCESOS", "1"))
+# Hasta este largo, la detección sin NER y la reescritura corren en el event loop en lugar de encolarse
+INLINE_MAX_CARACTERES = int(os.getenv("OFUSCAR_INLINE_MAX_CARACTERES", "2000"))
+
 class TextoRequest(BaseModel):
     texto: str
     motor: str = "scrubadub"
+    incremental: bool = False
+    conversacion_id: Optional[str] = None
+
+class LoteRequest(BaseModel):
+    textos: list[str]
+    motor: str = "scrubadub"
+    tamanio_lote: Optional[int] = Field(None, ge=1, le=LOTE_MAX_TAMANIO)
+    procesos: Optional[int] = Field(None, ge=1, le=LOTE_MAX_PROCESOS)
+    conversacion_id: Optional[str] = None
+
+class FragmentoDesofuscarRequest(BaseModel):
+    conversacion_id: str
+    sesion: str
+    fragmento: str = ""
+    fin: bool = False
 
 class TextoDesofuscarRequest(BaseModel):
     texto_ofuscado: str
-    mapeos: dict
+    mapeos: Optional[dict] = None
+    marcadores: Optional[dict] = None
+    conversacion_id: Optional[str] = None
+
+MOTORES = ("scrubadub", "presidio", "rapido", "cascada")
+ERROR_MOTOR = {"error": f"Motor no reconocido. Opciones: {', '.join(MOTORES)}"}
+ERROR_CONVERSACION = {"error": "Conversación desconocida o vencida"}
+
+def obtener_ofuscador(motor: str):
+    if motor == "scrubadub":
+        from scrubadub_utils import ScrubadubUtils
+        return ScrubadubUtils()
+    elif motor == "presidio":
+        from presidio_utils import PresidioUtils
+        return PresidioUtils()
+    elif motor == "rapido":
+        from rapido_utils import RapidoUtils
+        return RapidoUtils()
+    elif motor == "cascada":
+        from cascada_utils import CascadaUtils
+        return CascadaUtils()
+    return None
+
+def clave_cache(texto: str, motor: str, ofuscador) -> str:
+    return CacheResultados.clave(texto, motor, GestorDiccionarios.instancia().huella, ofuscador.apertura,
+                                 ofuscador.cierre, ofuscador.configuracion())
+
+def a_boveda(conversacion_id: str, resultado: dict, token: Optional[str] = None) -> dict:
+    """
+    Fusiona los mapeos del resultado en la bóveda de la conversación y lo
+    devuelve sin ellos. No modifica `resultado` (puede venir de la caché).
+    `token` es el de una conversación recién creada, que se entrega una sola vez.
+    """
+    total = BovedaMapeos.instancia().fusionar(conversacion_id, resultado["mapeos"])
+    respuesta = {clave: valor for clave, valor in resultado.items() if clave != "mapeos"}
+    respuesta["conversacion_id"] = conversacion_id
+    respuesta["mapeos_total"] = total
+    if token:
+        respuesta["token_conversacion"] = token
+    return respuesta
 
 @app.get("/ping")
 def ping():
     return {"message": "pong"}
 
+@app.get("/ready")
+def ready():
+    """
+    Readiness: 200 cuando los motores de MOTORES_PRECARGA están cargados y
+    calentados, 503 mientras tanto. Incluye los tiempos de carga y
+    calentamiento de cada motor.
+    """
+    preparacion = PreparacionMotores.instancia()
+    return JSONResponse(status_code=200 if preparacion.listo else 503, content=preparacion.estado())
+
+@app.get("/modelos")
+def modelos():
+    """
+    Modelos cargados en el proceso, con su tiempo de carga y memoria residente.
+    """
+    return {"modelos": ModelosUtils.estadisticas()}
+
 @app.post("/ofuscar")
-def ofuscar(request: TextoRequest):
+async def ofuscar(request: TextoRequest):
     """
     Para ofuscar, el cliente debe enviar:\n
         {\n
             "texto": "Mi número de teléfono es (221) 455-5555 y mi correo es pepe@argento.com...",\n
-            "motor": "scrubadub"\n
+            "motor": "scrubadub",\n
+            "incremental": false,\n
+            "conversacion_id": null\n
         }\n
+    Con "incremental": true el texto se analiza por párrafos y solo se procesan
+    los que cambiaron desde envíos anteriores (útil para editores).\n
+    Con "conversacion_id" los mapeos se guardan en la bóveda del servidor,
+    sumados a los de los turnos anteriores, y la respuesta no los incluye:
+    /desofuscar los recibe con el mismo "conversacion_id".\n
     Opciones de motor:\n
     ➡️scrubadub (por defecto)\n
     ➡️presidio\n
+    ➡️rapido (solo identificadores estructurados y diccionarios, sin NER)\n
+    ➡️cascada (rapido sobre todo el texto y NER solo en las oraciones candidatas)\n
     """    
 
-    from presidio_utils import PresidioUtils
-    from scrubadub_utils import ScrubadubUtils
-
-
     request_counter.add(1, {"endpoint": "/ofuscar"})
-    motor = request.motor
 
-    if motor == "scrubadub":
-        ofuscador = ScrubadubUtils()
-    elif motor == "presidio":
-        ofuscador = PresidioUtils()
-    else:
-        return {"error": "Motor no reconocido. Opciones: scrubadub, presidio"}    
+    ofuscador = obtener_ofuscador(request.motor)
+    if ofuscador is None:
+        return ERROR_MOTOR
     
-    return ofuscador.ofuscar(request.texto)
+    cache = CacheResultados.instancia()
+    clave = clave_cache(request.texto, request.motor, ofuscador)
+    token = BovedaMapeos.instancia().crear(request.conversacion_id) if request.conversacion_id else None
+    resultado, = await cache.buscar([clave])
+    if resultado is not None:
+        return a_boveda(request.conversacion_id, resultado, token) if request.conversacion_id else resultado
+
+    if not ofuscador.usa_ner and len(request.texto) <= INLINE_MAX_CARACTERES:
+        # Sin NER y con un texto corto la detección es más rápida que encolarla
+        entidades = ofuscador.detectar(request.texto)
+    elif not ofuscador.usa_ner:
+        # Un texto largo no bloquea el event loop aunque no haya NER
+        entidades = await EjecutorInferencia.instancia().ejecutar(ofuscador.detectar, request.texto)
+    elif request.incremental:
+        # Solo se analizan los párrafos que cambiaron desde el último envío
+        from incremental_utils import OfuscadorIncremental
+        incremental = OfuscadorIncremental(request.motor, ofuscador)
+        entidades = await EjecutorInferencia.instancia().ejecutar(incremental.detectar, request.texto)
+    else:
+        # Las requests concurrentes del mismo motor se agrupan en micro-lotes
+        entidades = await PlanificadorLotes.para(request.motor, ofuscador).detectar(request.texto)
+    if len(request.texto) <= INLINE_MAX_CARACTERES:
+        resultado = ofuscador.resultado(request.texto, entidades)
+    else:
+        resultado = await EjecutorInferencia.instancia().ejecutar(ofuscador.resultado, request.texto, entidades)
+    await cache.almacenar([(clave, resultado)])
+    if request.conversacion_id:
+        return a_boveda(request.conversacion_id, resultado, token)
+    return resultado
+
+@app.post("/ofuscar/lote")
+async def ofuscar_lote(request: LoteRequest):
+    """
+    Para ofuscar varios textos en una sola llamada, el cliente debe enviar:\n
+        {\n
+            "textos": ["Mi correo es pepe@argento.com", "Llamar a Juan al (221) 455-5555"],\n
+            "motor": "presidio",\n
+            "tamanio_lote": 32,\n
+            "procesos": 1\n
+        }\n
+    El NER se corre por lotes. Devuelve un resultado por texto, en el mismo orden.
+    Con "conversacion_id" los mapeos de todos los textos van a la bóveda.
+    """
+    request_counter.add(1, {"endpoint": "/ofuscar/lote"})
+
+    ofuscador = obtener_ofuscador(request.motor)
+    if ofuscador is None:
+        return ERROR_MOTOR
+
+    # Solo se analizan los textos que no están en la caché
+    cache = CacheResultados.instancia()
+    claves = [clave_cache(texto, request.motor, ofuscador) for texto in request.textos]
+    resultados = await cache.buscar(claves)
+    pendientes = [i for i, resultado in enumerate(resultados) if resultado is None]
+
+    if pendientes:
+        nuevos = await EjecutorInferencia.instancia().ejecutar(
+            ofuscador.ofuscar_lote, [request.textos[i] for i in pendientes], request.tamanio_lote, request.procesos
+        )
+        for i, resultado in zip(pendientes, nuevos):
+            resultados[i] = resultado
+        await cache.almacenar([(claves[i], resultados[i]) for i in pendientes])
+
+    if request.conversacion_id:
+        token = BovedaMapeos.instancia().crear(request.conversacion_id)
+        resultados = [a_boveda(request.conversacion_id, resultado) for resultado in resultados]
+        if token:
+            return {"resultados": resultados, "motor": request.motor, "token_conversacion": token}
+    return {"resultados": resultados, "motor": request.motor}
+
+@app.post("/ofuscar/stream")
+async def ofuscar_stream(request: Request, motor: str = "scrubadub",
+                         tamanio_fragmento: Optional[int] = Query(None, gt=0),
+                         solapamiento: Optional[int] = Query(None, ge=0),
+                         conversacion_id: Optional[str] = None):
+    """
+    Ofusca un documento largo enviado como cuerpo de texto plano (UTF-8),
+    leyéndolo de a partes y devolviendo NDJSON a medida que avanza:\n
+        {"texto_ofuscado": "...", "mapeos": {...}}   una línea por fragmento, con los mapeos nuevos\n
+        {"fin": true, "motor": "scrubadub"}         última línea\n
+    Con ?conversacion_id=... los mapeos van a la bóveda y no se incluyen en las líneas.\n
+    Ejemplo: curl --data-binary @documento.txt "http://localhost:8000/ofuscar/stream?motor=presidio"
+    """
+    from streaming_utils import OfuscadorStreaming
+
+    request_counter.add(1, {"endpoint": "/ofuscar/stream"})
+
+    ofuscador = obtener_ofuscador(motor)
+    if ofuscador is None:
+        return ERROR_MOTOR
+
+    try:
+        # El constructor además exige solapamiento < tamanio_fragmento
+        streaming = OfuscadorStreaming(ofuscador, tamanio_fragmento, solapamiento)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    ejecutor = EjecutorInferencia.instancia()
+
+    token = BovedaMapeos.instancia().crear(conversacion_id) if conversacion_id else None
+
+    def linea(resultado: dict) -> str:
+        if conversacion_id:
+            resultado = a_boveda(conversacion_id, resultado)
+        return json.dumps(resultado, ensure_ascii=False) + "\n"
+
+    async def generar():
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for bloque in request.stream():
+            for resultado in await ejecutor.ejecutar(streaming.alimentar, decoder.decode(bloque)):
+                yield linea(resultado)
+        for resultado in await ejecutor.ejecutar(streaming.finalizar, decoder.decode(b"", final=True)):
+            yield linea(resultado)
+        fin = {"fin": True, "motor": motor}
+        if token:
+            fin["token_conversacion"] = token
+        yield json.dumps(fin) + "\n"
+
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+@app.post("/ofuscar/archivo")
+async def ofuscar_archivo(request: Request, columnas: str, formato: str = "csv", motor: str = "scrubadub",
+                          separador: str = ",", conversacion_id: Optional[str] = None,
+                          tamanio_lote: Optional[int] = Query(None, ge=1, le=LOTE_MAX_TAMANIO)):
+    """
+    Ofusca las columnas elegidas de un CSV (con encabezado) o los campos de un
+    JSONL enviado como cuerpo, leyéndolo y devolviéndolo de a lotes de filas:\n
+        curl --data-binary @clientes.csv "http://localhost:8000/ofuscar/archivo?columnas=nombre,email&motor=presidio"\n
+        curl --data-binary @eventos.jsonl "http://localhost:8000/ofuscar/archivo?formato=jsonl&columnas=cliente.nombre"\n
+    Cada valor distinto se analiza una sola vez. La respuesta es el archivo
+    ofuscado en el mismo formato; si falla a mitad de camino termina con un
+    registro de error ({"error": ...} en JSONL, "#ERROR,..." en CSV). Los
+    mapeos de todo el archivo quedan en la bóveda bajo el identificador del
+    header X-Conversacion-Id y se exportan con GET /conversaciones/{conversacion_id}
+    y el token del header X-Token-Conversacion (solo si la conversación es nueva).
+    """
+    from archivos_utils import OfuscadorArchivos
+
+    request_counter.add(1, {"endpoint": "/ofuscar/archivo"})
+
+    ofuscador = obtener_ofuscador(motor)
+    if ofuscador is None:
+        return ERROR_MOTOR
+
+    conversacion_id = conversacion_id or uuid.uuid4().hex
+    boveda = BovedaMapeos.instancia()
+    token = boveda.crear(conversacion_id)
+    try:
+        archivo = OfuscadorArchivos(ofuscador, formato, columnas.split(","), separador,
+                                    lambda mapeos: boveda.fusionar(conversacion_id, mapeos), tamanio_lote=tamanio_lote)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    ejecutor = EjecutorInferencia.instancia()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    bloques = request.stream().__aiter__()
+
+    # Se lee hasta el encabezado del CSV antes de responder, así una columna inexistente es un 400
+    iniciales = []
+    try:
+        while formato == "csv" and archivo.encabezado is None:
+            try:
+                bloque = await bloques.__anext__()
+            except StopAsyncIteration:
+                break
+            iniciales.append(await ejecutor.ejecutar(archivo.alimentar, decoder.decode(bloque)))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    async def generar():
+        for salida in iniciales:
+            if salida:
+                yield salida
+        try:
+            async for bloque in bloques:
+                salida = await ejecutor.ejecutar(archivo.alimentar, decoder.decode(bloque))
+                if salida:
+                    yield salida
+            yield await ejecutor.ejecutar(archivo.finalizar, decoder.decode(b"", final=True))
+        except (ValueError, ColaLlenaError, TiempoAgotadoError) as e:
+            # El 200 ya se envió: el error va como último registro para que no parezca un archivo completo
+            yield archivo.registro_error(str(e) or type(e).__name__)
+
+    media_type = "text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson"
+    headers = {"X-Conversacion-Id": conversacion_id}
+    if token:
+        headers["X-Token-Conversacion"] = token
+    return StreamingResponse(generar(), media_type=media_type, headers=headers)
 
 @app.post("/desofuscar")
-def desofuscar(request: TextoDesofuscarRequest):
+def desofuscar(request: TextoDesofuscarRequest, x_token_conversacion: Optional[str] = Header(None)):
     """
     Para desofuscar, el cliente debe enviar:
     {
         "texto_ofuscado": "...",
         "mapeos": {...}
     }
+    o los marcadores ya invertidos, que conservan varios marcadores para un mismo dato:
+    {
+        "texto_ofuscado": "...",
+        "marcadores": {"{{PERSON_51c4ad29}}": "Juan Pérez", ...}
+    }
+    o, si ofuscó con "conversacion_id", el mismo identificador en lugar de los mapeos
+    y el token de la conversación en el header X-Token-Conversacion:
+    {
+        "texto_ofuscado": "...",
+        "conversacion_id": "..."
+    }
     """
     request_counter.add(1, {"endpoint": "/desofuscar"})
-    data = request.model_dump()
-    text = data.get("texto_ofuscado", "")
-    mapeos = data.get("mapeos", {})
 
-    for _, mapping in mapeos.items():
-        for original, reemplazo in mapping.items():
-            text = text.replace(reemplazo, original)
+    marcadores = dict(request.marcadores or {})
+    if request.mapeos:
+        marcadores.update(DesofuscarUtils.invertir(request.mapeos))
+    clave = None
+    if request.conversacion_id:
+        guardado = BovedaMapeos.instancia().obtener(request.conversacion_id, x_token_conversacion)
+        if guardado is None:
+            return JSONResponse(status_code=404, content=ERROR_CONVERSACION)
+        version, guardados = guardado
+        if marcadores:
+            # Marcadores extra del cliente: se suman a los de la bóveda para esta llamada
+            guardados.update(marcadores)
+        else:
+            clave = f"boveda:{request.conversacion_id}:{version}"
+        marcadores = guardados
+
+    text = DesofuscarUtils().desofuscar(request.texto_ofuscado, clave=clave, marcadores=marcadores)
 
     return {"texto_desofuscado": text}
+
+@app.post("/desofuscar/stream")
+async def desofuscar_stream(request: Request, conversacion_id: str,
+                            x_token_conversacion: Optional[str] = Header(None)):
+    """
+    Desofusca una respuesta que llega por partes (por ejemplo, la salida de un
+    LLM en streaming) enviada como cuerpo de texto plano (UTF-8), con los mapeos
+    de la bóveda. Requiere el header X-Token-Conversacion. Devuelve el texto
+    restaurado a medida que llega; solo se retiene lo que todavía puede ser el
+    comienzo de un marcador.\n
+    Ejemplo: curl -N -H "X-Token-Conversacion: $TOKEN" --data-binary @respuesta.txt
+    "http://localhost:8000/desofuscar/stream?conversacion_id=chat-42"
+    """
+    request_counter.add(1, {"endpoint": "/desofuscar/stream"})
+
+    guardado = BovedaMapeos.instancia().obtener(conversacion_id, x_token_conversacion)
+    if guardado is None:
+        return JSONResponse(status_code=404, content=ERROR_CONVERSACION)
+    version, marcadores = guardado
+    desofuscador = DesofuscadorStreaming(clave=f"boveda:{conversacion_id}:{version}", marcadores=marcadores)
+
+    async def generar():
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for bloque in request.stream():
+            texto = desofuscador.alimentar(decoder.decode(bloque))
+            if texto:
+                yield texto
+        yield desofuscador.alimentar(decoder.decode(b"", final=True)) + desofuscador.finalizar()
+
+    return StreamingResponse(generar(), media_type="text/plain; charset=utf-8")
+
+@app.post("/desofuscar/fragmento")
+def desofuscar_fragmento(request: FragmentoDesofuscarRequest, x_token_conversacion: Optional[str] = Header(None)):
+    """
+    Desofusca una respuesta en streaming de a una parte por llamada, con los
+    marcadores de la bóveda, sin que salgan del servidor. Requiere el header
+    X-Token-Conversacion:\n
+        {"conversacion_id": "...", "sesion": "<id del mensaje>", "fragmento": "...", "fin": false}\n
+    Devuelve {"texto": "..."} con lo que ya se puede mostrar; lo que todavía
+    puede ser el comienzo de un marcador se retiene hasta la parte siguiente o
+    hasta "fin": true.
+    """
+    request_counter.add(1, {"endpoint": "/desofuscar/fragmento"})
+
+    def crear():
+        guardado = BovedaMapeos.instancia().obtener(request.conversacion_id, x_token_conversacion)
+        if guardado is None:
+            return None
+        version, marcadores = guardado
+        return DesofuscadorStreaming(clave=f"boveda:{request.conversacion_id}:{version}", marcadores=marcadores)
+
+    # El token es parte de la sesión: otro token nunca alimenta un desofuscador ya abierto
+    sesion = f"{request.conversacion_id}\x00{x_token_conversacion}\x00{request.sesion}"
+    texto = SesionesStreaming.instancia().alimentar(sesion, request.fragmento, request.fin, crear)
+    if texto is None:
+        return JSONResponse(status_code=404, content=ERROR_CONVERSACION)
+    return {"texto": texto}
+
+@app.get("/conversaciones/{conversacion_id}")
+def exportar_conversacion(conversacion_id: str, x_token_conversacion: Optional[str] = Header(None)):
+    """
+    Exporta los marcadores de una conversación como {marcador: original}.
+    Requiere el header X-Token-Conversacion con el token que se entregó al
+    crearla (token_conversacion en /ofuscar, X-Token-Conversacion en /ofuscar/archivo).
+    """
+    request_counter.add(1, {"endpoint": "/conversaciones"})
+
+    marcadores = BovedaMapeos.instancia().exportar(conversacion_id, x_token_conversacion)
+    if marcadores is None:
+        return JSONResponse(status_code=404, content=ERROR_CONVERSACION)
+    return {"conversacion_id": conversacion_id, "marcadores": marcadores}
+
+@app.delete("/conversaciones/{conversacion_id}")
+def borrar_conversacion(conversacion_id: str, x_token_conversacion: Optional[str] = Header(None)):
+    """
+    Borra de la bóveda los mapeos de una conversación. Requiere el header
+    X-Token-Conversacion.
+    """
+    request_counter.add(1, {"endpoint": "/conversaciones"})
+
+    if not BovedaMapeos.instancia().borrar(conversacion_id, x_token_conversacion):
+        return JSONResponse(status_code=404, content=ERROR_CONVERSACION)
+    return {"borrada": conversacion_id}
@@ -0,0 +1,191 @@
+import csv
+import io
+import json
+import os
+from collections import OrderedDict
+
+
+class OfuscadorArchivos:
+    """
+    Ofusca columnas de un CSV (o campos de un JSONL) a medida que llega el
+    archivo, sin cargarlo entero.
+
+    Las filas se juntan en lotes de `filas_lote`; de cada lote se toman los
+    valores únicos de las columnas elegidas que todavía no se ofuscaron y se
+    pasan juntos por `ofuscar_lote` del motor, así el NER corre una sola vez
+    por valor. Lo ya ofuscado se recuerda en una LRU de hasta `max_unicos`
+    valores, y los mapeos de cada lote se entregan a `al_mapear` (la bóveda),
+    por lo que la memoria no depende del tamaño del archivo.
+
+    En JSONL los campos pueden ser rutas con puntos ("cliente.nombre"); solo se
+    ofuscan valores de tipo texto.
+
+    Si el archivo resulta inválido cuando ya se devolvió una parte, la salida
+    se cierra con `registro_error`: una línea {"error": ...} en JSONL o un
+    registro cuyo primer campo es "#ERROR" en CSV.
+    """
+
+    filas_lote = int(os.getenv("ARCHIVOS_LOTE_FILAS", "256"))
+    max_unicos = int(os.getenv("ARCHIVOS_MAX_UNICOS", "100000"))
+
+    formatos = ("csv", "jsonl")
+    marca_error = "#ERROR"
+
+    def __init__(self, ofuscador, formato: str, columnas: list, separador: str = ",", al_mapear=None,
+                 filas_lote: int = None, max_unicos: int = None, tamanio_lote: int = None):
+        if formato not in self.formatos:
+            raise ValueError(f"Formato no reconocido: {formato}. Opciones: {', '.join(self.formatos)}")
+        self.ofuscador = ofuscador
+        self.formato = formato
+        self.columnas = [c.strip() for c in columnas if c.strip()]
+        if not self.columnas:
+            raise ValueError("Hay que indicar al menos una columna")
+        self.separador = separador
+        self.al_mapear = al_mapear
+        self.filas_lote = filas_lote or self.filas_lote
+        self.max_unicos = max_unicos or self.max_unicos
+        self.tamanio_lote = tamanio_lote
+
+        self.encabezado = None
+        self._indices = []
+        self._buffer = ""
+        self._registro = ""
+        self._comillas = 0
+        self._filas = []
+        self._salida = []
+        self._unicos = OrderedDict()
+
+        self.filas = 0
+        self.valores_analizados = 0
+
+    def _fila_csv(self, fila: list):
+        if self.encabezado is None:
+            if fila:
+                fila[0] = fila[0].lstrip("\ufeff")
+            faltantes = [c for c in self.columnas if c not in fila]
+            if faltantes:
+                raise ValueError(f"Columnas inexistentes en el encabezado: {', '.join(faltantes)}")
+            self.encabezado = fila
+            self._indices = [fila.index(c) for c in self.columnas]
+            self._salida.append(self._escribir([fila]))
+            return
+        self._filas.append(fila)
+
+    def _linea(self, linea: str):
+        if self.formato == "jsonl":
+            if not linea.strip():
+                return
+            try:
+                self._filas.append(json.loads(linea))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Línea JSON inválida después de la fila {self.filas + len(self._filas)}: {e}") from e
+            return
+
+        # Un registro CSV puede ocupar varias líneas si tiene saltos entre comillas:
+        # está completo cuando la cantidad de comillas es par
+        self._registro += linea
+        self._comillas += linea.count('"')
+        if self._comillas % 2:
+            return
+        registro, self._registro, self._comillas = self._registro, "", 0
+        for fila in csv.reader([registro], delimiter=self.separador):
+            self._fila_csv(fila)
+
+    @staticmethod
+    def _campo(objeto, ruta: list):
+        for parte in ruta:
+            if not isinstance(objeto, dict) or parte not in objeto:
+                return None
+            objeto = objeto[parte]
+        return objeto
+
+    def _celdas(self, fila):
+        """(contenedor, clave, valor) de cada celda a ofuscar de la fila."""
+        if self.formato == "csv":
+            for indice in self._indices:
+                if indice < len(fila) and fila[indice]:
+                    yield fila, indice, fila[indice]
+            return
+        for columna in self.columnas:
+            *camino, ultima = columna.split(".")
+            contenedor = self._campo(fila, camino)
+            if isinstance(contenedor, dict) and isinstance(contenedor.get(ultima), str) and contenedor[ultima]:
+                yield contenedor, ultima, contenedor[ultima]
+
+    def _escribir(self, filas: list) -> str:
+        if self.formato == "jsonl":
+            return "".join(json.dumps(fila, ensure_ascii=False) + "\n" for fila in filas)
+        salida = io.StringIO()
+        csv.writer(salida, delimiter=self.separador, lineterminator="\n").writerows(filas)
+        return salida.getvalue()
+
+    def _procesar(self, filas: list):
+        celdas = [celda for fila in filas for celda in self._celdas(fila)]
+
+        nuevos = {}
+        pendientes = list(dict.fromkeys(v for _, _, v in celdas if v not in self._unicos))
+        if pendientes:
+            mapeos = {}
+            for valor, resultado in zip(pendientes, self.ofuscador.ofuscar_lote(pendientes, self.tamanio_lote)):
+                nuevos[valor] = resultado["texto_ofuscado"]
+                for clave, grupo in resultado["mapeos"].items():
+                    if grupo:
+                        mapeos.setdefault(clave, {}).update(grupo)
+            if mapeos and self.al_mapear is not None:
+                self.al_mapear(mapeos)
+            self.valores_analizados += len(pendientes)
+
+        for contenedor, clave, valor in celdas:
+            ofuscado = nuevos.get(valor)
+            if ofuscado is None:
+                ofuscado = self._unicos[valor]
+                self._unicos.move_to_end(valor)
+            contenedor[clave] = ofuscado
+
+        self._unicos.update(nuevos)
+        while len(self._unicos) > self.max_unicos:
+            self._unicos.popitem(last=False)
+
+        self.filas += len(filas)
+        self._salida.append(self._escribir(filas))
+
+    def _vaciar(self, final: bool) -> str:
+        while len(self._filas) >= self.filas_lote or (final and self._filas):
+            filas, self._filas = self._filas[:self.filas_lote], self._filas[self.filas_lote:]
+            self._procesar(filas)
+        salida, self._salida = "".join(self._salida), []
+        return salida
+
+    def registro_error(self, mensaje: str) -> str:
+        """
+        Lo ya ofuscado que quedó pendiente más el registro que marca que la
+        salida se cortó por un error, con la cantidad de filas devueltas.
+        """
+        salida, self._salida = "".join(self._salida), []
+        if self.formato == "jsonl":
+            return salida + json.dumps({"error": mensaje, "filas": self.filas}, ensure_ascii=False) + "\n"
+        return salida + self._escribir([[self.marca_error, mensaje, str(self.filas)]])
+
+    def alimentar(self, texto: str) -> str:
+        """
+        Agrega texto del archivo y devuelve lo que ya se puede emitir ofuscado
+        (lotes completos de filas).
+        """
+        self._buffer += texto
+        *lineas, self._buffer = self._buffer.split("\n")
+        for linea in lineas:
+            self._linea(linea + "\n")
+        return self._vaciar(final=False)
+
+    def finalizar(self, texto: str = "") -> str:
+        """
+        Procesa lo pendiente (incluida una última línea sin salto) y devuelve
+        el resto del archivo ofuscado.
+        """
+        salida = self.alimentar(texto)
+        if self._buffer:
+            self._linea(self._buffer)
+            self._buffer = ""
+        if self._registro:
+            raise ValueError("El CSV termina dentro de un campo entre comillas")
+        return salida + self._vaciar(final=True)
@@ -0,0 +1,83 @@
+"""
+Compara el motor cascada contra el NER completo de su motor base (CASCADA_NER):
+recall de las entidades del NER completo, latencia y proporción de oraciones
+que llegan al NER.
+
+Uso (desde la raíz del repo, con los modelos descargados):
+    python -m benchmarks.bench_cascada [--archivo textos.txt] [--repeticiones 3]
+
+Sin --archivo se usa un conjunto chico de mensajes de ejemplo. Con --archivo,
+cada línea no vacía es un texto.
+"""
+import argparse
+import statistics
+import time
+
+from cascada_utils import CascadaUtils
+
+EJEMPLOS = [
+    "Hola, necesito ayuda con mi cuenta. No puedo ingresar desde ayer.",
+    "El expediente lo inició Roberto Sánchez y lo revisó la Dra. Gabriela Moreno.",
+    "Mi DNI es 30.123.456 y mi correo es pepe@argento.com, gracias.",
+    "Por favor reprogramen el turno para el 3 de marzo a las 10.",
+    "Quiero saber el estado del trámite NOTA-1234-5-6.",
+    "Juan llamó al (221) 455-5555 pero nadie atendió.",
+    "La transferencia se hizo al CBU 0170099220000067797370 sin problemas.",
+    "Buenas tardes, adjunto la documentación pedida.",
+    "Le escribo en nombre de Martín Gómez por la causa PP-01-02-123456-22/00.",
+    "¿Cómo cambio la contraseña? No encuentro la opción en el menú.",
+]
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivo")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.archivo:
+        with open(args.archivo, encoding="utf-8") as f:
+            textos = [linea.strip() for linea in f if linea.strip()]
+    else:
+        textos = EJEMPLOS
+
+    cascada = CascadaUtils()
+    completo = cascada._ofuscador_ner()
+
+    # Calentamiento: carga de modelos fuera de la medición
+    completo.detectar(textos[0])
+
+    tiempos = {"completo": [], "cascada": []}
+    encontradas = esperadas = 0
+    oraciones = candidatas = 0
+
+    for text in textos:
+        for nombre, motor in (("completo", completo), ("cascada", cascada)):
+            for _ in range(args.repeticiones):
+                inicio = time.perf_counter()
+                entidades = motor.detectar(text)
+                tiempos[nombre].append(time.perf_counter() - inicio)
+            if nombre == "completo":
+                referencia = {(e.inicio, e.fin) for e in entidades}
+            else:
+                obtenidas = {(e.inicio, e.fin) for e in entidades}
+
+        esperadas += len(referencia)
+        encontradas += len(referencia & obtenidas)
+        oraciones += len(list(cascada._patron_oracion.finditer(text)))
+        candidatas += len(cascada.oraciones_candidatas(text))
+
+    print(f"Textos: {len(textos)}  |  oraciones al NER: {candidatas}/{oraciones} ({candidatas / max(oraciones, 1):.0%})")
+    print(f"Recall respecto del NER completo: {encontradas}/{esperadas} ({encontradas / max(esperadas, 1):.1%})")
+    for nombre, valores in tiempos.items():
+        print(f"{nombre:>9}: media {statistics.mean(valores) * 1000:8.1f}ms  p50 {percentil(valores, 50) * 1000:8.1f}ms  "
+              f"p95 {percentil(valores, 95) * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
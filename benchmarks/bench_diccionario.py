@@ -0,0 +1,78 @@
+"""
+Benchmark del MatcherDiccionario con diccionarios sintéticos de 10k, 100k y 1M entradas.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_diccionario [--tamanios 10000 100000 1000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from diccionario_utils import MatcherDiccionario
+
+SILABAS = ["ma", "ri", "a", "jo", "sé", "lu", "cí", "pa", "blo", "fer", "nán", "dez", "gó", "mez",
+           "ro", "drí", "guez", "án", "gel", "ña", "to", "rres", "vi", "lla", "ber", "ta", "ni", "co"]
+
+
+def generar_entradas(cantidad: int, rng: random.Random) -> list:
+    entradas = set()
+    while len(entradas) < cantidad:
+        palabras = rng.choice((1, 1, 1, 2))
+        entrada = " ".join(
+            "".join(rng.choice(SILABAS) for _ in range(rng.randint(2, 4))).capitalize()
+            for _ in range(palabras)
+        )
+        entradas.add(entrada)
+    return list(entradas)
+
+
+def generar_texto(entradas: list, rng: random.Random, palabras: int = 20000) -> str:
+    relleno = ["el", "expediente", "fue", "firmado", "por", "la", "señora", "en", "fecha", "del", "trámite"]
+    partes = []
+    for _ in range(palabras):
+        partes.append(rng.choice(entradas) if rng.random() < 0.05 else rng.choice(relleno))
+    return " ".join(partes)
+
+
+def medir(cantidad: int, seed: int):
+    rng = random.Random(seed)
+    entradas = generar_entradas(cantidad, rng)
+    texto = generar_texto(entradas, rng)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "nombres.csv")
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write("\n".join(entradas))
+
+        inicio = time.perf_counter()
+        matcher = MatcherDiccionario.desde_csv(ruta)
+        construccion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        MatcherDiccionario.desde_csv(ruta)
+        carga_indice = time.perf_counter() - inicio
+
+    repeticiones = 5
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        coincidencias = matcher.buscar(texto)
+    busqueda = (time.perf_counter() - inicio) / repeticiones
+
+    print(f"{cantidad:>9} entradas | construcción {construccion:7.2f}s | carga índice {carga_indice:6.2f}s | "
+          f"búsqueda {busqueda * 1000:7.1f}ms sobre {len(texto) / 1024:.0f} KiB "
+          f"({len(coincidencias)} coincidencias)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanios", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    for cantidad in args.tamanios:
+        medir(cantidad, args.seed)
+
+
+if __name__ == "__main__":
+    main()
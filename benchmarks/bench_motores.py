@@ -0,0 +1,240 @@
+"""
+Benchmark de los motores sobre un corpus sintético (benchmarks.corpus): latencia
+por etapa (percentiles), throughput y memoria pico, con salida JSON para
+comparar entre commits.
+
+Etapas por documento:
+    deteccion      ofuscador.detectar(texto)
+    reescritura    ofuscador.resultado(texto, entidades)
+    desofuscar     DesofuscarUtils().desofuscar(texto_ofuscado, mapeos)
+    diccionarios   AccentInsensitiveNameRecognizer.analyze (solo motor presidio)
+Además se mide la carga del motor y el throughput de ofuscar_lote sobre todo el
+corpus. Cada motor corre en su propio proceso, así la memoria pico es la suya.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_motores [--motores rapido,scrubadub,presidio,cascada] [--documentos 100]
+        [--largo 1500] [--densidad 0.3] [--mezcla ...] [--seed 42] [--corpus corpus.jsonl]
+        [--salida resultados.json] [--comparar resultados_anteriores.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import corpus as corpus_utils
+from benchmarks.bench_cascada import percentil
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def resumen(tiempos: list) -> dict:
+    """Percentiles, media y máximo en milisegundos."""
+    valores = {f"p{p}": round(percentil(tiempos, p) * 1000, 3) for p in PERCENTILES}
+    valores["media"] = round(statistics.mean(tiempos) * 1000, 3)
+    valores["max"] = round(max(tiempos) * 1000, 3)
+    valores["n"] = len(tiempos)
+    return valores
+
+
+def rss_pico() -> int:
+    # ru_maxrss está en KiB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def obtener_ofuscador(motor: str):
+    if motor == "scrubadub":
+        from scrubadub_utils import ScrubadubUtils
+        return ScrubadubUtils()
+    if motor == "presidio":
+        from presidio_utils import PresidioUtils
+        return PresidioUtils()
+    if motor == "rapido":
+        from rapido_utils import RapidoUtils
+        return RapidoUtils()
+    if motor == "cascada":
+        from cascada_utils import CascadaUtils
+        return CascadaUtils()
+    raise ValueError(f"Motor no reconocido: {motor}")
+
+
+def medir(motor: str, documentos: list) -> dict:
+    from desofuscar_utils import DesofuscarUtils
+
+    ofuscador = obtener_ofuscador(motor)
+    inicio = time.perf_counter()
+    ofuscador.precargar()
+    segundos_carga = time.perf_counter() - inicio
+    rss_carga = rss_pico()
+
+    reconocedor = None
+    if motor == "presidio":
+        from diccionario_utils import GestorDiccionarios
+        from presidio_utils import AccentInsensitiveNameRecognizer
+        reconocedor = AccentInsensitiveNameRecognizer(GestorDiccionarios.instancia())
+
+    textos = [documento["texto"] for documento in documentos]
+    # Calentamiento fuera de la medición
+    ofuscador.detectar(textos[0])
+
+    etapas = {"deteccion": [], "reescritura": [], "desofuscar": []}
+    if reconocedor is not None:
+        etapas["diccionarios"] = []
+    desofuscar = DesofuscarUtils()
+    ida_y_vuelta = 0
+    for texto in textos:
+        inicio = time.perf_counter()
+        entidades = ofuscador.detectar(texto)
+        etapas["deteccion"].append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        resultado = ofuscador.resultado(texto, entidades)
+        etapas["reescritura"].append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        original = desofuscar.desofuscar(resultado["texto_ofuscado"], resultado["mapeos"])
+        etapas["desofuscar"].append(time.perf_counter() - inicio)
+        ida_y_vuelta += original == texto
+
+        if reconocedor is not None:
+            inicio = time.perf_counter()
+            reconocedor.analyze(texto, [])
+            etapas["diccionarios"].append(time.perf_counter() - inicio)
+
+    caracteres = sum(len(texto) for texto in textos)
+    inicio = time.perf_counter()
+    ofuscador.ofuscar_lote(textos)
+    segundos_lote = time.perf_counter() - inicio
+    segundos_serie = sum(etapas["deteccion"]) + sum(etapas["reescritura"])
+
+    return {
+        "segundos_carga": round(segundos_carga, 3),
+        "rss_carga_bytes": rss_carga,
+        "rss_pico_bytes": rss_pico(),
+        "etapas": {etapa: resumen(tiempos) for etapa, tiempos in etapas.items()},
+        "throughput": {
+            "documentos_por_segundo": round(len(textos) / segundos_serie, 2),
+            "caracteres_por_segundo": round(caracteres / segundos_serie),
+            "lote_documentos_por_segundo": round(len(textos) / segundos_lote, 2),
+            "lote_caracteres_por_segundo": round(caracteres / segundos_lote),
+        },
+        "ida_y_vuelta_exacta": ida_y_vuelta / len(textos),
+    }
+
+
+def entorno() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    variables = ("INFERENCIA_HILOS", "PRESIDIO_BACKEND", "OFUSCAR_LOTE_TAMANIO", "CASCADA_NER",
+                 "SCRUBADUB_MODELO_SPACY")
+    return {
+        "commit": commit,
+        "fecha": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "variables": {v: os.environ[v] for v in variables if v in os.environ},
+    }
+
+
+def comparar(actual: dict, anterior: dict):
+    print(f"\nComparación contra {anterior['entorno'].get('commit') or 'anterior'}:")
+    for motor, resultado in actual["motores"].items():
+        base = anterior["motores"].get(motor)
+        if not base or "error" in resultado or "error" in base:
+            continue
+        for etapa, valores in resultado["etapas"].items():
+            if etapa not in base["etapas"]:
+                continue
+            deltas = "  ".join(
+                f"{p} {(valores[p] / base['etapas'][etapa][p] - 1) if base['etapas'][etapa][p] else 0:+.0%}"
+                for p in ("p50", "p95")
+            )
+            print(f"{motor:>10} {etapa:<13} {deltas}")
+        actual_lote = resultado["throughput"]["lote_documentos_por_segundo"]
+        base_lote = base["throughput"]["lote_documentos_por_segundo"]
+        print(f"{motor:>10} {'lote':<13} throughput {actual_lote / base_lote - 1:+.0%}  "
+              f"RSS pico {(resultado['rss_pico_bytes'] - base['rss_pico_bytes']) / 2**20:+.0f}MiB")
+
+
+def imprimir(resultados: dict):
+    corpus = resultados["corpus"]
+    print(f"Corpus: {corpus['documentos']} documentos de ~{corpus['largo']} caracteres, densidad {corpus['densidad']}, "
+          f"seed {corpus['seed']}")
+    for motor, resultado in resultados["motores"].items():
+        if "error" in resultado:
+            print(f"❌ {motor}: {resultado['error']}")
+            continue
+        throughput = resultado["throughput"]
+        print(f"{motor}: carga {resultado['segundos_carga']}s  RSS pico {resultado['rss_pico_bytes'] / 2**20:.0f}MiB  "
+              f"{throughput['documentos_por_segundo']} doc/s (lote {throughput['lote_documentos_por_segundo']} doc/s)  "
+              f"ida y vuelta exacta {resultado['ida_y_vuelta_exacta']:.0%}")
+        for etapa, valores in resultado["etapas"].items():
+            print(f"    {etapa:<13} " + "  ".join(f"{clave} {valores[clave]:8.2f}ms"
+                                                  for clave in ("p50", "p90", "p95", "p99", "max")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    corpus_utils.agregar_argumentos(parser)
+    parser.add_argument("--corpus", help="corpus JSONL generado con benchmarks.corpus (ignora los parámetros)")
+    parser.add_argument("--motores", default="rapido,scrubadub,presidio,cascada")
+    parser.add_argument("--salida", help="archivo JSON con los resultados")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        # Proceso hijo: mide un motor sobre el corpus y devuelve JSON por stdout
+        print(json.dumps(medir(args.medir, corpus_utils.leer(args.corpus))))
+        return
+
+    if args.corpus:
+        documentos = corpus_utils.leer(args.corpus)
+        parametros = {"archivo": args.corpus, "documentos": len(documentos),
+                      "largo": round(statistics.mean(len(d["texto"]) for d in documentos)),
+                      "densidad": None, "seed": None}
+        path_corpus = args.corpus
+    else:
+        documentos = corpus_utils.corpus_desde_argumentos(args)
+        parametros = corpus_utils.parametros(args)
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as f:
+            for documento in documentos:
+                f.write(json.dumps(documento, ensure_ascii=False) + "\n")
+        path_corpus = f.name
+
+    resultados = {"entorno": entorno(), "corpus": parametros, "motores": {}}
+    try:
+        for motor in args.motores.split(","):
+            proceso = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_motores", "--medir", motor, "--corpus", path_corpus],
+                capture_output=True, text=True,
+            )
+            if proceso.returncode != 0:
+                error = proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "error"
+                resultados["motores"][motor] = {"error": error}
+                continue
+            resultados["motores"][motor] = json.loads(proceso.stdout.strip().splitlines()[-1])
+    finally:
+        if not args.corpus:
+            os.remove(path_corpus)
+
+    imprimir(resultados)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultados, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compara los backends del NER de presidio (PRESIDIO_BACKEND): PyTorch fp32,
+ONNX Runtime fp32 y ONNX Runtime int8. Mide latencia por texto, memoria
+residente del modelo cargado y coincidencia de entidades contra torch.
+
+Cada backend corre en su propio proceso para que la memoria de uno no se sume
+a la del otro. Los modelos ONNX se generan con:
+    EXPORTAR_ONNX=1 python download_utils.py
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_onnx [--archivo textos.txt] [--repeticiones 3] [--backends torch,onnx,onnx-int8]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_cascada import EJEMPLOS, percentil
+
+
+def medir(backend: str, textos: list, repeticiones: int) -> dict:
+    import psutil
+    from presidio_utils import PresidioUtils
+
+    proceso = psutil.Process()
+    rss_antes = proceso.memory_info().rss
+    PresidioUtils.backend = backend
+    inicio = time.perf_counter()
+    PresidioUtils.cargar()
+    segundos_carga = time.perf_counter() - inicio
+    rss_modelo = proceso.memory_info().rss - rss_antes
+
+    presidio = PresidioUtils()
+    presidio.detectar(textos[0])
+
+    tiempos = []
+    entidades = []
+    for text in textos:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            encontradas = presidio.detectar(text)
+            tiempos.append(time.perf_counter() - inicio)
+        entidades.append(sorted({(e.inicio, e.fin, e.prefijo) for e in encontradas}))
+
+    return {
+        "backend": backend,
+        "segundos_carga": segundos_carga,
+        "rss_bytes": rss_modelo,
+        "rss_pico_bytes": proceso.memory_info().rss,
+        "tiempos": tiempos,
+        "entidades": entidades,
+    }
+
+
+def coincidencia(referencia: list, obtenidas: list) -> float:
+    """F1 de las entidades (inicio, fin, tipo) contra las de referencia."""
+    comunes = total_referencia = total_obtenidas = 0
+    for esperadas, encontradas in zip(referencia, obtenidas):
+        esperadas = {tuple(e) for e in esperadas}
+        encontradas = {tuple(e) for e in encontradas}
+        comunes += len(esperadas & encontradas)
+        total_referencia += len(esperadas)
+        total_obtenidas += len(encontradas)
+    if not total_referencia and not total_obtenidas:
+        return 1.0
+    return 2 * comunes / (total_referencia + total_obtenidas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivo")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.archivo:
+        with open(args.archivo, encoding="utf-8") as f:
+            textos = [linea.strip() for linea in f if linea.strip()]
+    else:
+        textos = EJEMPLOS
+
+    if args.backend:
+        # Proceso hijo: mide un solo backend y devuelve JSON por stdout
+        print(json.dumps(medir(args.backend, textos, args.repeticiones)))
+        return
+
+    resultados = []
+    for backend in args.backends.split(","):
+        comando = [sys.executable, "-m", "benchmarks.bench_onnx", "--backend", backend,
+                   "--repeticiones", str(args.repeticiones)]
+        if args.archivo:
+            comando += ["--archivo", args.archivo]
+        salida = subprocess.run(comando, capture_output=True, text=True, env=os.environ)
+        if salida.returncode != 0:
+            print(f"❌ {backend}: {salida.stderr.strip().splitlines()[-1] if salida.stderr.strip() else 'error'}")
+            continue
+        resultados.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    if not resultados:
+        return
+    referencia = resultados[0]
+    print(f"Textos: {len(textos)}  |  repeticiones: {args.repeticiones}  |  referencia: {referencia['backend']}")
+    for resultado in resultados:
+        tiempos = resultado["tiempos"]
+        print(f"{resultado['backend']:>10}: media {statistics.mean(tiempos) * 1000:8.1f}ms  "
+              f"p50 {percentil(tiempos, 50) * 1000:8.1f}ms  p95 {percentil(tiempos, 95) * 1000:8.1f}ms  "
+              f"carga {resultado['segundos_carga']:6.1f}s  RSS modelo {resultado['rss_bytes'] / 2**20:7.0f}MiB  "
+              f"coincidencia {coincidencia(referencia['entidades'], resultado['entidades']):.1%}")
+
+
+if __name__ == "__main__":
+    main()
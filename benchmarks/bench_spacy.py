@@ -0,0 +1,125 @@
+"""
+Compara los pipelines de spaCy completos contra los podados de cada motor
+(ModelosUtils.pipelines): tiempo por texto, memoria residente del modelo y si
+la salida que usa el motor es idéntica (entidades para scrubadub; tokens y
+lemas para presidio).
+
+Cada combinación corre en su propio proceso para medir la memoria por separado.
+
+Uso (desde la raíz del repo, con los modelos instalados):
+    python -m benchmarks.bench_spacy [--archivo textos.txt] [--repeticiones 3] [--motores scrubadub,presidio]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_cascada import EJEMPLOS, percentil
+
+# Cómo se cargaban los modelos antes de podarlos
+CARGA_COMPLETA = {
+    "scrubadub": {},
+    "presidio": {"disable": ["parser", "ner"]},
+}
+
+
+def modelo(motor: str) -> str:
+    if motor == "scrubadub":
+        return os.getenv("SCRUBADUB_MODELO_SPACY", "en_core_web_trf")
+    return "es_core_news_lg"
+
+
+def salida(motor: str, doc) -> list:
+    if motor == "scrubadub":
+        return [[ent.start_char, ent.end_char, ent.label_] for ent in doc.ents]
+    return [[token.idx, token.text, token.lemma_, token.is_stop, token.is_punct] for token in doc]
+
+
+def medir(motor: str, variante: str, textos: list, repeticiones: int) -> dict:
+    import psutil
+    import spacy
+    from download_utils import DownloadUtils
+    from modelos_utils import ModelosUtils
+
+    proceso = psutil.Process()
+    rss_antes = proceso.memory_info().rss
+    inicio = time.perf_counter()
+    opciones = CARGA_COMPLETA[motor] if variante == "completo" else ModelosUtils.opciones_spacy(motor)
+    nlp = spacy.load(DownloadUtils.ruta_spacy(modelo(motor)), **opciones)
+    segundos_carga = time.perf_counter() - inicio
+    rss_modelo = proceso.memory_info().rss - rss_antes
+
+    nlp(textos[0])
+    tiempos = []
+    salidas = []
+    for text in textos:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            doc = nlp(text)
+            tiempos.append(time.perf_counter() - inicio)
+        salidas.append(salida(motor, doc))
+
+    return {
+        "motor": motor,
+        "variante": variante,
+        "componentes": nlp.pipe_names,
+        "segundos_carga": segundos_carga,
+        "rss_bytes": rss_modelo,
+        "tiempos": tiempos,
+        "salidas": salidas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivo")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--motores", default="scrubadub,presidio")
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.archivo:
+        with open(args.archivo, encoding="utf-8") as f:
+            textos = [linea.strip() for linea in f if linea.strip()]
+    else:
+        textos = EJEMPLOS
+
+    if args.medir:
+        # Proceso hijo: mide una combinación motor:variante y devuelve JSON por stdout
+        motor, variante = args.medir.split(":")
+        print(json.dumps(medir(motor, variante, textos, args.repeticiones)))
+        return
+
+    print(f"Textos: {len(textos)}  |  repeticiones: {args.repeticiones}")
+    for motor in args.motores.split(","):
+        resultados = {}
+        for variante in ("completo", "podado"):
+            comando = [sys.executable, "-m", "benchmarks.bench_spacy", "--medir", f"{motor}:{variante}",
+                       "--repeticiones", str(args.repeticiones)]
+            if args.archivo:
+                comando += ["--archivo", args.archivo]
+            proceso = subprocess.run(comando, capture_output=True, text=True)
+            if proceso.returncode != 0:
+                print(f"❌ {motor} {variante}: {proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else 'error'}")
+                continue
+            resultados[variante] = json.loads(proceso.stdout.strip().splitlines()[-1])
+
+        for variante, resultado in resultados.items():
+            tiempos = resultado["tiempos"]
+            print(f"{motor} {variante:>8} ({modelo(motor)}: {', '.join(resultado['componentes'])})")
+            print(f"    media {statistics.mean(tiempos) * 1000:8.1f}ms  p50 {percentil(tiempos, 50) * 1000:8.1f}ms  "
+                  f"p95 {percentil(tiempos, 95) * 1000:8.1f}ms  carga {resultado['segundos_carga']:5.1f}s  "
+                  f"RSS modelo {resultado['rss_bytes'] / 2**20:7.0f}MiB")
+        if len(resultados) == 2:
+            completo, podado = resultados["completo"], resultados["podado"]
+            iguales = sum(a == b for a, b in zip(completo["salidas"], podado["salidas"]))
+            ahorro = 1 - statistics.mean(podado["tiempos"]) / statistics.mean(completo["tiempos"])
+            print(f"    salida idéntica en {iguales}/{len(textos)} textos  |  tiempo ahorrado {ahorro:.0%}  |  "
+                  f"memoria ahorrada {(completo['rss_bytes'] - podado['rss_bytes']) / 2**20:.0f}MiB")
+
+
+if __name__ == "__main__":
+    main()
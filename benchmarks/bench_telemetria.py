@@ -0,0 +1,103 @@
+"""
+Mide el costo de la telemetría por etapa (spans e histogramas de
+telemetria_utils) comparando cada motor con TELEMETRIA_ETAPAS=0 y =1 sobre el
+mismo corpus sintético. Con la telemetría activa se instalan los providers del
+SDK (BatchSpanProcessor y un lector de métricas en memoria) con un exportador
+que descarta, así se mide el costo en proceso sin la red.
+
+Las variantes se alternan durante varias rondas y se toma la mejor de cada una
+para reducir el ruido. El objetivo es un sobrecosto menor al 1%.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_telemetria [--motores scrubadub,presidio] [--rondas 3] [--documentos 50] ...
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import corpus as corpus_utils
+
+
+def instalar_sdk():
+    from opentelemetry import metrics, trace
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+    class Descartar(SpanExporter):
+        def export(self, spans):
+            return SpanExportResult.SUCCESS
+
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(BatchSpanProcessor(Descartar()))
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(MeterProvider(metric_readers=[InMemoryMetricReader()]))
+
+
+def medir(motor: str, documentos: list) -> dict:
+    from benchmarks.bench_motores import medir as medir_motor
+
+    resultado = medir_motor(motor, documentos)
+    etapas = resultado["etapas"]
+    return {
+        "deteccion_media_ms": etapas["deteccion"]["media"],
+        "reescritura_media_ms": etapas["reescritura"]["media"],
+        "total_media_ms": etapas["deteccion"]["media"] + etapas["reescritura"]["media"],
+        "lote_documentos_por_segundo": resultado["throughput"]["lote_documentos_por_segundo"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    corpus_utils.agregar_argumentos(parser)
+    parser.add_argument("--motores", default="scrubadub,presidio")
+    parser.add_argument("--rondas", type=int, default=3)
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        # Proceso hijo: TELEMETRIA_ETAPAS ya viene en el entorno
+        if os.getenv("TELEMETRIA_ETAPAS") == "1":
+            instalar_sdk()
+        print(json.dumps(medir(args.medir, corpus_utils.leer(args.corpus))))
+        return
+
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as f:
+        for documento in corpus_utils.corpus_desde_argumentos(args):
+            f.write(json.dumps(documento, ensure_ascii=False) + "\n")
+        path_corpus = f.name
+
+    try:
+        for motor in args.motores.split(","):
+            mejores = {}
+            for _ in range(args.rondas):
+                for activa in ("0", "1"):
+                    proceso = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.bench_telemetria", "--medir", motor, "--corpus", path_corpus],
+                        capture_output=True, text=True, env={**os.environ, "TELEMETRIA_ETAPAS": activa},
+                    )
+                    if proceso.returncode != 0:
+                        error = proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "error"
+                        print(f"❌ {motor} (TELEMETRIA_ETAPAS={activa}): {error}")
+                        break
+                    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+                    if activa not in mejores or resultado["total_media_ms"] < mejores[activa]["total_media_ms"]:
+                        mejores[activa] = resultado
+            if len(mejores) < 2:
+                continue
+            sin, con = mejores["0"], mejores["1"]
+            sobrecosto = con["total_media_ms"] / sin["total_media_ms"] - 1
+            print(f"{motor}: sin telemetría {sin['total_media_ms']:.2f}ms/doc  con telemetría "
+                  f"{con['total_media_ms']:.2f}ms/doc  sobrecosto {sobrecosto:+.2%} "
+                  f"{'✅' if sobrecosto < 0.01 else '⚠️ supera el 1%'}")
+    finally:
+        os.remove(path_corpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Generador de un corpus sintético en español rioplatense con datos sensibles
+etiquetados (DNI, CBU, NOTA, IPP, nombres de los diccionarios, teléfonos y
+emails). Con la misma semilla y parámetros genera siempre el mismo corpus.
+
+Cada documento es {"id", "texto", "entidades": [{"inicio", "fin", "tipo", "valor"}]},
+donde `tipo` es la clave de `mapeos` que devuelve /ofuscar (dnis, cbus, ...).
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.corpus [--documentos 100] [--largo 1500] [--densidad 0.3]
+                                [--mezcla nombres=3,dnis=1,...] [--seed 42] [--salida corpus.jsonl]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+
+from diccionario_utils import GestorDiccionarios, quitar_acentos
+
+APELLIDOS = [
+    "González", "Rodríguez", "Gómez", "Fernández", "López", "Díaz", "Martínez", "Pérez", "García", "Sánchez",
+    "Romero", "Sosa", "Álvarez", "Torres", "Ruiz", "Ramírez", "Flores", "Benítez", "Acosta", "Medina",
+    "Herrera", "Suárez", "Aguirre", "Giménez", "Gutiérrez", "Pereyra", "Rojas", "Molina", "Castro", "Ortiz",
+]
+
+DOMINIOS = ["gmail.com", "hotmail.com", "yahoo.com.ar", "outlook.com", "mpba.gov.ar", "argento.com"]
+
+PLANTILLAS = {
+    "nombres": [
+        "La presentación la firmó {} en representación de la parte actora.",
+        "Hablé con {} por el tema del expediente y quedó en llamar.",
+        "{} se comunicó ayer por la tarde para consultar el estado del trámite.",
+        "Se deja constancia de que {} no compareció a la audiencia.",
+    ],
+    "dnis": [
+        "Mi DNI es {}.",
+        "El documento del titular es {} y figura en el legajo.",
+        "Adjunto copia del DNI {} para completar la solicitud.",
+    ],
+    "cbus": [
+        "La transferencia se hizo al CBU {} sin problemas.",
+        "Por favor depositen en la cuenta con CBU {} antes del viernes.",
+    ],
+    "notas": [
+        "Quiero saber el estado del trámite {}.",
+        "En respuesta a la {} se remiten los antecedentes solicitados.",
+    ],
+    "ipps": [
+        "La causa {} sigue en etapa de investigación.",
+        "Se solicita la acumulación a la IPP {} por conexidad.",
+    ],
+    "telefonos": [
+        "Pueden llamarme al {} en horario de oficina.",
+        "El teléfono de contacto es {}.",
+        "Dejé un mensaje en el {} pero nadie atendió.",
+    ],
+    "emails": [
+        "Mi correo es {}, gracias.",
+        "Enviar la documentación a {} con copia al área.",
+        "Respondan por favor a {} cuando tengan novedades.",
+    ],
+}
+
+RELLENO = [
+    "Buenas tardes, adjunto la documentación pedida.",
+    "Quedo a la espera de una respuesta.",
+    "No puedo ingresar al sistema desde la semana pasada.",
+    "El trámite sigue pendiente y necesito una solución urgente.",
+    "Se recomienda revisar los plazos antes de la próxima presentación.",
+    "La oficina atiende de lunes a viernes en horario matutino.",
+    "Según lo conversado, se reprograma la reunión para otra fecha.",
+    "Agradezco de antemano la atención prestada.",
+    "El formulario tiene un error en la segunda página.",
+    "Se remiten las actuaciones para su conocimiento y demás efectos.",
+    "¿Cómo cambio la contraseña? No encuentro la opción en el menú.",
+    "Por el momento no hay novedades sobre el pedido.",
+]
+
+MEZCLA = {"nombres": 3, "dnis": 1, "cbus": 1, "notas": 1, "ipps": 1, "telefonos": 1, "emails": 1}
+
+
+def cargar_nombres(path_diccionarios: str = None) -> list:
+    """
+    Nombres de los diccionarios (nombres.csv); si no hay, los de ejemplo.
+    """
+    ruta = os.path.join(path_diccionarios or GestorDiccionarios.path_diccionarios, "nombres.csv")
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            nombres = [row[0].strip() for row in csv.reader(f) if row and row[0].strip()]
+    except OSError:
+        nombres = []
+    return nombres or list(GestorDiccionarios.nombres_example)
+
+
+def parsear_mezcla(valor: str) -> dict:
+    """'nombres=3,dnis=1' -> {"nombres": 3.0, "dnis": 1.0}"""
+    mezcla = {}
+    for parte in valor.split(","):
+        tipo, _, peso = parte.partition("=")
+        if tipo.strip() not in PLANTILLAS:
+            raise ValueError(f"Tipo de entidad no reconocido: {tipo}. Opciones: {', '.join(PLANTILLAS)}")
+        mezcla[tipo.strip()] = float(peso or 1)
+    return mezcla
+
+
+class GeneradorCorpus:
+
+    def __init__(self, seed: int = 42, largo: int = 1500, densidad: float = 0.3, mezcla: dict = None,
+                 nombres: list = None):
+        self.rng = random.Random(seed)
+        self.largo = largo
+        self.densidad = densidad
+        self.mezcla = mezcla or MEZCLA
+        self.nombres = nombres or cargar_nombres()
+
+    def _valor(self, tipo: str) -> str:
+        rng = self.rng
+        if tipo == "nombres":
+            return f"{rng.choice(self.nombres)} {rng.choice(APELLIDOS)}"
+        if tipo == "dnis":
+            numero = rng.randint(10_000_000, 45_999_999)
+            return f"{numero:,}".replace(",", ".") if rng.random() < 0.7 else str(numero)
+        if tipo == "cbus":
+            return "".join(str(rng.randint(0, 9)) for _ in range(22))
+        if tipo == "notas":
+            return f"NOTA-{rng.randint(1, 999999)}-{rng.randint(1, 99)}-{rng.randint(1, 99)}"
+        if tipo == "ipps":
+            return (f"PP-{rng.randint(0, 99):02d}-{rng.randint(0, 99):02d}-{rng.randint(1, 999999)}-"
+                    f"{rng.randint(0, 99):02d}/{rng.randint(0, 99):02d}")
+        if tipo == "telefonos":
+            if rng.random() < 0.5:
+                return f"11 {rng.randint(2000, 6999)}-{rng.randint(1000, 9999)}"
+            return f"({rng.choice(['221', '0221', '351', '341', '2284'])}) {rng.randint(400, 499)}-{rng.randint(1000, 9999)}"
+        if tipo == "emails":
+            usuario = quitar_acentos(f"{rng.choice(self.nombres)}.{rng.choice(APELLIDOS)}").lower().replace(" ", "")
+            return f"{usuario}{rng.randint(1, 99)}@{rng.choice(DOMINIOS)}"
+        raise ValueError(f"Tipo de entidad no reconocido: {tipo}")
+
+    def documento(self, id: int) -> dict:
+        tipos = list(self.mezcla)
+        pesos = [self.mezcla[t] for t in tipos]
+        partes = []
+        entidades = []
+        largo = 0
+        while largo < self.largo:
+            if self.rng.random() < self.densidad:
+                tipo = self.rng.choices(tipos, pesos)[0]
+                plantilla = self.rng.choice(PLANTILLAS[tipo])
+                valor = self._valor(tipo)
+                inicio = largo + plantilla.index("{}")
+                entidades.append({"inicio": inicio, "fin": inicio + len(valor), "tipo": tipo, "valor": valor})
+                oracion = plantilla.format(valor)
+            else:
+                oracion = self.rng.choice(RELLENO)
+            partes.append(oracion)
+            largo += len(oracion) + 1
+        return {"id": id, "texto": " ".join(partes), "entidades": entidades}
+
+    def generar(self, documentos: int) -> list:
+        return [self.documento(i) for i in range(documentos)]
+
+
+def leer(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def agregar_argumentos(parser: argparse.ArgumentParser):
+    parser.add_argument("--documentos", type=int, default=100)
+    parser.add_argument("--largo", type=int, default=1500, help="caracteres aproximados por documento")
+    parser.add_argument("--densidad", type=float, default=0.3, help="proporción de oraciones con un dato sensible")
+    parser.add_argument("--mezcla", type=parsear_mezcla, default=None,
+                        help=f"pesos por tipo, p. ej. nombres=3,dnis=1 (tipos: {', '.join(PLANTILLAS)})")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def corpus_desde_argumentos(args) -> list:
+    return GeneradorCorpus(args.seed, args.largo, args.densidad, args.mezcla).generar(args.documentos)
+
+
+def parametros(args) -> dict:
+    return {"documentos": args.documentos, "largo": args.largo, "densidad": args.densidad,
+            "mezcla": args.mezcla or MEZCLA, "seed": args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    agregar_argumentos(parser)
+    parser.add_argument("--salida", help="archivo JSONL (por defecto, stdout)")
+    args = parser.parse_args()
+
+    documentos = corpus_desde_argumentos(args)
+    lineas = "".join(json.dumps(documento, ensure_ascii=False) + "\n" for documento in documentos)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(lineas)
+    else:
+        print(lineas, end="")
+
+
+if __name__ == "__main__":
+    main()
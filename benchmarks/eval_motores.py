@@ -0,0 +1,234 @@
+"""
+Evaluación de precisión contra costo por motor y configuración.
+
+Corre un corpus etiquetado (benchmarks.corpus, o un JSONL con el mismo formato
+etiquetado a mano) por cada configuración y compara por posición los tramos que
+reemplaza —los mismos que reemplaza /ofuscar, con los solapamientos ya unidos—
+con los tramos etiquetados, palabra por palabra (un motor que reemplaza "Juan"
+y "Pérez" por separado acierta la etiqueta "Juan Pérez"):
+
+    acierto    todas las palabras del tramo etiquetado quedaron cubiertas por
+               tramos reemplazados del mismo tipo
+    parcial    algunas sí y otras no (cuenta como faltante)
+    falso      tramo reemplazado que no toca ningún tramo etiquetado de su tipo
+    oculto     el valor etiquetado ya no aparece en texto_ofuscado (cualquier tipo)
+
+Reporta precisión, recall y F1 por tipo de entidad, latencia y memoria pico, y
+una tabla de Pareto (recall contra latencia p50) con la configuración más
+rápida para cada piso de recall.
+
+Una configuración es nombre:motor[:VAR=valor,VAR=valor], con variables de
+entorno del motor (PRESIDIO_UMBRAL, PRESIDIO_STRIDE, PRESIDIO_AGREGACION,
+PRESIDIO_BACKEND, CASCADA_NER, ...). Cada una corre en su propio proceso.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.eval_motores [--config presidio-0.8:presidio:PRESIDIO_UMBRAL=0.8 ...]
+        [--corpus corpus.jsonl | --documentos 100 --densidad 0.3 ...] [--pisos 0.8,0.9,0.95]
+        [--salida evaluacion.json]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import corpus as corpus_utils
+from benchmarks.bench_cascada import percentil
+from benchmarks.bench_motores import entorno, obtener_ofuscador, rss_pico
+from reescritura_utils import ReescrituraUtils
+
+CONFIGURACIONES = [
+    "rapido:rapido",
+    "scrubadub:scrubadub",
+    "presidio:presidio",
+    "presidio-umbral-0.8:presidio:PRESIDIO_UMBRAL=0.8",
+    "presidio-onnx-int8:presidio:PRESIDIO_BACKEND=onnx-int8",
+    "cascada:cascada",
+]
+
+
+def parsear_configuracion(valor: str) -> dict:
+    nombre, motor, *resto = valor.split(":", 2)
+    variables = dict(par.split("=", 1) for par in resto[0].split(",") if par) if resto else {}
+    return {"nombre": nombre, "motor": motor, "variables": variables}
+
+
+def contar(documentos: list, detecciones: list, resultados: list) -> dict:
+    """
+    Por tipo: etiquetas acertadas (vp), faltantes (fn) y parciales, y tramos
+    reemplazados que tocan alguna etiqueta de su tipo (correctos) o ninguna (fp).
+    `detecciones` son las entidades reemplazadas de cada documento.
+    """
+    conteos = {}
+    ocultos = total = 0
+
+    def tipo(nombre):
+        return conteos.setdefault(nombre, {"vp": 0, "fn": 0, "parciales": 0, "correctos": 0, "fp": 0})
+
+    for documento, entidades, resultado in zip(documentos, detecciones, resultados):
+        cubiertos = {}
+        for entidad in entidades:
+            cubiertos.setdefault(entidad.clave, set()).update(range(entidad.inicio, entidad.fin))
+
+        for etiqueta in documento["entidades"]:
+            total += 1
+            ocultos += etiqueta["valor"] not in resultado["texto_ofuscado"]
+            cubierto = cubiertos.get(etiqueta["tipo"], set())
+            palabras = [
+                all(i in cubierto for i in range(etiqueta["inicio"] + m.start(), etiqueta["inicio"] + m.end()))
+                for m in re.finditer(r"\S+", etiqueta["valor"])
+            ]
+            conteo = tipo(etiqueta["tipo"])
+            if palabras and all(palabras):
+                conteo["vp"] += 1
+            else:
+                conteo["fn"] += 1
+                conteo["parciales"] += any(palabras)
+
+        for entidad in entidades:
+            toca = any(
+                etiqueta["tipo"] == entidad.clave and etiqueta["inicio"] < entidad.fin and entidad.inicio < etiqueta["fin"]
+                for etiqueta in documento["entidades"]
+            )
+            tipo(entidad.clave)["correctos" if toca else "fp"] += 1
+
+    return {"tipos": conteos, "ocultos": ocultos, "etiquetadas": total}
+
+
+def metricas(vp: int, fn: int, correctos: int, fp: int) -> dict:
+    precision = correctos / (correctos + fp) if correctos + fp else 0.0
+    recall = vp / (vp + fn) if vp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def medir(motor: str, documentos: list) -> dict:
+    ofuscador = obtener_ofuscador(motor)
+    inicio = time.perf_counter()
+    ofuscador.precargar()
+    segundos_carga = time.perf_counter() - inicio
+    ofuscador.ofuscar(documentos[0]["texto"])
+
+    resultados = []
+    detecciones = []
+    tiempos = []
+    for documento in documentos:
+        # Lo mismo que ofuscar(), separado para conservar las posiciones reemplazadas
+        inicio = time.perf_counter()
+        entidades = ofuscador.detectar(documento["texto"])
+        resultados.append(ofuscador.resultado(documento["texto"], entidades))
+        tiempos.append(time.perf_counter() - inicio)
+        detecciones.append(ReescrituraUtils.resolver_solapamientos(entidades))
+
+    conteos = contar(documentos, detecciones, resultados)
+    tipos = conteos["tipos"]
+    # Totales solo sobre los tipos etiquetados: los demás (fechas, urls...) no tienen referencia
+    etiquetados = {e["tipo"] for d in documentos for e in d["entidades"]}
+    total = {clave: sum(c[clave] for t, c in tipos.items() if t in etiquetados)
+             for clave in ("vp", "fn", "parciales", "correctos", "fp")}
+    vp, fn = total["vp"], total["fn"]
+    return {
+        "total": {**metricas(vp, fn, total["correctos"], total["fp"]),
+                  "recall_parcial": round((vp + total["parciales"]) / (vp + fn), 4) if vp + fn else 0.0,
+                  "ocultamiento": round(conteos["ocultos"] / conteos["etiquetadas"], 4) if conteos["etiquetadas"] else 0.0},
+        "tipos": {t: {**c, **metricas(c["vp"], c["fn"], c["correctos"], c["fp"])} for t, c in sorted(tipos.items())},
+        "latencia_ms": {"p50": round(percentil(tiempos, 50) * 1000, 3), "p95": round(percentil(tiempos, 95) * 1000, 3),
+                        "media": round(statistics.mean(tiempos) * 1000, 3)},
+        "segundos_carga": round(segundos_carga, 3),
+        "rss_pico_bytes": rss_pico(),
+    }
+
+
+def pareto(evaluaciones: dict) -> list:
+    """Configuraciones no dominadas en (recall mayor, latencia p50 menor)."""
+    validas = {n: e for n, e in evaluaciones.items() if "error" not in e}
+    frente = []
+    for nombre, e in validas.items():
+        recall, latencia = e["total"]["recall"], e["latencia_ms"]["p50"]
+        dominada = any(
+            o["total"]["recall"] >= recall and o["latencia_ms"]["p50"] <= latencia
+            and (o["total"]["recall"] > recall or o["latencia_ms"]["p50"] < latencia)
+            for otro, o in validas.items() if otro != nombre
+        )
+        if not dominada:
+            frente.append(nombre)
+    return sorted(frente, key=lambda n: validas[n]["latencia_ms"]["p50"])
+
+
+def imprimir(evaluaciones: dict, pisos: list):
+    for nombre, e in evaluaciones.items():
+        if "error" in e:
+            print(f"❌ {nombre}: {e['error']}")
+            continue
+        total = e["total"]
+        print(f"\n{nombre}: P {total['precision']:.3f}  R {total['recall']:.3f}  F1 {total['f1']:.3f}  "
+              f"R parcial {total['recall_parcial']:.3f}  ocultamiento {total['ocultamiento']:.3f}")
+        for tipo, m in e["tipos"].items():
+            print(f"    {tipo:<16} P {m['precision']:.3f}  R {m['recall']:.3f}  F1 {m['f1']:.3f}  "
+                  f"(vp {m['vp']}, fp {m['fp']}, fn {m['fn']}, parciales {m['parciales']})")
+
+    frente = pareto(evaluaciones)
+    validas = {n: e for n, e in evaluaciones.items() if "error" not in e}
+    print(f"\n{'configuración':<24}{'recall':>8}{'F1':>8}{'p50 ms':>10}{'p95 ms':>10}{'RSS MiB':>10}  pareto")
+    for nombre, e in sorted(validas.items(), key=lambda x: x[1]["latencia_ms"]["p50"]):
+        print(f"{nombre:<24}{e['total']['recall']:>8.3f}{e['total']['f1']:>8.3f}{e['latencia_ms']['p50']:>10.2f}"
+              f"{e['latencia_ms']['p95']:>10.2f}{e['rss_pico_bytes'] / 2**20:>10.0f}  {'*' if nombre in frente else ''}")
+    for piso in pisos:
+        candidatas = [n for n in frente if validas[n]["total"]["recall"] >= piso]
+        print(f"recall >= {piso:.2f}: {candidatas[0] if candidatas else 'ninguna configuración'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    corpus_utils.agregar_argumentos(parser)
+    parser.add_argument("--corpus", help="corpus JSONL etiquetado (ignora los parámetros de generación)")
+    parser.add_argument("--config", action="append", help="nombre:motor[:VAR=valor,...] (se puede repetir)")
+    parser.add_argument("--pisos", default="0.8,0.9,0.95", help="pisos de recall para la tabla de Pareto")
+    parser.add_argument("--salida", help="archivo JSON con los resultados")
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        # Proceso hijo: evalúa un motor (con las variables ya aplicadas) y devuelve JSON por stdout
+        print(json.dumps(medir(args.medir, corpus_utils.leer(args.corpus))))
+        return
+
+    if args.corpus:
+        path_corpus = args.corpus
+    else:
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as f:
+            for documento in corpus_utils.corpus_desde_argumentos(args):
+                f.write(json.dumps(documento, ensure_ascii=False) + "\n")
+        path_corpus = f.name
+
+    configuraciones = [parsear_configuracion(c) for c in (args.config or CONFIGURACIONES)]
+    evaluaciones = {}
+    try:
+        for config in configuraciones:
+            proceso = subprocess.run(
+                [sys.executable, "-m", "benchmarks.eval_motores", "--medir", config["motor"], "--corpus", path_corpus],
+                capture_output=True, text=True, env={**os.environ, **config["variables"]},
+            )
+            if proceso.returncode != 0:
+                error = proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "error"
+                evaluaciones[config["nombre"]] = {"error": error}
+                continue
+            evaluaciones[config["nombre"]] = {**json.loads(proceso.stdout.strip().splitlines()[-1]),
+                                              "motor": config["motor"], "variables": config["variables"]}
+    finally:
+        if not args.corpus:
+            os.remove(path_corpus)
+
+    imprimir(evaluaciones, [float(p) for p in args.pisos.split(",") if p])
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"entorno": entorno(), "corpus": path_corpus if args.corpus else corpus_utils.parametros(args),
+                       "evaluaciones": evaluaciones, "pareto": pareto(evaluaciones)}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+boveda_desalojos = meter.create_counter(
+    name="boveda_desalojos_total",
+    description="Conversaciones que salieron de la memoria de la bóveda (a disco, por TTL o borradas)",
+    unit="1",
+)
+
+
+class BovedaMapeos:
+    """
+    Bóveda de mapeos del lado del servidor, por conversación.
+
+    /ofuscar con `conversacion_id` guarda acá sus mapeos y devuelve solo el
+    identificador; cada turno se fusiona con los anteriores y /desofuscar los
+    toma de acá. Las respuestas no crecen con la conversación.
+
+    Se guarda marcador -> original, que es lo que necesita /desofuscar: un mismo
+    dato puede recibir otro marcador en un turno posterior (otra etiqueta u otro
+    motor) y los marcadores de los turnos anteriores tienen que seguir
+    resolviéndose.
+
+    Cada conversación nace con un token secreto que se entrega solo a quien la
+    crea: sin él no se pueden leer (desofuscar ni exportar) ni borrar sus
+    marcadores.
+
+    En memoria es una LRU de hasta BOVEDA_MAX_CONVERSACIONES conversaciones con
+    vencimiento por TTL (BOVEDA_TTL, en segundos, renovado en cada uso). Con
+    BOVEDA_DISCO_PATH, las que se desalojan por tamaño pasan a SQLite en lugar
+    de perderse y vuelven a memoria cuando se las usa.
+    """
+
+    max_conversaciones = int(os.getenv("BOVEDA_MAX_CONVERSACIONES", "10000"))
+    ttl = float(os.getenv("BOVEDA_TTL", "86400"))
+    path_disco = os.getenv("BOVEDA_DISCO_PATH", "")
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self, max_conversaciones: int = None, ttl: float = None, path_disco: str = None):
+        self.max_conversaciones = max_conversaciones or self.max_conversaciones
+        self.ttl = ttl or self.ttl
+        self.path_disco = self.path_disco if path_disco is None else path_disco
+
+        # conversacion_id -> [vence, versión, marcadores, token]; la versión cambia con cada
+        # fusión que agrega datos y sirve de clave para el patrón de DesofuscarUtils
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._disco = self._abrir_disco() if self.path_disco else None
+
+    @classmethod
+    def instancia(cls) -> "BovedaMapeos":
+        if cls._instancia is None:
+            with cls._lock_instancia:
+                if cls._instancia is None:
+                    cls._instancia = cls()
+        return cls._instancia
+
+    def _abrir_disco(self):
+        directorio = os.path.dirname(self.path_disco)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = sqlite3.connect(self.path_disco, check_same_thread=False, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS marcadores "
+            "(id TEXT PRIMARY KEY, vence REAL, version TEXT, marcadores TEXT, token TEXT)"
+        )
+        conexion.execute("DELETE FROM marcadores WHERE vence < ?", (time.time(),))
+        return conexion
+
+    def _entrada(self, conversacion_id: str, ahora: float):
+        """
+        Entrada vigente de la conversación (trayéndola de disco si hace falta),
+        o None. Debe llamarse con el lock tomado.
+        """
+        entrada = self._entradas.get(conversacion_id)
+        if entrada is not None:
+            if entrada[0] >= ahora:
+                self._entradas.move_to_end(conversacion_id)
+                return entrada
+            del self._entradas[conversacion_id]
+            boveda_desalojos.add(1, {"motivo": "ttl"})
+
+        if self._disco is not None:
+            fila = self._disco.execute(
+                "SELECT vence, version, marcadores, token FROM marcadores WHERE id = ? AND vence >= ?",
+                (conversacion_id, ahora)
+            ).fetchone()
+            if fila is not None:
+                self._disco.execute("DELETE FROM marcadores WHERE id = ?", (conversacion_id,))
+                entrada = [fila[0], fila[1], json.loads(fila[2]), fila[3]]
+                self._guardar_memoria(conversacion_id, entrada)
+                return entrada
+        return None
+
+    def _guardar_memoria(self, conversacion_id: str, entrada: list):
+        self._entradas[conversacion_id] = entrada
+        self._entradas.move_to_end(conversacion_id)
+        while len(self._entradas) > self.max_conversaciones:
+            desalojado, (vence, version, marcadores, token) = self._entradas.popitem(last=False)
+            if self._disco is not None:
+                self._disco.execute(
+                    "INSERT OR REPLACE INTO marcadores (id, vence, version, marcadores, token) VALUES (?, ?, ?, ?, ?)",
+                    (desalojado, vence, version, json.dumps(marcadores, ensure_ascii=False), token)
+                )
+                boveda_desalojos.add(1, {"motivo": "disco"})
+            else:
+                boveda_desalojos.add(1, {"motivo": "tamanio"})
+
+    def _nueva(self, conversacion_id: str, ahora: float) -> list:
+        entrada = [ahora + self.ttl, uuid.uuid4().hex, {}, secrets.token_urlsafe(24)]
+        self._guardar_memoria(conversacion_id, entrada)
+        return entrada
+
+    def crear(self, conversacion_id: str):
+        """
+        Crea la conversación si no existe y devuelve su token; si ya existía
+        devuelve None (el token solo lo recibe quien la creó).
+        """
+        ahora = time.time()
+        with self._lock:
+            if self._entrada(conversacion_id, ahora) is not None:
+                return None
+            return self._nueva(conversacion_id, ahora)[3]
+
+    def fusionar(self, conversacion_id: str, mapeos: dict) -> int:
+        """
+        Suma los mapeos de un turno ({clave: {original: marcador}}) a los de la
+        conversación y devuelve la cantidad total de marcadores guardados.
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entrada(conversacion_id, ahora)
+            if entrada is None:
+                entrada = self._nueva(conversacion_id, ahora)
+            marcadores = entrada[2]
+            cambios = False
+            for grupo in mapeos.values():
+                for original, marcador in grupo.items():
+                    if marcador and marcadores.get(marcador) != original:
+                        marcadores[marcador] = original
+                        cambios = True
+            entrada[0] = ahora + self.ttl
+            if cambios:
+                entrada[1] = uuid.uuid4().hex
+            return len(marcadores)
+
+    def obtener(self, conversacion_id: str, token: str):
+        """
+        Devuelve (versión, marcadores) de la conversación, con marcadores como
+        {marcador: original}, o None si no existe, venció o el token no corresponde.
+        """
+        ahora = time.time()
+        with self._lock:
+            if not self._autorizada(conversacion_id, token, ahora):
+                return None
+            entrada = self._entradas[conversacion_id]
+            entrada[0] = ahora + self.ttl
+            # Copia: un turno concurrente no la altera a mitad de uso
+            return entrada[1], dict(entrada[2])
+
+    def _autorizada(self, conversacion_id: str, token: str, ahora: float) -> bool:
+        entrada = self._entrada(conversacion_id, ahora)
+        return entrada is not None and bool(token) and hmac.compare_digest(entrada[3], token)
+
+    def exportar(self, conversacion_id: str, token: str):
+        """
+        Marcadores de la conversación ({marcador: original}) si el token es el
+        suyo; None si no existe, venció o el token no corresponde.
+        """
+        ahora = time.time()
+        with self._lock:
+            if not self._autorizada(conversacion_id, token, ahora):
+                return None
+            return dict(self._entradas[conversacion_id][2])
+
+    def borrar(self, conversacion_id: str, token: str) -> bool:
+        with self._lock:
+            if not self._autorizada(conversacion_id, token, time.time()):
+                return False
+            existia = self._entradas.pop(conversacion_id, None) is not None
+            if self._disco is not None:
+                existia = self._disco.execute(
+                    "DELETE FROM marcadores WHERE id = ?", (conversacion_id,)
+                ).rowcount > 0 or existia
+            if existia:
+                boveda_desalojos.add(1, {"motivo": "borrado"})
+            return existia
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+cache_aciertos = meter.create_counter(
+    name="cache_aciertos_total",
+    description="Resultados de /ofuscar servidos desde la caché",
+    unit="1",
+)
+cache_fallos = meter.create_counter(
+    name="cache_fallos_total",
+    description="Resultados de /ofuscar que no estaban en la caché",
+    unit="1",
+)
+cache_desalojos = meter.create_counter(
+    name="cache_desalojos_total",
+    description="Entradas desalojadas de la caché por tamaño, TTL o invalidación",
+    unit="1",
+)
+
+
+class CacheResultados:
+    """
+    Caché de resultados de ofuscación direccionada por contenido.
+
+    La clave es el hash de (texto, motor, huella de los diccionarios, TAG_APERTURA,
+    TAG_CIERRE, configuración del motor). La configuración es la que devuelve
+    `configuracion()` de cada motor (modelo, backend y parámetros del NER,
+    componentes de spaCy, CASCADA_NER), así un cambio de configuración no sirve
+    resultados del nivel en disco calculados con la anterior. Lo que no entra
+    en la clave (por ejemplo, la versión de las librerías o el contenido de un
+    modelo con el mismo nombre) requiere vaciar la caché a mano. En memoria
+    es una LRU acotada por cantidad de entradas (CACHE_MAX_ENTRADAS) y por bytes
+    (CACHE_MAX_BYTES), con vencimiento por TTL (CACHE_TTL, en segundos).
+
+    Con CACHE_DISCO_PATH se agrega un segundo nivel en SQLite que sobrevive a
+    los reinicios, acotado a CACHE_DISCO_MAX_ENTRADAS. Los handlers async usan
+    `buscar` y `almacenar`, que consultan la memoria en el event loop y llevan
+    el I/O del disco a un hilo.
+    """
+
+    max_entradas = int(os.getenv("CACHE_MAX_ENTRADAS", "1024"))
+    max_bytes = int(os.getenv("CACHE_MAX_BYTES", str(64 * 2**20)))
+    ttl = float(os.getenv("CACHE_TTL", "3600"))
+    path_disco = os.getenv("CACHE_DISCO_PATH", "")
+    max_entradas_disco = int(os.getenv("CACHE_DISCO_MAX_ENTRADAS", "100000"))
+    intervalo_poda = float(os.getenv("CACHE_DISCO_PODA_INTERVALO", "60"))
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self, max_entradas: int = None, max_bytes: int = None, ttl: float = None, path_disco: str = None):
+        self.max_entradas = max_entradas or self.max_entradas
+        self.max_bytes = max_bytes or self.max_bytes
+        self.ttl = ttl or self.ttl
+        self.path_disco = self.path_disco if path_disco is None else path_disco
+
+        # clave -> (vence, resultado serializado)
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # La conexión de SQLite tiene su propio lock: el I/O nunca retiene el de la memoria
+        self._lock_disco = threading.Lock()
+        self._ultima_poda = time.time()
+        self._disco = self._abrir_disco() if self.path_disco else None
+
+    @classmethod
+    def instancia(cls) -> "CacheResultados":
+        if cls._instancia is None:
+            with cls._lock_instancia:
+                if cls._instancia is None:
+                    cls._instancia = cls()
+        return cls._instancia
+
+    @staticmethod
+    def clave(texto: str, motor: str, huella_diccionarios: str, apertura: str, cierre: str,
+              configuracion: dict = None) -> str:
+        contenido = json.dumps([texto, motor, huella_diccionarios, apertura, cierre, configuracion or {}],
+                               ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def _abrir_disco(self):
+        directorio = os.path.dirname(self.path_disco)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = sqlite3.connect(self.path_disco, check_same_thread=False, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=OFF")
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS resultados (clave TEXT PRIMARY KEY, vence REAL, datos TEXT)"
+        )
+        conexion.execute("DELETE FROM resultados WHERE vence < ?", (time.time(),))
+        return conexion
+
+    def _quitar(self, clave: str):
+        _, datos = self._entradas.pop(clave)
+        self._bytes -= len(datos)
+
+    def obtener_memoria(self, clave: str):
+        """
+        Busca solo en el nivel en memoria: no toca el disco y se puede llamar
+        desde el event loop.
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            vence, datos = entrada
+            if vence >= ahora:
+                self._entradas.move_to_end(clave)
+                cache_aciertos.add(1, {"nivel": "memoria"})
+                return json.loads(datos)
+            self._quitar(clave)
+            cache_desalojos.add(1, {"motivo": "ttl"})
+        return None
+
+    def obtener_disco(self, claves: list) -> list:
+        """
+        Busca las claves en el nivel en SQLite y sube a memoria las encontradas.
+        Hace I/O: desde el event loop se usa a través de `buscar`.
+        """
+        if self._disco is None:
+            return [None] * len(claves)
+        ahora = time.time()
+        resultados = []
+        for clave in claves:
+            with self._lock_disco:
+                fila = self._disco.execute(
+                    "SELECT vence, datos FROM resultados WHERE clave = ? AND vence >= ?", (clave, ahora)
+                ).fetchone()
+            if fila is None:
+                resultados.append(None)
+                continue
+            with self._lock:
+                self._guardar_memoria(clave, fila[1], fila[0])
+            cache_aciertos.add(1, {"nivel": "disco"})
+            resultados.append(json.loads(fila[1]))
+        return resultados
+
+    def obtener(self, clave: str):
+        resultado = self.obtener_memoria(clave)
+        if resultado is None:
+            resultado = self.obtener_disco([clave])[0]
+        if resultado is None:
+            cache_fallos.add(1)
+        return resultado
+
+    async def buscar(self, claves: list) -> list:
+        """
+        Como `obtener` para varias claves, para el event loop: la memoria se
+        consulta en el loop y las que faltan se buscan en disco en un hilo.
+        """
+        resultados = [self.obtener_memoria(clave) for clave in claves]
+        faltantes = [i for i, resultado in enumerate(resultados) if resultado is None]
+        if faltantes and self._disco is not None:
+            encontrados = await asyncio.to_thread(self.obtener_disco, [claves[i] for i in faltantes])
+            for i, resultado in zip(faltantes, encontrados):
+                resultados[i] = resultado
+        cache_fallos.add(sum(resultado is None for resultado in resultados))
+        return resultados
+
+    def _guardar_memoria(self, clave: str, datos: str, vence: float):
+        if len(datos) > self.max_bytes:
+            return
+        if clave in self._entradas:
+            self._quitar(clave)
+        self._entradas[clave] = (vence, datos)
+        self._bytes += len(datos)
+        while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+            self._quitar(next(iter(self._entradas)))
+            cache_desalojos.add(1, {"motivo": "tamanio"})
+
+    def _serializar(self, pares: list) -> list:
+        # Serializado en ASCII: el largo del string es el tamaño en bytes
+        vence = time.time() + self.ttl
+        filas = [(clave, vence, json.dumps(resultado)) for clave, resultado in pares]
+        with self._lock:
+            for clave, vence, datos in filas:
+                self._guardar_memoria(clave, datos, vence)
+        return filas
+
+    def guardar_disco(self, filas: list):
+        """
+        Escribe (clave, vence, datos) en el nivel en SQLite y, cada
+        CACHE_DISCO_PODA_INTERVALO segundos, borra lo vencido y lo que excede
+        CACHE_DISCO_MAX_ENTRADAS. Hace I/O: desde el event loop se usa a través
+        de `almacenar`.
+        """
+        if self._disco is None or not filas:
+            return
+        with self._lock_disco:
+            self._disco.executemany("INSERT OR REPLACE INTO resultados (clave, vence, datos) VALUES (?, ?, ?)", filas)
+            ahora = time.time()
+            if ahora - self._ultima_poda >= self.intervalo_poda:
+                self._ultima_poda = ahora
+                self._podar_disco()
+
+    def guardar(self, clave: str, resultado: dict):
+        self.guardar_disco(self._serializar([(clave, resultado)]))
+
+    async def almacenar(self, pares: list):
+        """
+        Como `guardar` para varios (clave, resultado), para el event loop: la
+        memoria se actualiza en el loop y el disco en un hilo.
+        """
+        filas = self._serializar(pares)
+        if self._disco is not None:
+            await asyncio.to_thread(self.guardar_disco, filas)
+
+    def _podar_disco(self):
+        self._disco.execute("DELETE FROM resultados WHERE vence < ?", (time.time(),))
+        self._disco.execute(
+            "DELETE FROM resultados WHERE clave NOT IN "
+            "(SELECT clave FROM resultados ORDER BY vence DESC LIMIT ?)", (self.max_entradas_disco,)
+        )
+
+    def invalidar(self, *_):
+        """
+        Vacía ambos niveles (por ejemplo, al recargar los diccionarios).
+        """
+        with self._lock:
+            cache_desalojos.add(len(self._entradas), {"motivo": "invalidacion"})
+            self._entradas.clear()
+            self._bytes = 0
+        if self._disco is not None:
+            with self._lock_disco:
+                self._disco.execute("DELETE FROM resultados")
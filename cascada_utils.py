@@ -0,0 +1,125 @@
+import os
+import re
+
+from rapido_utils import RapidoUtils
+from reescritura_utils import ReescrituraUtils
+
+
+class CascadaUtils:
+    """
+    Motor "cascada": detectores baratos primero y NER solo donde hace falta.
+
+    1. Los patrones y diccionarios del motor rapido se corren sobre todo el texto.
+    2. Un filtro barato elige las oraciones que podrían tener nombres o fechas:
+       palabras con mayúscula que no abren la oración, una primera palabra con
+       mayúscula que no es un inicio habitual, nombres de meses o días, etc.
+    3. Solo esas oraciones pasan por el NER del motor CASCADA_NER (presidio por
+       defecto), todas juntas en un lote, y sus posiciones se trasladan al texto.
+    """
+
+    apertura = os.getenv("TAG_APERTURA", "")
+    cierre = os.getenv("TAG_CIERRE", "")
+    motor_ner = os.getenv("CASCADA_NER", "presidio")
+
+    usa_ner = True
+
+    _patron_oracion = re.compile(r"[^.!?\n]+(?:[.!?]+|\n+|$)")
+    _patron_palabra = re.compile(r"[^\W\d_][\w'-]*")
+    _patron_fecha = re.compile(
+        r"\b(?:enero|febrero|marzo|abril|mayo|junio|julio|agosto|sep?tiembre|octubre|noviembre|diciembre|"
+        r"lunes|martes|mi[eé]rcoles|jueves|viernes|s[aá]bado|domingo|ayer|hoy|mañana|"
+        r"january|february|march|april|june|july|august|september|october|november|december)\b"
+        r"|\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b",
+        re.IGNORECASE,
+    )
+
+    # Palabras que suelen abrir una oración sin ser un nombre propio
+    inicios_comunes = {
+        "el", "la", "los", "las", "un", "una", "unos", "unas", "lo", "al", "del", "de", "en", "con", "por", "para",
+        "sin", "sobre", "desde", "hasta", "entre", "y", "o", "pero", "que", "si", "no", "sí", "se", "me", "te", "le",
+        "nos", "les", "mi", "mis", "tu", "tus", "su", "sus", "yo", "él", "ella", "ellos", "ellas", "usted",
+        "ustedes", "este", "esta", "estos", "estas", "ese", "esa", "eso", "esto", "aquel", "hay", "es", "son",
+        "fue", "era", "está", "están", "hola", "buenas", "buenos", "gracias", "quiero", "necesito",
+        "quisiera", "puede", "podés", "podrías", "cómo", "como", "qué", "cuál", "cuándo", "dónde", "quién",
+        "saludos", "atentamente", "también", "además", "luego", "después", "antes", "entonces", "cuando",
+        "the", "a", "an", "i", "we", "you", "it", "this", "that", "please", "hello", "hi", "thanks",
+    }
+
+    def __init__(self, ner=None):
+        self.rapido = RapidoUtils()
+        self.ner = ner
+
+    def _ofuscador_ner(self):
+        if self.ner is None:
+            if self.motor_ner == "scrubadub":
+                from scrubadub_utils import ScrubadubUtils
+                self.ner = ScrubadubUtils()
+            else:
+                from presidio_utils import PresidioUtils
+                self.ner = PresidioUtils()
+        return self.ner
+
+    def precargar(self):
+        self.rapido.precargar()
+        self._ofuscador_ner().precargar()
+
+    def configuracion(self) -> dict:
+        return {"motor_ner": self.motor_ner, "ner": self._ofuscador_ner().configuracion()}
+
+    def candidata(self, oracion: str) -> bool:
+        """
+        Filtro barato: True si la oración podría tener un nombre o una fecha.
+        """
+        if self._patron_fecha.search(oracion):
+            return True
+        palabras = self._patron_palabra.findall(oracion)
+        if not palabras:
+            return False
+        if palabras[0][0].isupper() and palabras[0].lower() not in self.inicios_comunes:
+            return True
+        return any(palabra[0].isupper() for palabra in palabras[1:])
+
+    def oraciones_candidatas(self, text: str) -> list:
+        """
+        Devuelve (inicio, fin) de las oraciones que pasan el filtro.
+        """
+        return [(m.start(), m.end()) for m in self._patron_oracion.finditer(text) if self.candidata(m.group())]
+
+    def detectar_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        resultados = [self.rapido.detectar(text) for text in textos]
+
+        # Todas las oraciones candidatas de todos los textos van en un único lote de NER
+        candidatas = [
+            (i, inicio, fin)
+            for i, text in enumerate(textos)
+            for inicio, fin in self.oraciones_candidatas(text)
+        ]
+        if candidatas:
+            lotes = self._ofuscador_ner().detectar_lote(
+                [textos[i][inicio:fin] for i, inicio, fin in candidatas], tamanio_lote, procesos
+            )
+            for (i, inicio, _), entidades in zip(candidatas, lotes):
+                # Las entidades de los detectores baratos van primero: ante el mismo
+                # fragmento gana su prefijo al resolver solapamientos
+                resultados[i].extend(e._replace(inicio=e.inicio + inicio, fin=e.fin + inicio) for e in entidades)
+        return resultados
+
+    def detectar(self, text: str) -> list:
+        return self.detectar_lote([text])[0]
+
+    def resultado(self, text: str, entidades: list):
+        texto_ofuscado, mapeos = ReescrituraUtils(self.apertura, self.cierre).aplicar(text, entidades)
+
+        # Retornamos el texto ofuscado y los mapeos
+        return {
+            "texto_ofuscado": texto_ofuscado,
+            "mapeos": mapeos,
+            "motor": "cascada"
+        }
+
+    def ofuscar(self, text: str):
+        return self.resultado(text, self.detectar(text))
+
+    def ofuscar_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        lotes = self.detectar_lote(textos, tamanio_lote, procesos)
+        return [self.resultado(text, entidades) for text, entidades in zip(textos, lotes)]
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class DesofuscarUtils:
+    """
+    Desofusca textos con un único patrón compilado a partir de los mapeos:
+    una alternancia con todos los marcadores que recorre el texto una sola vez.
+
+    Los patrones compilados se guardan en una caché LRU indexada por la huella
+    de los mapeos, así las llamadas repetidas con los mismos mapeos no vuelven
+    a compilar.
+    """
+
+    cache_max = int(os.getenv("DESOFUSCAR_CACHE_MAX", "256"))
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def huella(mapeos: dict) -> str:
+        contenido = json.dumps(mapeos, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def invertir(mapeos: dict) -> dict:
+        """Marcador -> texto original, a partir de mapeos {clave: {original: marcador}}."""
+        inverso = {}
+        for _, mapping in mapeos.items():
+            for original, reemplazo in mapping.items():
+                if reemplazo:
+                    inverso.setdefault(reemplazo, original)
+        return inverso
+
+    @classmethod
+    def compilar(cls, mapeos: dict = None, marcadores: dict = None):
+        """
+        Devuelve (patrón, inverso): el patrón encuentra cualquier marcador y el
+        inverso traduce cada marcador a su texto original. Se puede pasar el
+        inverso ya armado en `marcadores` (marcador -> original).
+        """
+        inverso = marcadores if marcadores is not None else cls.invertir(mapeos)
+
+        if not inverso:
+            return None, inverso
+
+        # Los más largos primero, para que un marcador nunca corte a otro que lo contiene
+        alternativas = sorted(inverso, key=len, reverse=True)
+        patron = re.compile("|".join(re.escape(a) for a in alternativas))
+        return patron, inverso
+
+    @classmethod
+    def obtener(cls, mapeos: dict = None, clave: str = None, marcadores: dict = None):
+        """
+        Patrón compilado para los mapeos (o los `marcadores`). Quien ya tiene
+        una clave estable para ellos (la bóveda usa conversación y versión) la
+        pasa en `clave` y se evita calcular la huella.
+        """
+        if not clave:
+            clave = cls.huella(mapeos) if marcadores is None else "marcadores:" + cls.huella(marcadores)
+        with cls._lock:
+            compilado = cls._cache.get(clave)
+            if compilado is not None:
+                cls._cache.move_to_end(clave)
+                return compilado
+
+        compilado = cls.compilar(mapeos, marcadores)
+        with cls._lock:
+            cls._cache[clave] = compilado
+            cls._cache.move_to_end(clave)
+            while len(cls._cache) > cls.cache_max:
+                cls._cache.popitem(last=False)
+        return compilado
+
+    def desofuscar(self, text: str, mapeos: dict = None, clave: str = None, marcadores: dict = None) -> str:
+        patron, inverso = self.obtener(mapeos, clave, marcadores)
+        if patron is None:
+            return text
+        return patron.sub(lambda m: inverso[m.group(0)], text)
+
+
+class DesofuscadorStreaming:
+    """
+    Desofusca un texto que llega por partes (la respuesta de un LLM en
+    streaming) y devuelve el texto restaurado de cada parte apenas llega.
+
+    Solo se retiene el sufijo más corto que todavía puede ser el comienzo de
+    un marcador (el prefijo propio más largo de alguno de los marcadores de los
+    mapeos), así que lo retenido nunca supera el largo de un marcador y cada
+    parte cuesta O(largo de la parte). Los marcadores ({apertura}PREFIJO_hash{cierre})
+    no se solapan entre sí, por lo que todo lo anterior al sufijo retenido se
+    puede desofuscar de forma definitiva.
+    """
+
+    def __init__(self, mapeos: dict = None, clave: str = None, marcadores: dict = None):
+        self.patron, self.inverso = DesofuscarUtils.obtener(mapeos, clave, marcadores)
+        self.prefijos = {marcador[:i] for marcador in self.inverso for i in range(1, len(marcador))}
+        self.max_retenido = max((len(marcador) - 1 for marcador in self.inverso), default=0)
+        self._pendiente = ""
+
+    def _retenido(self, texto: str) -> int:
+        for largo in range(min(self.max_retenido, len(texto)), 0, -1):
+            if texto[-largo:] in self.prefijos:
+                return largo
+        return 0
+
+    def _restaurar(self, texto: str) -> str:
+        if self.patron is None or not texto:
+            return texto
+        return self.patron.sub(lambda m: self.inverso[m.group(0)], texto)
+
+    def alimentar(self, fragmento: str) -> str:
+        texto = self._pendiente + fragmento
+        corte = len(texto) - self._retenido(texto)
+        self._pendiente = texto[corte:]
+        return self._restaurar(texto[:corte])
+
+    def finalizar(self) -> str:
+        texto, self._pendiente = self._pendiente, ""
+        return self._restaurar(texto)
+
+
+class SesionesStreaming:
+    """
+    Desofuscadores en streaming del lado del servidor, para clientes que
+    reciben la respuesta del LLM de a partes y la mandan igual (el hook
+    `stream` del filtro de open-webui). Así los marcadores de la bóveda nunca
+    salen del servidor: el cliente manda cada parte y recibe el texto ya
+    restaurado.
+
+    Cada sesión vive hasta su última parte (`fin`) o hasta DESOFUSCAR_SESIONES_TTL
+    segundos sin uso, y hay como mucho DESOFUSCAR_SESIONES_MAX abiertas.
+    """
+
+    max_sesiones = int(os.getenv("DESOFUSCAR_SESIONES_MAX", "1000"))
+    ttl = float(os.getenv("DESOFUSCAR_SESIONES_TTL", "600"))
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self):
+        # sesión -> [vence, DesofuscadorStreaming]
+        self._sesiones = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instancia(cls) -> "SesionesStreaming":
+        if cls._instancia is None:
+            with cls._lock_instancia:
+                if cls._instancia is None:
+                    cls._instancia = cls()
+        return cls._instancia
+
+    def alimentar(self, sesion: str, fragmento: str, fin: bool, crear):
+        """
+        Pasa una parte por el desofuscador de la sesión y devuelve el texto
+        restaurado. `crear()` arma el DesofuscadorStreaming de una sesión nueva;
+        si devuelve None (conversación desconocida) se devuelve None.
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._sesiones.pop(sesion, None)
+        if entrada is None or entrada[0] < ahora:
+            desofuscador = crear()
+            if desofuscador is None:
+                return None
+        else:
+            desofuscador = entrada[1]
+
+        texto = desofuscador.alimentar(fragmento)
+        if fin:
+            return texto + desofuscador.finalizar()
+
+        with self._lock:
+            self._sesiones[sesion] = [ahora + self.ttl, desofuscador]
+            while len(self._sesiones) > self.max_sesiones:
+                self._sesiones.popitem(last=False)
+        return texto
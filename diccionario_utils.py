@@ -0,0 +1,344 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import unicodedata
+
+
+def _construir_tabla_acentos():
+    """
+    Arma la tabla de `str.translate` que quita acentos carácter a carácter y el
+    patrón con los caracteres que cambian la longitud del texto al normalizarlos
+    (marcas combinantes sueltas, descomposiciones de más de un carácter).
+    """
+    tabla = {}
+    especiales = []
+    for codigo in range(0x80, 0x3000):
+        ch = chr(codigo)
+        sin_acento = ''.join(c for c in unicodedata.normalize('NFD', ch) if unicodedata.category(c) != 'Mn')
+        if sin_acento == ch:
+            continue
+        if len(sin_acento) == 1:
+            tabla[codigo] = sin_acento
+        else:
+            especiales.append(re.escape(ch))
+    patron = re.compile("[" + "".join(especiales) + "]") if especiales else None
+    return tabla, patron
+
+
+TABLA_ACENTOS, _PATRON_ESPECIALES = _construir_tabla_acentos()
+_PATRON_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def quitar_acentos(texto: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def normalizar(texto: str):
+    """
+    Devuelve (texto_normalizado, mapa) con el texto en minúsculas y sin acentos.
+    `mapa` es None cuando las posiciones coinciden con las del texto original
+    (el caso habitual); si no, es la lista posición normalizada -> original.
+    """
+    minusculas = texto.lower()
+    if len(minusculas) == len(texto) and (_PATRON_ESPECIALES is None or not _PATRON_ESPECIALES.search(minusculas)):
+        return minusculas.translate(TABLA_ACENTOS), None
+
+    # Camino lento: solo para textos con caracteres que cambian de longitud
+    normalizados = []
+    mapa = []
+    for i, ch in enumerate(texto):
+        for c in quitar_acentos(ch.lower()):
+            normalizados.append(c)
+            mapa.append(i)
+    return ''.join(normalizados), mapa
+
+
+class MatcherDiccionario:
+    """
+    Buscador de entradas de diccionario insensible a acentos y mayúsculas,
+    pensado para padrones de cientos de miles de nombres.
+
+    Las entradas se normalizan y se parten en tokens. El índice guarda cada
+    entrada como secuencia de tokens y, por cada primer token, la cantidad máxima
+    de tokens de las entradas que empiezan con él. La búsqueda recorre los tokens
+    del texto una vez y prueba la coincidencia más larga en cada posición.
+    """
+
+    VERSION_INDICE = 2
+
+    def __init__(self, entradas=None):
+        self.frases = set()
+        self.max_tokens = {}
+        for entrada in entradas or []:
+            self.agregar(entrada)
+
+    def __len__(self):
+        return len(self.frases)
+
+    def agregar(self, entrada: str):
+        normalizado, _ = normalizar(entrada.strip())
+        tokens = _PATRON_TOKEN.findall(normalizado)
+        if not tokens:
+            return
+        self.frases.add(" ".join(tokens))
+        if self.max_tokens.get(tokens[0], 0) < len(tokens):
+            self.max_tokens[tokens[0]] = len(tokens)
+
+    def buscar(self, texto: str) -> list:
+        """
+        Devuelve las coincidencias como lista de (inicio, fin) sobre `texto`.
+        """
+        normalizado, mapa = normalizar(texto)
+        tokens = [(m.start(), m.end(), m.group()) for m in _PATRON_TOKEN.finditer(normalizado)]
+        resultado = []
+        i = 0
+        while i < len(tokens):
+            maximo = self.max_tokens.get(tokens[i][2])
+            if not maximo:
+                i += 1
+                continue
+
+            encontrado = 0
+            for largo in range(min(maximo, len(tokens) - i), 0, -1):
+                tramo = tokens[i:i + largo]
+                # Los tokens de una entrada solo pueden estar separados por espacios
+                if largo > 1 and not all(normalizado[a[1]:b[0]].isspace() for a, b in zip(tramo, tramo[1:])):
+                    continue
+                if " ".join(t[2] for t in tramo) in self.frases:
+                    encontrado = largo
+                    break
+
+            if not encontrado:
+                i += 1
+                continue
+
+            inicio, fin = tokens[i][0], tokens[i + encontrado - 1][1]
+            if mapa is not None:
+                inicio, fin = mapa[inicio], mapa[fin - 1] + 1
+            resultado.append((inicio, fin))
+            i += encontrado
+        return resultado
+
+    @staticmethod
+    def ruta_indice(ruta_csv: str) -> str:
+        directorio, nombre = os.path.split(ruta_csv)
+        return os.path.join(directorio, f".{nombre}.indice.json")
+
+    @classmethod
+    def desde_csv(cls, ruta_csv: str) -> "MatcherDiccionario":
+        """
+        Carga el diccionario `ruta_csv` (una entrada por fila, primera columna).
+        El índice compilado se guarda junto al CSV y se reutiliza mientras el CSV
+        no cambie (misma fecha de modificación y tamaño). Es JSON y no pickle: el
+        directorio de diccionarios lo edita el usuario (y suele ser un volumen
+        montado), así que leer el índice nunca puede ejecutar código.
+        """
+        estado = os.stat(ruta_csv)
+        firma = [cls.VERSION_INDICE, estado.st_mtime_ns, estado.st_size]
+        ruta_indice = cls.ruta_indice(ruta_csv)
+
+        try:
+            with open(ruta_indice, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos["firma"] == firma:
+                matcher = cls()
+                matcher.frases = set(datos["frases"])
+                matcher.max_tokens = {token: int(maximo) for token, maximo in datos["max_tokens"].items()}
+                return matcher
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+        with open(ruta_csv, "r", encoding="utf-8") as f:
+            matcher = cls(row[0] for row in csv.reader(f) if row)
+
+        try:
+            temporal = f"{ruta_indice}.{os.getpid()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump({"firma": firma, "frases": sorted(matcher.frases), "max_tokens": matcher.max_tokens}, f,
+                          ensure_ascii=False)
+            os.replace(temporal, ruta_indice)
+        except OSError as e:
+            # Un volumen de solo lectura no impide usar el diccionario
+            print(f"⚠️ No se pudo guardar el índice {ruta_indice}: {e}", file=sys.stderr)
+        return matcher
+
+    @classmethod
+    def unir(cls, matchers: list) -> "MatcherDiccionario":
+        if len(matchers) == 1:
+            return matchers[0]
+        unido = cls()
+        for matcher in matchers:
+            unido.frases |= matcher.frases
+            for token, maximo in matcher.max_tokens.items():
+                if unido.max_tokens.get(token, 0) < maximo:
+                    unido.max_tokens[token] = maximo
+        return unido
+
+
+class GestorDiccionarios:
+    """
+    Mantiene compilados en memoria todos los diccionarios (*.csv) de
+    PATH_DICCIONARIOS, cada uno asociado a un tipo de entidad.
+
+    Un hilo en segundo plano revisa cada DICCIONARIOS_INTERVALO segundos la
+    fecha de modificación y el tamaño de los archivos; si algo cambió recompila
+    y reemplaza el conjunto de matchers de forma atómica. Las requests solo leen
+    el conjunto vigente y nunca tocan el disco.
+
+    La asociación archivo -> entidad se puede extender con DICCIONARIOS_ENTIDADES,
+    por ejemplo "barrios:CUSTOM_LOCATION:lugares,empresas:CUSTOM_ORG:organizaciones".
+    Los archivos sin asociación usan CUSTOM_<NOMBRE> y el nombre del archivo como
+    grupo de mapeo.
+    """
+
+    path_diccionarios = os.getenv("PATH_DICCIONARIOS", "diccionarios")
+    intervalo = float(os.getenv("DICCIONARIOS_INTERVALO", "5"))
+
+    # nombre de archivo (sin .csv) -> (entidad, grupo de mapeo)
+    entidades = {
+        "nombres": ("CUSTOM_NAME", "nombres"),
+        "apellidos": ("CUSTOM_NAME", "nombres"),
+        "organizaciones": ("CUSTOM_ORG", "organizaciones"),
+        "calles": ("CUSTOM_STREET", "calles"),
+    }
+
+    nombres_example = [ 'Amarillo', 'Irma', 'Pablo','Walter','Juan', 'María', 'Carlos', 'Ana', 'José', 'Laura', 'Pedro', 
+                'Miguel', 'Carmen', 'Antonio', 'Isabel', 'Francisco', 'Patricia', 'Manuel', 'Rosa','Sofía', 
+                'Jorge', 'Marta', 'Roberto', 'Lucia', 'Diego', 'Paula', 'Fernando', 'Andrea','Luis', 'Elena',
+                'Raúl', 'Gabriela', 'Alberto', 'Silvia', 'Ricardo', 'Cristina', 'Eduardo', 'Beatriz', 'María'
+                'Sergio', 'Mónica', 'Daniel', 'Claudia', 'Martín', 'Sandra', 'Alejandro', 'Teresa', 'Javier',
+                'Natalia', 'Guillermo', 'Victoria', 'Manuel', 'Paula', 'Fernando', 'Andrea', 'Raúl', 'Gabriela',
+                'Alberto', 'Silvia', 'Ricardo', 'Cristina', 'Eduardo', 'Beatriz', 'Sergio', 'Mónica', 'Daniel',
+                'Claudia', 'Martín', 'Sandra', 'Alejandro', 'Teresa', 'Javier', 'Natalia', 'Guillermo', 'Victoria',
+                'Garcia', 'García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez',
+                'Pérez', 'Gómez', 'Martín', 'Jiménez', 'Ruiz', 'Hernández', 'Díaz', 'Moreno',
+                'Álvarez', 'Muñoz', 'Romero', 'Alonso', 'Gutiérrez', 'Navarro', 'Torres',
+                'Domínguez', 'Vázquez', 'Ramos', 'Gil', 'Ramírez', 'Serrano', 'Blanco', 'Molina'
+            ]
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self, path_diccionarios: str = None):
+        self.path_diccionarios = path_diccionarios or self.path_diccionarios
+        self.entidades = dict(self.entidades)
+        for item in os.getenv("DICCIONARIOS_ENTIDADES", "").split(","):
+            partes = [p.strip() for p in item.split(":")]
+            if len(partes) >= 2 and partes[0]:
+                self.entidades[partes[0]] = (partes[1], partes[2] if len(partes) > 2 else partes[0])
+
+        # (versión, {entidad: matcher}, {entidad: grupo de mapeo}, huella), se reemplaza entero
+        self._estado = (0, {}, {}, "")
+        self._firma = None
+        self._suscriptores = []
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instancia(cls) -> "GestorDiccionarios":
+        """
+        Gestor compartido por el proceso. Si nadie lo inició (por ejemplo en el
+        lifespan), se inicia en el primer uso.
+        """
+        if cls._instancia is None:
+            with cls._lock_instancia:
+                if cls._instancia is None:
+                    gestor = cls()
+                    gestor.iniciar()
+                    cls._instancia = gestor
+        return cls._instancia
+
+    @property
+    def version(self) -> int:
+        return self._estado[0]
+
+    @property
+    def huella(self) -> str:
+        """
+        Identifica el contenido vigente de los diccionarios (archivos, fechas y
+        tamaños); a diferencia de `version`, se mantiene entre reinicios.
+        """
+        return self._estado[3]
+
+    def matchers(self) -> dict:
+        return self._estado[1]
+
+    def grupos(self) -> dict:
+        return self._estado[2]
+
+    def entidad(self, nombre_archivo: str) -> tuple:
+        if nombre_archivo in self.entidades:
+            return self.entidades[nombre_archivo]
+        return (f"CUSTOM_{nombre_archivo.upper()}", nombre_archivo)
+
+    def suscribir(self, callback):
+        """
+        Registra `callback(gestor)`, que se llama después de cada recarga.
+        """
+        self._suscriptores.append(callback)
+
+    def iniciar(self):
+        # Crear directorio diccionarios si no existe
+        os.makedirs(self.path_diccionarios, exist_ok=True)
+
+        # Verifico si existe el archivo nombres.csv en el directorio diccionarios
+        if not os.path.exists(f"{self.path_diccionarios}/nombres.csv"):
+            with open(f"{self.path_diccionarios}/nombres.csv", "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                for nombre in self.nombres_example:
+                    writer.writerow([nombre])
+
+        self.revisar()
+        if self.intervalo > 0 and self._hilo is None:
+            self._hilo = threading.Thread(target=self._vigilar, name="gestor-diccionarios", daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def _vigilar(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.revisar()
+            except Exception as e:
+                print(f"❌ Error al recargar diccionarios: {e}", file=sys.stderr)
+
+    def _archivos(self) -> list:
+        with os.scandir(self.path_diccionarios) as entradas:
+            return sorted(
+                (e.path, e.stat().st_mtime_ns, e.stat().st_size)
+                for e in entradas if e.is_file() and e.name.endswith(".csv")
+            )
+
+    def revisar(self) -> bool:
+        """
+        Recompila los diccionarios si cambió algún archivo. Devuelve True si hubo recarga.
+        """
+        with self._lock:
+            archivos = self._archivos()
+            if archivos == self._firma:
+                return False
+
+            por_entidad = {}
+            grupos = {}
+            for ruta, _, _ in archivos:
+                nombre = os.path.splitext(os.path.basename(ruta))[0]
+                entidad, grupo = self.entidad(nombre)
+                por_entidad.setdefault(entidad, []).append(MatcherDiccionario.desde_csv(ruta))
+                grupos[entidad] = grupo
+
+            matchers = {entidad: MatcherDiccionario.unir(lista) for entidad, lista in por_entidad.items()}
+            huella = hashlib.sha256(repr([(os.path.basename(r), m, t) for r, m, t in archivos]).encode()).hexdigest()
+            self._estado = (self._estado[0] + 1, matchers, grupos, huella)
+            self._firma = archivos
+
+        total = sum(len(m) for m in matchers.values())
+        print(f"📚 Diccionarios v{self.version}: {len(archivos)} archivos, {total} entradas")
+        for callback in self._suscriptores:
+            callback(self)
+        return True
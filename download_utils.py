@@ -1,95 +1,356 @@
+import argparse
+import hashlib
+import json
 import os
-import spacy
-import os
+import shutil
 import tarfile
+import time
 import urllib.request
-import sys
-import subprocess
-import importlib
-import site
-from spacy.cli.download import download 
-from transformers import AutoModelForTokenClassification, AutoTokenizer # type: ignore
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# backend -> (directorio del modelo exportado dentro de PATH_MODELOS, archivo .onnx)
+RUTAS_ONNX = {
+    "onnx": ("roberta-base-bne-ner-onnx", "model.onnx"),
+    "onnx-int8": ("roberta-base-bne-ner-onnx-int8", "model_quantized.onnx"),
+}
+
 
 class DownloadUtils:
-    
-    path_destino = "./modelos"
+    """
+    Aprovisiona los modelos declarados en el manifiesto (modelos.json).
+
+    Cada modelo se descarga a un directorio temporal, se verifica (sha256 del
+    archivo si el manifiesto lo fija), se extrae y recién entonces se mueve a su
+    destino con un sello (.sello.json) que registra la entrada del manifiesto y
+    el tamaño y sha256 de cada archivo. Los modelos se bajan en paralelo.
+
+    Pensado para correr en el build de la imagen (`python download_utils.py`);
+    al arrancar, `asegurar` solo compara los sellos con el manifiesto (stat de
+    los archivos, sin hashear) y descarga lo que falte salvo con MODELOS_OFFLINE=1.
+    Los modelos de spaCy se cargan desde su ruta en disco, sin pip install.
+
+    Las entradas de tipo "onnx" no se descargan: se exportan del modelo
+    `origen` ya aprovisionado y se sellan igual que el resto. Solo cuentan si
+    se exportan (EXPORTAR_ONNX=1) o si PRESIDIO_BACKEND las usa.
+    """
+
+    path_destino = os.getenv("PATH_MODELOS", "./modelos")
+    path_manifiesto = os.getenv("MODELOS_MANIFIESTO", "modelos.json")
+    hilos = int(os.getenv("DESCARGA_HILOS", "4"))
+    offline = os.getenv("MODELOS_OFFLINE", "0") == "1"
+    # Exporta el NER de presidio a ONNX (fp32 e int8) para PRESIDIO_BACKEND=onnx/onnx-int8
+    exportar_onnx = os.getenv("EXPORTAR_ONNX", "0") == "1"
+    backend_presidio = os.getenv("PRESIDIO_BACKEND", "torch")
+
+    archivo_sello = ".sello.json"
+
+    _manifiesto = None
+
     def __init__(self):
         pass
 
-    def __exists(self, path_dir: str):
-        return Path(path_dir).exists()
+    @classmethod
+    def manifiesto(cls) -> list:
+        if cls._manifiesto is None:
+            with open(cls.path_manifiesto, encoding="utf-8") as f:
+                cls._manifiesto = json.load(f)["modelos"]
+        return cls._manifiesto
 
-    def __download(self, model_name: str, save_dir: str):
-        if self.__exists(save_dir):
-            print(f"✅ El modelo {model_name} ya existe en {save_dir}")
-            return
-        
+    @classmethod
+    def ruta_modelo(cls, relativa: str) -> str:
+        """
+        Ruta en disco de un modelo aprovisionado: todas se derivan de PATH_MODELOS.
+        """
+        return os.path.join(cls.path_destino, relativa)
+
+    @classmethod
+    def ruta_onnx(cls, backend: str) -> tuple:
+        """
+        (directorio, archivo .onnx) del NER exportado para el backend de presidio.
+        """
+        directorio, archivo = RUTAS_ONNX[backend]
+        return cls.ruta_modelo(directorio), archivo
+
+    @classmethod
+    def ruta_spacy(cls, nombre: str) -> str:
+        """
+        Ruta en disco del modelo de spaCy `nombre` si está aprovisionado; si no,
+        el nombre tal cual (spaCy lo busca entre los paquetes instalados).
+        """
+        for entrada in cls.manifiesto():
+            if entrada["tipo"] == "spacy" and entrada["nombre"] == nombre:
+                ruta = cls.ruta_modelo(entrada["ruta"])
+                if os.path.isdir(ruta):
+                    return ruta
+        return nombre
+
+    def entradas(self) -> list:
+        """
+        Entradas del manifiesto que corresponden a esta instalación.
+        """
+        return [e for e in self.manifiesto()
+                if e["tipo"] != "onnx" or self.exportar_onnx or e["backend"] == self.backend_presidio]
+
+    def __huella_entrada(self, entrada: dict) -> str:
+        # Un modelo exportado queda desactualizado también si cambia el modelo del que sale
+        if entrada["tipo"] == "onnx":
+            origen = next(e for e in self.manifiesto() if e["nombre"] == entrada["origen"])
+            entrada = {**entrada, "origen": origen}
+        return hashlib.sha256(json.dumps(entrada, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def __sha256_archivo(path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for bloque in iter(lambda: f.read(2**20), b""):
+                sha.update(bloque)
+        return sha.hexdigest()
+
+    def __leer_sello(self, entrada: dict):
         try:
-            os.makedirs(save_dir, exist_ok=True)
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForTokenClassification.from_pretrained(model_name)
-            tokenizer.save_pretrained(save_dir)
-            model.save_pretrained(save_dir)
-            print(f"✅ Modelo {model_name} se descargo a {save_dir}")
-        except Exception as e:
-            print(f"❌ Error al descargar el modelo {model_name}: {e}")
-
-    def __download_spacy(self, model_name: str, save_dir: str):
-        if self.__exists(save_dir):
-            print(f"✅ El modelo {model_name} ya existe en {save_dir}")
-            return
+            with open(os.path.join(self.ruta_modelo(entrada["destino"]), self.archivo_sello), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
 
-        try:    
-            download(model_name)
-            nlp = spacy.load(model_name)
-            os.makedirs(save_dir, exist_ok=True)
-            nlp.to_disk(save_dir)
-            print(f"✅ Modelo {model_name} se descargo a {save_dir}")
-        except Exception as e:
-            print(f"❌ Error al descargar el modelo {model_name}: {e}")
+    def __problema(self, entrada: dict, hashear: bool = False):
+        """
+        None si el modelo está completo; si no, el motivo. Sin `hashear` solo
+        compara tamaños, que es lo que se hace al arrancar.
+        """
+        sello = self.__leer_sello(entrada)
+        if sello is None:
+            return "sin sello"
+        if sello.get("entrada") != self.__huella_entrada(entrada):
+            return "el manifiesto cambió"
+        directorio = self.ruta_modelo(entrada["destino"])
+        for relativo, (tamanio, sha256) in sello["archivos"].items():
+            path = os.path.join(directorio, relativo)
+            try:
+                if os.stat(path).st_size != tamanio:
+                    return f"{relativo}: tamaño distinto"
+            except OSError:
+                return f"{relativo}: no existe"
+            if hashear and self.__sha256_archivo(path) != sha256:
+                return f"{relativo}: sha256 distinto"
+        return None
 
+    def validar(self, hashear: bool = False) -> dict:
+        """
+        Devuelve {nombre: motivo} de los modelos incompletos o desactualizados.
+        """
+        problemas = {}
+        for entrada in self.entradas():
+            problema = self.__problema(entrada, hashear)
+            if problema:
+                problemas[entrada["nombre"]] = problema
+        return problemas
 
-    def __download_spacy_model_to_folder(self, model_name: str, target_dir: str = "./modelos"):
-        if self.__exists(f"{target_dir}/{model_name}-3.8.0"):
-            print(f"✅ El modelo {model_name} ya existe en {target_dir}")
-            return
+    def __descargar_spacy(self, entrada: dict, temporal: str) -> str:
+        archivo = temporal + ".tar.gz"
+        sha = hashlib.sha256()
+        print(f"📥 Descargando {entrada['nombre']}...")
+        with urllib.request.urlopen(entrada["url"]) as respuesta, open(archivo, "wb") as f:
+            for bloque in iter(lambda: respuesta.read(2**20), b""):
+                sha.update(bloque)
+                f.write(bloque)
+        if entrada.get("sha256") and sha.hexdigest() != entrada["sha256"]:
+            os.remove(archivo)
+            raise ValueError(f"sha256 de {entrada['url']} no coincide con el manifiesto")
 
-        os.makedirs(target_dir, exist_ok=True)
-        url = f"https://github.com/explosion/spacy-models/releases/download/{model_name}-3.8.0/{model_name}-3.8.0.tar.gz"
-        tar_path = os.path.join(target_dir, f"{model_name}.tar.gz")
+        print(f"📦 Extrayendo {entrada['nombre']}...")
+        with tarfile.open(archivo, "r:gz") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(path=temporal, filter="data")
+            else:
+                tar.extractall(path=temporal)
+        os.remove(archivo)
 
-        print(f"📥 Descargando {model_name}...")
-        urllib.request.urlretrieve(url, tar_path)
+        # El tar trae un único directorio raíz (<modelo>-<versión>)
+        contenido = os.listdir(temporal)
+        if len(contenido) == 1 and os.path.isdir(os.path.join(temporal, contenido[0])):
+            return os.path.join(temporal, contenido[0])
+        return temporal
 
-        print(f"📦 Extrayendo a {target_dir}...")
-        with tarfile.open(tar_path, "r:gz") as tar:
-            tar.extractall(path=target_dir)
+    def __descargar_huggingface(self, entrada: dict, temporal: str) -> str:
+        from huggingface_hub import snapshot_download
 
-        print("✅ Descarga y extracción completa.")
-        return os.path.join(target_dir, model_name)
+        print(f"📥 Descargando {entrada['repo']}...")
+        snapshot_download(
+            repo_id=entrada["repo"],
+            revision=entrada.get("revision"),
+            allow_patterns=entrada.get("archivos"),
+            local_dir=temporal,
+        )
+        shutil.rmtree(os.path.join(temporal, ".cache"), ignore_errors=True)
+        return temporal
 
-    def __instalar_modelo_spacy_local(self, nombre_modelo: str, ruta_local: str):
+    def __sellar(self, entrada: dict, directorio: str):
+        archivos = {}
+        for path in sorted(Path(directorio).rglob("*")):
+            if path.is_file():
+                archivos[path.relative_to(directorio).as_posix()] = (path.stat().st_size,
+                                                                     self.__sha256_archivo(str(path)))
+        sello = {"entrada": self.__huella_entrada(entrada), "archivos": archivos}
+        with open(os.path.join(directorio, self.archivo_sello), "w", encoding="utf-8") as f:
+            json.dump(sello, f)
+
+    def __provisionar(self, entrada: dict):
         """
-        Instala un modelo local de spaCy solo si no está ya instalado.
+        Descarga, verifica y sella un modelo. El destino se reemplaza recién al
+        final, así un corte a mitad de camino nunca deja un modelo a medias.
         """
+        inicio = time.perf_counter()
+        destino = self.ruta_modelo(entrada["destino"])
+        temporal = self.ruta_modelo(f".tmp-{entrada['destino']}")
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
         try:
-            # Verifica si el modelo ya está disponible
-            spacy.util.get_package_path(nombre_modelo)
-            print(f"✅ El modelo '{nombre_modelo}' ya está instalado.")
-        except (OSError, ImportError):
-            ruta = Path(ruta_local).resolve()
-            print(f"📦 Instalando modelo spaCy desde: {ruta}")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", str(ruta)])
-            print(f"✅ Modelo '{nombre_modelo}' instalado correctamente.")
+            if entrada["tipo"] == "spacy":
+                directorio = self.__descargar_spacy(entrada, temporal)
+            elif entrada["tipo"] == "huggingface":
+                directorio = self.__descargar_huggingface(entrada, temporal)
+            else:
+                raise ValueError(f"Tipo de modelo no reconocido: {entrada['tipo']}")
+            self.__sellar(entrada, directorio)
+            shutil.rmtree(destino, ignore_errors=True)
+            os.replace(directorio, destino)
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+        print(f"✅ Modelo {entrada['nombre']} listo en {destino} ({time.perf_counter() - inicio:.1f}s)")
 
+    def provisionar(self, nombres=None):
+        """
+        Aprovisiona en paralelo los modelos del manifiesto (o solo `nombres`).
+        """
+        os.makedirs(self.path_destino, exist_ok=True)
+        entradas = [e for e in self.entradas() if nombres is None or e["nombre"] in nombres]
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            futuros = {e["nombre"]: pool.submit(self.__provisionar, e) for e in entradas if e["tipo"] != "onnx"}
+        errores = {}
+        for nombre, futuro in futuros.items():
+            if futuro.exception() is not None:
+                errores[nombre] = futuro.exception()
+                print(f"❌ Error al aprovisionar el modelo {nombre}: {futuro.exception()}")
+        if errores:
+            raise RuntimeError(f"No se pudieron aprovisionar: {', '.join(errores)}")
+
+        # Los ONNX salen de modelos ya descargados: se exportan después
+        exportados = [e for e in entradas if e["tipo"] == "onnx"]
+        for origen in dict.fromkeys(e["origen"] for e in exportados):
+            self.__exportar_onnx(origen, [e for e in exportados if e["origen"] == origen])
+
+    def fijar(self):
+        """
+        Descarga los modelos de spaCy sin sha256 en el manifiesto y lo completa
+        con el sha256 obtenido.
+        """
+        with open(self.path_manifiesto, encoding="utf-8") as f:
+            manifiesto = json.load(f)
+        for entrada in manifiesto["modelos"]:
+            if entrada["tipo"] != "spacy" or entrada.get("sha256"):
+                continue
+            print(f"📥 Calculando sha256 de {entrada['url']}...")
+            sha = hashlib.sha256()
+            with urllib.request.urlopen(entrada["url"]) as respuesta:
+                for bloque in iter(lambda: respuesta.read(2**20), b""):
+                    sha.update(bloque)
+            entrada["sha256"] = sha.hexdigest()
+        with open(self.path_manifiesto, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        type(self)._manifiesto = None
+
+    def __exportar_onnx(self, origen: str, entradas: list):
+        """
+        Exporta el modelo `origen` a ONNX y, si alguna entrada lo pide, genera una
+        variante con cuantización dinámica int8 (solo pesos, sin dataset de
+        calibración). Como en las descargas, cada resultado se arma en un
+        directorio temporal, se sella y recién entonces reemplaza a su destino.
+        Requiere requirements-onnx.txt; cualquier error corta el aprovisionamiento.
+        """
+        from optimum.onnxruntime import ORTModelForTokenClassification, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        inicio = time.perf_counter()
+        model_dir = self.ruta_modelo(origen)
+        temporal = self.ruta_modelo(f".tmp-onnx-{origen}")
+        dir_fp32 = os.path.join(temporal, "fp32")
+        shutil.rmtree(temporal, ignore_errors=True)
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+            print(f"📦 Exportando {model_dir} a ONNX...")
+            model = ORTModelForTokenClassification.from_pretrained(model_dir, export=True)
+            model.save_pretrained(dir_fp32)
+            tokenizer.save_pretrained(dir_fp32)
+
+            for entrada in entradas:
+                directorio = os.path.join(temporal, entrada["destino"])
+                if entrada["backend"] == "onnx-int8":
+                    print("📦 Cuantizando a int8...")
+                    quantizer = ORTQuantizer.from_pretrained(dir_fp32)
+                    # avx2 funciona en cualquier x86_64 reciente; con avx512_vnni hay otra config
+                    qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+                    quantizer.quantize(save_dir=directorio, quantization_config=qconfig)
+                    tokenizer.save_pretrained(directorio)
+                else:
+                    shutil.copytree(dir_fp32, directorio)
+                _, archivo = RUTAS_ONNX[entrada["backend"]]
+                if not os.path.isfile(os.path.join(directorio, archivo)):
+                    raise FileNotFoundError(f"La exportación de {entrada['nombre']} no generó {archivo}")
+
+                self.__sellar(entrada, directorio)
+                destino = self.ruta_modelo(entrada["destino"])
+                shutil.rmtree(destino, ignore_errors=True)
+                os.replace(directorio, destino)
+                print(f"✅ Modelo {entrada['nombre']} listo en {destino}")
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+        print(f"✅ Modelos ONNX de {origen} exportados ({time.perf_counter() - inicio:.1f}s)")
+
+    def asegurar(self):
+        """
+        Paso de arranque: valida los sellos contra el manifiesto y, si falta
+        algo, lo descarga (o falla con MODELOS_OFFLINE=1).
+        """
+        inicio = time.perf_counter()
+        problemas = self.validar()
+        if not problemas:
+            print(f"✅ Modelos validados en {(time.perf_counter() - inicio) * 1000:.0f}ms")
+            return
+        for nombre, problema in problemas.items():
+            print(f"⚠️ Modelo {nombre}: {problema}")
+        if self.offline:
+            raise RuntimeError(f"Modelos incompletos con MODELOS_OFFLINE=1: {', '.join(problemas)}")
+        self.provisionar(problemas)
 
     def download_all(self):
-        self.__download_spacy_model_to_folder("es_core_news_lg")
-        self.__download_spacy_model_to_folder("en_core_web_trf")
-        self.__download("samuelalvarez034/PlanTL-GOB-ES-roberta-base-bne-ner", self.path_destino + "/roberta-base-bne-ner")
-        self.__instalar_modelo_spacy_local("en_core_web_trf", "modelos/en_core_web_trf-3.8.0")
-        self.__instalar_modelo_spacy_local("es_core_news_lg", "modelos/es_core_news_lg-3.8.0")
-      
+        problemas = self.validar()
+        if problemas:
+            self.provisionar(problemas)
+        else:
+            print("✅ Todos los modelos del manifiesto ya están aprovisionados")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aprovisiona los modelos declarados en modelos.json")
+    parser.add_argument("--validar", action="store_true", help="solo valida; sale con 1 si falta algo")
+    parser.add_argument("--verificar", action="store_true", help="valida recalculando el sha256 de cada archivo")
+    parser.add_argument("--fijar", action="store_true", help="completa los sha256 faltantes del manifiesto")
+    args = parser.parse_args()
 
+    utils = DownloadUtils()
+    if args.fijar:
+        utils.fijar()
+    elif args.validar or args.verificar:
+        problemas = utils.validar(hashear=args.verificar)
+        for nombre, problema in problemas.items():
+            print(f"❌ {nombre}: {problema}")
+        if not problemas:
+            print("✅ Modelos completos")
+        raise SystemExit(1 if problemas else 0)
+    else:
+        utils.download_all()
@@ -1,86 +1,273 @@
 """
 title: Ofuscador Filter
 author: Alejandro
-version: 0.1
+version: 0.3
+requirements: httpx
 """
 
-from pydantic import BaseModel
+import asyncio
+import hashlib
+import re
+import uuid
+from collections import OrderedDict
 from typing import Optional
-import requests
+
+import httpx
+from pydantic import BaseModel
+
+
+PROMPT = """
+Eres un asistente de redacción.
+Tu tarea es reformular, corregir o mejorar textos,
+PERO debes preservar intactos todos los fragmentos que aparezcan entre llaves dobles {{{{ ... }}}}.
+
+- Nunca elimines, modifiques ni alteres lo que está dentro de {{{{ ... }}}}.
+- Debes mantener exactamente la misma ortografía, espacios y símbolos entre las llaves.
+- Puedes cambiar el resto del texto normalmente.
+- Si necesitas mover las frases, hazlo, pero siempre copiando los fragmentos {{{{ ... }}}} tal cual están escritos.
+
+{texto}
+"""
+
+
+class Conversacion:
+    """
+    Estado de una conversación (usuario + chat): los textos ya ofuscados, para
+    no volver a enviarlos, y los marcadores (marcador -> original) cuando no se
+    usa la bóveda del servidor.
+
+    Con la bóveda, la conversación se guarda en el servidor con un id aleatorio
+    (no el usuario y el chat, que se pueden adivinar) y el token que devuelve
+    el servidor al crearla, necesario para desofuscar.
+    """
+
+    def __init__(self):
+        self.ofuscados = {}
+        self.marcadores = {}
+        self.id_boveda = uuid.uuid4().hex
+        self.token = None
+
+
+class DesofuscadorStreaming:
+    """
+    Desofusca la respuesta del modelo a medida que llega. Misma lógica que
+    desofuscar_utils.DesofuscadorStreaming (el filtro se instala solo, sin el
+    resto del repo): retiene únicamente el sufijo que puede ser el comienzo de
+    un marcador y restaura el resto enseguida.
+    """
+
+    def __init__(self, marcadores: dict):
+        self.inverso = marcadores
+        alternativas = sorted(self.inverso, key=len, reverse=True)
+        self.patron = re.compile("|".join(re.escape(a) for a in alternativas)) if alternativas else None
+        self.prefijos = {marcador[:i] for marcador in self.inverso for i in range(1, len(marcador))}
+        self.max_retenido = max((len(marcador) - 1 for marcador in self.inverso), default=0)
+        self._pendiente = ""
+
+    def _restaurar(self, texto: str) -> str:
+        if self.patron is None or not texto:
+            return texto
+        return self.patron.sub(lambda m: self.inverso[m.group(0)], texto)
+
+    def alimentar(self, fragmento: str) -> str:
+        texto = self._pendiente + fragmento
+        retenido = next((largo for largo in range(min(self.max_retenido, len(texto)), 0, -1)
+                         if texto[-largo:] in self.prefijos), 0)
+        corte = len(texto) - retenido
+        self._pendiente = texto[corte:]
+        return self._restaurar(texto[:corte])
+
+    def finalizar(self) -> str:
+        texto, self._pendiente = self._pendiente, ""
+        return self._restaurar(texto)
 
 
 class Filter:
 
     class Valves(BaseModel):
-        pass
+        url_api: str = "http://myapp:8000"
+        motor: str = "scrubadub"
+        # Con la bóveda los mapeos quedan en el servidor y el filtro solo manda el conversacion_id
+        usar_boveda: bool = True
+        timeout_conexion: float = 2.0
+        timeout_lectura: float = 30.0
+        reintentos: int = 3
+        backoff: float = 0.5
+        max_conexiones: int = 20
+        max_conversaciones: int = 1000
+        # Si no se pudo ofuscar, cortar el mensaje en lugar de mandarlo sin ofuscar
+        bloquear_si_falla: bool = True
 
     class UserValves(BaseModel):
         pass
 
     def __init__(self):
         self.valves = self.Valves()
-        self.mapeos = {}
+        self.conversaciones = OrderedDict()
+        # Respuestas en streaming en curso: mensaje -> DesofuscadorStreaming
+        self.streams = OrderedDict()
+        self._cliente = None
 
-    def inlet(self, body: dict, __user__: Optional[dict] = None) -> dict:
-
-        try:
-            print("Ingreso a ofuscar ---->")
-            # Tomamos el último mensaje del usuario
-            last_message = body["messages"][-1]["content"]
-
-            resp = requests.post(
-                "http://myapp:8000/ofuscar",
-                json={"texto": last_message},
-                timeout=5,
+    def cliente(self) -> httpx.AsyncClient:
+        """Cliente HTTP compartido, con conexiones keep-alive reutilizadas entre mensajes."""
+        if self._cliente is None or self._cliente.is_closed:
+            self._cliente = httpx.AsyncClient(
+                base_url=self.valves.url_api,
+                timeout=httpx.Timeout(self.valves.timeout_lectura, connect=self.valves.timeout_conexion),
+                limits=httpx.Limits(max_connections=self.valves.max_conexiones,
+                                    max_keepalive_connections=self.valves.max_conexiones),
             )
+        return self._cliente
 
-            if resp.ok:
-                data = resp.json()
-                respuesta = data.get("texto_ofuscado")
-                self.mapeos = data.get("mapeos")
-
-                prompt = f"""
-                Eres un asistente de redacción. 
-                Tu tarea es reformular, corregir o mejorar textos, 
-                PERO debes preservar intactos todos los fragmentos que aparezcan entre llaves dobles {{ ... }}. 
-                
-                - Nunca elimines, modifiques ni alteres lo que está dentro de {{ ... }}.  
-                - Debes mantener exactamente la misma ortografía, espacios y símbolos entre las llaves. 
-                - Puedes cambiar el resto del texto normalmente. 
-                - Si necesitas mover las frases, hazlo, pero siempre copiando los fragmentos {{ ... }} tal cual están escritos.
-
-                {respuesta}
-                """
-
-                body["messages"][-1]["content"] = prompt
-            print(f"Respuesta -> {respuesta}")
-            print("Salgo de ofuscar ---->")
-            return body
+    async def post(self, ruta: str, datos: dict = None, metodo: str = "POST", token: str = None) -> dict:
+        """
+        Request con reintentos y backoff exponencial ante errores de red, timeouts
+        y respuestas 503/504 (respetando Retry-After).
+        """
+        for intento in range(self.valves.reintentos + 1):
+            espera = self.valves.backoff * 2 ** intento
+            try:
+                headers = {"X-Token-Conversacion": token} if token else None
+                resp = await self.cliente().request(metodo, ruta, json=datos, headers=headers)
+                if resp.status_code not in (502, 503, 504):
+                    resp.raise_for_status()
+                    return resp.json()
+                espera = max(espera, float(resp.headers.get("Retry-After", 0)))
+                error = f"HTTP {resp.status_code}"
+            except httpx.TransportError as e:
+                error = repr(e)
+            if intento < self.valves.reintentos:
+                print(f"[OfuscadorPipe] {ruta} falló ({error}), reintento en {espera:.1f}s")
+                await asyncio.sleep(espera)
+        raise RuntimeError(f"{ruta} falló tras {self.valves.reintentos + 1} intentos: {error}")
+
+    def conversacion_id(self, body: dict, __user__: Optional[dict], __metadata__: Optional[dict]) -> str:
+        metadata = __metadata__ or body.get("metadata") or {}
+        usuario = (__user__ or {}).get("id", "anonimo")
+        chat = metadata.get("chat_id") or body.get("chat_id") or metadata.get("session_id") or "sin-chat"
+        return f"{usuario}:{chat}"
+
+    def conversacion(self, conversacion_id: str) -> Conversacion:
+        conversacion = self.conversaciones.get(conversacion_id)
+        if conversacion is None:
+            conversacion = self.conversaciones[conversacion_id] = Conversacion()
+        self.conversaciones.move_to_end(conversacion_id)
+        while len(self.conversaciones) > self.valves.max_conversaciones:
+            self.conversaciones.popitem(last=False)
+        return conversacion
+
+    @staticmethod
+    def huella(texto: str) -> str:
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    async def inlet(self, body: dict, __user__: Optional[dict] = None, __metadata__: Optional[dict] = None) -> dict:
+        print("Ingreso a ofuscar ---->")
+        conversacion_id = self.conversacion_id(body, __user__, __metadata__)
+        conversacion = self.conversacion(conversacion_id)
+
+        # El historial vuelve sin ofuscar en cada turno: se ofuscan todos los
+        # mensajes que todavía no se ofuscaron, en una sola llamada por lote
+        mensajes = [m for m in body["messages"]
+                    if m.get("role") in ("user", "assistant") and isinstance(m.get("content"), str)]
+        pendientes = list(dict.fromkeys(
+            m["content"] for m in mensajes if self.huella(m["content"]) not in conversacion.ofuscados
+        ))
 
+        try:
+            if pendientes:
+                datos = {"textos": pendientes, "motor": self.valves.motor}
+                if self.valves.usar_boveda:
+                    datos["conversacion_id"] = conversacion.id_boveda
+                data = await self.post("/ofuscar/lote", datos)
+                if "error" in data:
+                    raise RuntimeError(data["error"])
+                if data.get("token_conversacion"):
+                    conversacion.token = data["token_conversacion"]
+                for texto, resultado in zip(pendientes, data["resultados"]):
+                    conversacion.ofuscados[self.huella(texto)] = resultado["texto_ofuscado"]
+                    for grupo in resultado.get("mapeos", {}).values():
+                        for original, marcador in grupo.items():
+                            if marcador:
+                                conversacion.marcadores[marcador] = original
         except Exception as e:
             print(f"[OfuscadorPipe] Error: {e}")
+            if self.valves.bloquear_si_falla:
+                raise Exception("No se pudo ofuscar el mensaje; no se envió al modelo.") from e
             return body
 
-    def outlet(self, body: dict, __user__: Optional[dict] = None) -> dict:
-        try:
-            print("Ingreso a desofuscar ---->")
-            print(f"MAPEOS: {self.mapeos}")
-            last_message = body["messages"][-1]["content"]
-
-            resp = requests.post(
-                "http://myapp:8000/desofuscar",
-                json={"texto_ofuscado": last_message, "mapeos": self.mapeos},
-                timeout=5,
-            )
+        for mensaje in mensajes:
+            mensaje["content"] = conversacion.ofuscados[self.huella(mensaje["content"])]
+        ultimo = body["messages"][-1]
+        if ultimo.get("role") == "user" and isinstance(ultimo.get("content"), str):
+            ultimo["content"] = PROMPT.format(texto=ultimo["content"])
 
-            if resp.ok:
-                data = resp.json()
-                print(f"RESPUESTA JSON= {data}")
-                respuesta = data.get("texto_desofuscado")
-                body["messages"][-1]["content"] = respuesta
-            print(f"Respuesta -> {respuesta}")
-            print("Salgo de desofuscar ---->")
-            return body
+        print(f"Ofuscados {len(pendientes)} mensajes nuevos de {len(mensajes)}")
+        print("Salgo de ofuscar ---->")
+        return body
+
+    async def outlet(self, body: dict, __user__: Optional[dict] = None, __metadata__: Optional[dict] = None) -> dict:
+        print("Ingreso a desofuscar ---->")
+        conversacion = self.conversacion(self.conversacion_id(body, __user__, __metadata__))
+        last_message = body["messages"][-1]["content"]
+
+        datos = {"texto_ofuscado": last_message}
+        if self.valves.usar_boveda:
+            datos["conversacion_id"] = conversacion.id_boveda
+        else:
+            datos["marcadores"] = conversacion.marcadores
+
+        try:
+            data = await self.post("/desofuscar", datos, token=conversacion.token)
+            body["messages"][-1]["content"] = data.get("texto_desofuscado", last_message)
         except Exception as e:
             print(f"[OfuscadorPipe] Error: {e}")
-            return body
+
+        print("Salgo de desofuscar ---->")
+        return body
+
+    async def stream(self, event: dict, __user__: Optional[dict] = None, __metadata__: Optional[dict] = None) -> dict:
+        """
+        Desofusca cada parte de la respuesta a medida que llega, así el usuario
+        no ve los marcadores mientras el modelo escribe. Con la bóveda cada
+        parte se desofusca en el servidor (/desofuscar/fragmento) y los
+        marcadores nunca llegan al filtro; sin ella, con los marcadores locales.
+        """
+        conversacion_id = self.conversacion_id(event, __user__, __metadata__)
+        clave = (__metadata__ or {}).get("message_id") or conversacion_id
+
+        desofuscador = self.streams.get(clave)
+        if desofuscador is None:
+            if self.valves.usar_boveda:
+                desofuscador = True
+            else:
+                desofuscador = DesofuscadorStreaming(dict(self.conversacion(conversacion_id).marcadores))
+            self.streams[clave] = desofuscador
+            while len(self.streams) > self.valves.max_conversaciones:
+                self.streams.popitem(last=False)
+
+        for choice in event.get("choices", []):
+            delta = choice.setdefault("delta", {})
+            fragmento = delta.get("content") if isinstance(delta.get("content"), str) else ""
+            fin = bool(choice.get("finish_reason"))
+            if not fragmento and not fin:
+                continue
+
+            if desofuscador is True:
+                try:
+                    conversacion = self.conversacion(conversacion_id)
+                    data = await self.post("/desofuscar/fragmento", {
+                        "conversacion_id": conversacion.id_boveda, "sesion": clave, "fragmento": fragmento, "fin": fin,
+                    }, token=conversacion.token)
+                    delta["content"] = data["texto"]
+                except Exception as e:
+                    # La respuesta sigue tal cual; outlet la desofusca al final
+                    print(f"[OfuscadorPipe] Error: {e}")
+                    desofuscador = self.streams[clave] = False
+            elif desofuscador:
+                delta["content"] = desofuscador.alimentar(fragmento)
+                if fin:
+                    delta["content"] += desofuscador.finalizar()
+
+            if fin:
+                self.streams.pop(clave, None)
+        return event
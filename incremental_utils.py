@@ -0,0 +1,94 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from diccionario_utils import GestorDiccionarios
+
+
+class OfuscadorIncremental:
+    """
+    Ofuscación incremental para textos que se reenvían con pocos cambios.
+
+    El texto se parte en párrafos (y los párrafos muy largos, en oraciones). Las
+    entidades detectadas en cada segmento se guardan en una caché indexada por
+    el hash del segmento, así al reenviar el documento solo se analizan los
+    segmentos nuevos o editados. Las posiciones se trasladan al texto completo
+    y se reescribe todo junto, con un único `mapeos` consistente.
+    """
+
+    max_segmentos = int(os.getenv("INCREMENTAL_CACHE_SEGMENTOS", "50000"))
+    max_segmento = int(os.getenv("INCREMENTAL_MAX_SEGMENTO", "2000"))
+
+    _patron_parrafo = re.compile(r"\n\s*\n")
+    _patron_oracion = re.compile(r"(?<=[.!?])\s+")
+
+    # (motor, huella diccionarios, hash segmento) -> tupla de Entidad relativas al segmento
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, motor: str, ofuscador):
+        self.motor = motor
+        self.ofuscador = ofuscador
+
+    @classmethod
+    def _cortes(cls, texto: str, patron, inicio: int, fin: int) -> list:
+        cortes = []
+        posicion = inicio
+        for m in patron.finditer(texto, inicio, fin):
+            cortes.append((posicion, m.end()))
+            posicion = m.end()
+        if posicion < fin:
+            cortes.append((posicion, fin))
+        return cortes
+
+    @classmethod
+    def segmentar(cls, texto: str) -> list:
+        """
+        Devuelve los segmentos como (inicio, fin). Los separadores quedan al final
+        de cada segmento, así la concatenación reproduce el texto completo.
+        """
+        segmentos = []
+        for inicio, fin in cls._cortes(texto, cls._patron_parrafo, 0, len(texto)):
+            if fin - inicio > cls.max_segmento:
+                segmentos.extend(cls._cortes(texto, cls._patron_oracion, inicio, fin))
+            else:
+                segmentos.append((inicio, fin))
+        return segmentos
+
+    def _clave(self, segmento: str) -> tuple:
+        return (self.motor, GestorDiccionarios.instancia().huella, hashlib.sha256(segmento.encode('utf-8')).digest())
+
+    def detectar(self, texto: str) -> list:
+        """
+        Entidades del texto completo; solo se analizan los segmentos que no
+        están en la caché.
+        """
+        segmentos = self.segmentar(texto)
+        claves = [self._clave(texto[inicio:fin]) for inicio, fin in segmentos]
+
+        encontrados = {}
+        with self._lock:
+            for clave in claves:
+                if clave in self._cache:
+                    self._cache.move_to_end(clave)
+                    encontrados[clave] = self._cache[clave]
+
+        pendientes = list({clave: (inicio, fin) for clave, (inicio, fin) in zip(claves, segmentos)
+                           if clave not in encontrados}.items())
+        if pendientes:
+            lotes = self.ofuscador.detectar_lote([texto[inicio:fin] for _, (inicio, fin) in pendientes])
+            with self._lock:
+                for (clave, _), entidades in zip(pendientes, lotes):
+                    encontrados[clave] = self._cache[clave] = tuple(entidades)
+                while len(self._cache) > self.max_segmentos:
+                    self._cache.popitem(last=False)
+
+        entidades = []
+        for clave, (inicio, _) in zip(claves, segmentos):
+            entidades.extend(e._replace(inicio=e.inicio + inicio, fin=e.fin + inicio) for e in encontrados[clave])
+        return entidades
+
+    def ofuscar(self, texto: str):
+        return self.ofuscador.resultado(texto, self.detectar(texto))
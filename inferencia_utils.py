@@ -0,0 +1,250 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+ocupacion_lote = meter.create_histogram(
+    name="microlote_ocupacion",
+    description="Proporción del tamaño máximo de lote efectivamente usada",
+    unit="1",
+)
+espera_en_cola = meter.create_histogram(
+    name="microlote_espera",
+    description="Tiempo que una request esperó en la cola del planificador",
+    unit="ms",
+)
+
+
+class ColaLlenaError(Exception):
+    """La cola de inferencia está llena: la request se rechaza de inmediato."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Cola de inferencia llena")
+        self.retry_after = retry_after
+
+
+class TiempoAgotadoError(Exception):
+    """La inferencia no terminó dentro del tiempo máximo de la request."""
+
+
+class EjecutorInferencia:
+    """
+    Ejecutor dedicado para la inferencia de los motores (NER de spaCy/torch).
+
+    Usa un pool de hilos fijo (INFERENCIA_WORKERS): los modelos se comparten
+    entre hilos y torch libera el GIL durante el cálculo, así que no hace falta
+    duplicarlos por proceso. La cantidad de trabajos en curso más los que esperan
+    está acotada (INFERENCIA_COLA_MAX): por encima se rechaza con ColaLlenaError
+    en lugar de acumular latencia. Cada request espera como máximo
+    INFERENCIA_TIMEOUT segundos.
+    """
+
+    workers = int(os.getenv("INFERENCIA_WORKERS", "1"))
+    cola_max = int(os.getenv("INFERENCIA_COLA_MAX", "32"))
+    timeout = float(os.getenv("INFERENCIA_TIMEOUT", "60"))
+    retry_after = int(os.getenv("INFERENCIA_RETRY_AFTER", "5"))
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self, workers: int = None, cola_max: int = None, timeout: float = None):
+        self.workers = workers or self.workers
+        self.cola_max = self.cola_max if cola_max is None else cola_max
+        self.timeout = timeout or self.timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inferencia")
+        self._pendientes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instancia(cls) -> "EjecutorInferencia":
+        if cls._instancia is None:
+            with cls._lock_instancia:
+                if cls._instancia is None:
+                    cls._instancia = cls()
+        return cls._instancia
+
+    @property
+    def pendientes(self) -> int:
+        """Trabajos en ejecución más los que esperan en la cola."""
+        return self._pendientes
+
+    def _liberar(self, _future):
+        with self._lock:
+            self._pendientes -= 1
+
+    def enviar(self, fn, *args):
+        """
+        Encola `fn(*args)` y devuelve el concurrent.futures.Future, o lanza
+        ColaLlenaError si no hay lugar.
+        """
+        with self._lock:
+            if self._pendientes >= self.workers + self.cola_max:
+                raise ColaLlenaError(self.retry_after)
+            self._pendientes += 1
+        try:
+            # El trabajo corre con el contexto de quien lo encola (span actual de OpenTelemetry)
+            future = self._pool.submit(contextvars.copy_context().run, fn, *args)
+        except BaseException:
+            self._liberar(None)
+            raise
+        # El lugar se libera cuando el trabajo termina, aunque la request ya no espere
+        future.add_done_callback(self._liberar)
+        return future
+
+    async def ejecutar(self, fn, *args, timeout: float = None):
+        future = self.enviar(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise TiempoAgotadoError()
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PlanificadorLotes:
+    """
+    Junta las requests concurrentes de un motor en micro-lotes.
+
+    El primer texto que llega abre una ventana de MICROLOTE_ESPERA_MS
+    milisegundos; los que llegan dentro de la ventana se suman al lote hasta
+    MICROLOTE_MAX textos o MICROLOTE_MAX_CARACTERES caracteres (presupuesto
+    aproximado de tokens). El lote se corre de una vez con `detectar_lote` en el
+    EjecutorInferencia y cada request recibe sus propias entidades.
+
+    Si el lote falla se reintenta texto por texto, así el error llega solo a la
+    request cuyo texto lo provoca y el resto recibe sus entidades.
+    """
+
+    espera_ms = float(os.getenv("MICROLOTE_ESPERA_MS", "5"))
+    max_lote = int(os.getenv("MICROLOTE_MAX", "16"))
+    max_caracteres = int(os.getenv("MICROLOTE_MAX_CARACTERES", "20000"))
+
+    _planificadores = {}
+
+    def __init__(self, motor: str, detectar_lote, ejecutor: EjecutorInferencia = None):
+        self.motor = motor
+        self.detectar_lote = detectar_lote
+        self.ejecutor = ejecutor or EjecutorInferencia.instancia()
+        self._cola = None
+        self._tarea = None
+        self._corriendo = set()
+
+    @classmethod
+    def para(cls, motor: str, ofuscador) -> "PlanificadorLotes":
+        """
+        Planificador compartido del motor (uno por proceso y motor).
+        """
+        planificador = cls._planificadores.get(motor)
+        if planificador is None:
+            planificador = cls._planificadores[motor] = cls(motor, ofuscador.detectar_lote)
+        return planificador
+
+    async def detectar(self, texto: str) -> list:
+        if self._tarea is None or self._tarea.done():
+            self._cola = asyncio.Queue()
+            self._tarea = asyncio.get_running_loop().create_task(self._bucle())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._cola.put((texto, future, time.perf_counter()))
+        return await future
+
+    async def _bucle(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            primero = await self._cola.get()
+            lote = [primero]
+            caracteres = len(primero[0])
+            limite = loop.time() + self.espera_ms / 1000
+
+            while len(lote) < self.max_lote and caracteres < self.max_caracteres:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._cola.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                lote.append(item)
+                caracteres += len(item[0])
+
+            ahora = time.perf_counter()
+            atributos = {"motor": self.motor}
+            ocupacion_lote.record(len(lote) / self.max_lote, atributos)
+            for _, _, encolado in lote:
+                espera_en_cola.record((ahora - encolado) * 1000, atributos)
+
+            # El lote corre en paralelo mientras se junta el siguiente
+            tarea = loop.create_task(self._correr(lote))
+            self._corriendo.add(tarea)
+            tarea.add_done_callback(self._corriendo.discard)
+
+    def _detectar_por_texto(self, textos: list) -> list:
+        """
+        Corre `detectar_lote` de a un texto; devuelve por texto sus entidades o
+        la excepción que lanzó.
+        """
+        resultados = []
+        for texto in textos:
+            try:
+                resultados.append(self.detectar_lote([texto])[0])
+            except Exception as e:
+                resultados.append(e)
+        return resultados
+
+    async def _correr(self, lote: list):
+        textos = [texto for texto, _, _ in lote]
+        try:
+            try:
+                resultados = await self.ejecutor.ejecutar(self.detectar_lote, textos)
+            except (ColaLlenaError, TiempoAgotadoError):
+                raise
+            except Exception:
+                if len(lote) == 1:
+                    raise
+                resultados = await self.ejecutor.ejecutar(self._detectar_por_texto, textos)
+        except Exception as e:
+            for _, future, _ in lote:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), entidades in zip(lote, resultados):
+            if future.done():
+                continue
+            if isinstance(entidades, Exception):
+                future.set_exception(entidades)
+            else:
+                future.set_result(entidades)
+
+
+def _observar_pendientes(_opciones):
+    ejecutor = EjecutorInferencia._instancia
+    if ejecutor is not None:
+        yield metrics.Observation(ejecutor.pendientes)
+
+
+def _observar_microlotes(_opciones):
+    for motor, planificador in list(PlanificadorLotes._planificadores.items()):
+        if planificador._cola is not None:
+            yield metrics.Observation(planificador._cola.qsize(), {"motor": motor})
+
+
+meter.create_observable_gauge(
+    name="inferencia_cola_pendientes",
+    callbacks=[_observar_pendientes],
+    description="Trabajos de inferencia en ejecución más los que esperan en la cola",
+    unit="1",
+)
+meter.create_observable_gauge(
+    name="microlote_cola",
+    callbacks=[_observar_microlotes],
+    description="Textos esperando a entrar en un micro-lote, por motor",
+    unit="1",
+)
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+
+import psutil
+from opentelemetry import metrics
+
+from download_utils import DownloadUtils
+from telemetria_utils import etapa
+
+
+class ModelosUtils:
+    """
+    Caché de proceso para los modelos de spaCy.
+
+    Cada pipeline se carga una sola vez, recién cuando algún motor lo pide, y se
+    comparte entre requests. Se registra el tiempo de carga y el aumento de
+    memoria residente (RSS) que produjo cada modelo.
+    """
+
+    # Componentes de spaCy que cada motor no usa y los que sí necesita. Por
+    # defecto se excluyen (no se cargan ni ocupan memoria); se puede cambiar con
+    # SPACY_EXCLUIR_<MOTOR> y SPACY_DESHABILITAR_<MOTOR> (listas separadas por coma).
+    #  - scrubadub solo lee doc.ents: basta con transformer/tok2vec + ner.
+    #  - presidio usa tokens y lemas (el NER lo pone transformers): el lematizador
+    #    por reglas necesita morphologizer y attribute_ruler.
+    pipelines = {
+        "scrubadub": {
+            "excluir": "tagger,parser,attribute_ruler,lemmatizer,morphologizer,senter",
+            "deshabilitar": "",
+            "requeridos": ("ner",),
+        },
+        "presidio": {
+            "excluir": "parser,ner,senter",
+            "deshabilitar": "",
+            "requeridos": ("morphologizer", "attribute_ruler", "lemmatizer"),
+        },
+    }
+
+    _modelos = {}
+    _estadisticas = {}
+    # (motor, nombre) -> pipeline ya validado
+    _por_motor = {}
+    _locks = {}
+    _lock = threading.Lock()
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def __clave(nombre: str, kwargs: dict) -> tuple:
+        return (nombre, tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in kwargs.items())))
+
+    @classmethod
+    def __lock_modelo(cls, clave: tuple) -> threading.Lock:
+        # Un lock por modelo: dos modelos distintos pueden cargarse en paralelo
+        with cls._lock:
+            if clave not in cls._locks:
+                cls._locks[clave] = threading.Lock()
+            return cls._locks[clave]
+
+    @classmethod
+    def spacy(cls, nombre: str, **kwargs):
+        """
+        Devuelve el pipeline de spaCy `nombre`, cargándolo en el primer uso.
+        Los kwargs se pasan a `spacy.load` y forman parte de la clave de caché.
+        """
+        clave = cls.__clave(nombre, kwargs)
+        nlp = cls._modelos.get(clave)
+        if nlp is not None:
+            return nlp
+
+        with cls.__lock_modelo(clave):
+            if clave not in cls._modelos:
+                import spacy
+
+                proceso = psutil.Process()
+                rss_antes = proceso.memory_info().rss
+                inicio = time.perf_counter()
+                print(f"📦 Cargando modelo spaCy {nombre}...")
+                nlp = spacy.load(DownloadUtils.ruta_spacy(nombre), **kwargs)
+                segundos = time.perf_counter() - inicio
+                rss_delta = max(proceso.memory_info().rss - rss_antes, 0)
+                cls._estadisticas[clave] = {
+                    "modelo": nombre,
+                    "opciones": kwargs,
+                    "segundos_carga": round(segundos, 3),
+                    "rss_bytes": rss_delta,
+                }
+                cls._modelos[clave] = nlp
+                print(f"✅ Modelo {nombre} cargado en {segundos:.1f}s (+{rss_delta / 2**20:.0f} MiB RSS)")
+            return cls._modelos[clave]
+
+    @classmethod
+    def componentes_spacy(cls, motor: str) -> dict:
+        """
+        Componentes a excluir y deshabilitar del motor, tal como están
+        configurados (SPACY_EXCLUIR_<MOTOR> / SPACY_DESHABILITAR_<MOTOR>).
+        """
+        config = cls.pipelines[motor]
+        return {clave: os.getenv(f"SPACY_{clave.upper()}_{motor.upper()}", config[clave])
+                for clave in ("excluir", "deshabilitar")}
+
+    @classmethod
+    def opciones_spacy(cls, motor: str) -> dict:
+        """
+        kwargs de `spacy.load` (exclude/disable) para el motor. Lanza ValueError
+        si la configuración quita un componente que el motor necesita.
+        """
+        config = cls.pipelines[motor]
+        configurados = cls.componentes_spacy(motor)
+        opciones = {}
+        for clave, argumento in (("excluir", "exclude"), ("deshabilitar", "disable")):
+            valor = configurados[clave]
+            componentes = [c.strip() for c in valor.split(",") if c.strip()]
+            quitados = sorted(set(componentes) & set(config["requeridos"]))
+            if quitados:
+                raise ValueError(f"El motor {motor} necesita los componentes de spaCy {', '.join(quitados)}")
+            if componentes:
+                opciones[argumento] = componentes
+        return opciones
+
+    @classmethod
+    def validar_pipeline(cls, nlp, motor: str):
+        """
+        Verifica que el pipeline cargado tenga activos los componentes que el
+        motor necesita y que corra (por ejemplo, que no se haya excluido el
+        transformer o tok2vec del que escucha el NER).
+        """
+        faltantes = [c for c in cls.pipelines[motor]["requeridos"] if c not in nlp.pipe_names]
+        if faltantes:
+            raise ValueError(f"Al pipeline de spaCy del motor {motor} le faltan: {', '.join(faltantes)}")
+        nlp("Validación del pipeline.")
+
+    @classmethod
+    def spacy_motor(cls, motor: str, nombre: str):
+        """
+        Como `spacy`, pero con los componentes configurados para el motor.
+        """
+        nlp = cls._por_motor.get((motor, nombre))
+        if nlp is None:
+            with etapa("carga_modelo", motor, modelo=nombre):
+                nlp = cls.spacy(nombre, **cls.opciones_spacy(motor))
+                cls.validar_pipeline(nlp, motor)
+            cls._por_motor[(motor, nombre)] = nlp
+        return nlp
+
+    @staticmethod
+    def configurar_hilos():
+        """
+        Fija la cantidad de hilos de inferencia de torch (INFERENCIA_HILOS).
+        Sin la variable se respeta el valor por defecto de torch.
+        """
+        hilos = os.getenv("INFERENCIA_HILOS")
+        if hilos:
+            import torch
+            torch.set_num_threads(int(hilos))
+            print(f"🧵 Inferencia con {hilos} hilos")
+
+    @classmethod
+    def registrar(cls, nombre: str, segundos: float, rss_bytes: int, **opciones):
+        """
+        Registra las estadísticas de un modelo cargado fuera de esta caché
+        (por ejemplo, el pipeline que arma presidio).
+        """
+        cls._estadisticas[(nombre, ())] = {
+            "modelo": nombre,
+            "opciones": opciones,
+            "segundos_carga": round(segundos, 3),
+            "rss_bytes": rss_bytes,
+        }
+
+    @classmethod
+    def estadisticas(cls) -> list:
+        return list(cls._estadisticas.values())
+
+
+def _observar_memoria(_opciones):
+    for estadistica in ModelosUtils.estadisticas():
+        yield metrics.Observation(estadistica["rss_bytes"], {"modelo": estadistica["modelo"]})
+    yield metrics.Observation(psutil.Process().memory_info().rss, {"modelo": "proceso"})
+
+
+meter = metrics.get_meter(__name__)
+meter.create_observable_gauge(
+    name="modelos_memoria_bytes",
+    callbacks=[_observar_memoria],
+    description="Memoria residente que sumó cada modelo al cargarse, y la del proceso completo",
+    unit="By",
+)
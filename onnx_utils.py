@@ -0,0 +1,97 @@
+from spacy.language import Language
+
+from download_utils import RUTAS_ONNX
+from presidio_utils import PodadoTransformersNlpEngine
+
+
+class OrtTokenPipe:
+    """
+    Componente de spaCy que corre un modelo de token classification exportado a
+    ONNX (ONNX Runtime, vía optimum) y deja las entidades en doc.spans[key], con
+    los scores en attrs["scores"], igual que hf_token_pipe de
+    spacy-huggingface-pipelines. Así presidio lo usa sin cambios.
+    """
+
+    def __init__(self, model: str, file_name: str, stride: int, aggregation_strategy: str,
+                 alignment_mode: str, annotate_spans_key: str, batch_size: int):
+        from optimum.onnxruntime import ORTModelForTokenClassification
+        from transformers import AutoTokenizer, pipeline
+
+        tokenizer = AutoTokenizer.from_pretrained(model)
+        modelo = ORTModelForTokenClassification.from_pretrained(model, file_name=file_name)
+        self.clasificador = pipeline(
+            "token-classification",
+            model=modelo,
+            tokenizer=tokenizer,
+            aggregation_strategy=aggregation_strategy,
+            stride=stride,
+        )
+        self.alignment_mode = alignment_mode
+        self.key = annotate_spans_key
+        self.batch_size = batch_size
+
+    def _anotar(self, doc, resultados):
+        spans = []
+        scores = []
+        for resultado in resultados:
+            span = doc.char_span(resultado["start"], resultado["end"], label=resultado["entity_group"],
+                                 alignment_mode=self.alignment_mode)
+            if span is not None:
+                spans.append(span)
+                scores.append(float(resultado["score"]))
+        doc.spans[self.key] = spans
+        doc.spans[self.key].attrs["scores"] = scores
+        return doc
+
+    def __call__(self, doc):
+        return self._anotar(doc, self.clasificador(doc.text))
+
+    def pipe(self, docs, batch_size: int = None):
+        docs = list(docs)
+        if not docs:
+            return
+        resultados = self.clasificador([doc.text for doc in docs], batch_size=batch_size or self.batch_size)
+        for doc, resultado in zip(docs, resultados):
+            yield self._anotar(doc, resultado)
+
+
+@Language.factory(
+    "ort_token_pipe",
+    default_config={
+        "file_name": "model.onnx",
+        "stride": 16,
+        "aggregation_strategy": "simple",
+        "alignment_mode": "expand",
+        "annotate_spans_key": "bert-base-ner",
+        "batch_size": 32,
+    },
+)
+def crear_ort_token_pipe(nlp, name, model, file_name, stride, aggregation_strategy, alignment_mode,
+                         annotate_spans_key, batch_size):
+    return OrtTokenPipe(model, file_name, stride, aggregation_strategy, alignment_mode, annotate_spans_key,
+                        batch_size)
+
+
+class OnnxTransformersNlpEngine(PodadoTransformersNlpEngine):
+    """
+    TransformersNlpEngine que corre el NER con ONNX Runtime (fp32 o int8) en
+    lugar de PyTorch. El modelo "transformers" de la configuración debe ser un
+    directorio exportado por DownloadUtils (ver RUTAS_ONNX).
+    """
+
+    def __init__(self, models=None, ner_model_configuration=None, file_name: str = "model.onnx"):
+        super().__init__(models=models, ner_model_configuration=ner_model_configuration)
+        self.file_name = file_name
+
+    def _agregar_ner(self, nlp, model: dict):
+        nlp.add_pipe(
+            "ort_token_pipe",
+            config={
+                "model": model["model_name"]["transformers"],
+                "file_name": self.file_name,
+                "stride": self.ner_model_configuration.stride,
+                "alignment_mode": self.ner_model_configuration.alignment_mode,
+                "aggregation_strategy": self.ner_model_configuration.aggregation_strategy,
+                "annotate_spans_key": self.entity_key,
+            },
+        )
@@ -0,0 +1,10 @@
+# Expresiones regulares de los identificadores estructurados, compartidas por todos los motores
+
+PATRON_CBU = r"\b\d{22}\b"
+PATRON_TARJETA = r"\d{4}[- ]\d{4}[- ]\d{4}[- ]\d{4}"
+PATRON_DNI = r"\b\d{1,2}\.?\d{3}\.?\d{3}\b"
+PATRON_NOTA = r'NOTA-\d{1,6}-\d{1,2}-\d{1,2}'
+PATRON_IPP = r'[A-Za-z]{2}-\d{2}-\d{2}-\d{1,6}-\d{2}[-/]\d{2}'
+PATRON_TELEFONO = r"\(?\d{2,4}\)?[\s\-]\d{3,4}[\s\-]?\d{3,4}"
+PATRON_EMAIL = r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"
+PATRON_URL = r"\b(?:https?://|www\.)[^\s<>\"']+[^\s<>\"'.,;:!?)]"
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+from inferencia_utils import EjecutorInferencia
+
+# Mensajes representativos: nombres, fechas, identificadores y texto corrido,
+# para ejercitar el NER, los tokenizadores y las regex de cada motor.
+TEXTOS_CALENTAMIENTO = [
+    "Hola, soy María Fernanda González y necesito reprogramar el turno del 3 de marzo.",
+    "El expediente NOTA-1234-5-6 lo inició Roberto Sánchez; la causa es PP-01-02-123456-22/00.",
+    "Mi DNI es 30.123.456, mi correo pepe@argento.com y mi teléfono (221) 455-5555.",
+    "Transferí al CBU 0170099220000067797370 el lunes, pero el Banco Nación no lo acreditó.",
+    "Buenas tardes, adjunto la documentación pedida. Quedo a disposición por cualquier consulta.",
+]
+
+
+class PreparacionMotores:
+    """
+    Precarga y calienta los motores de MOTORES_PRECARGA en segundo plano.
+
+    Por cada motor se construyen sus modelos (`precargar`) y se corren
+    CALENTAMIENTO_RONDAS rondas de detección sobre TEXTOS_CALENTAMIENTO, en lote
+    y texto por texto, en el EjecutorInferencia, así los kernels de torch, los
+    tokenizadores y las regex ya están en caliente cuando llega tráfico.
+    `listo` recién es True cuando todos los motores terminaron; es lo que
+    expone /ready (a diferencia de /ping, que solo indica que el proceso vive).
+    """
+
+    motores = [m.strip() for m in os.getenv("MOTORES_PRECARGA", "scrubadub").split(",") if m.strip()]
+    rondas = int(os.getenv("CALENTAMIENTO_RONDAS", "2"))
+
+    _instancia = None
+    _lock_instancia = threading.Lock()
+
+    def __init__(self, motores: list = None):
+        self.motores = self.motores if motores is None else motores
+        self._estado = {motor: {"estado": "pendiente"} for motor in self.motores}
+        self._hilo = None
+
+    @classmethod
+    def instancia(cls) -> "PreparacionMotores":
+        if cls._instancia is None:
+            with cls._lock_instancia:
+                if cls._instancia is None:
+                    cls._instancia = cls()
+        return cls._instancia
+
+    def iniciar(self, obtener_ofuscador):
+        """
+        Arranca la preparación en un hilo; `obtener_ofuscador(motor)` devuelve
+        el ofuscador de cada motor.
+        """
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._preparar, args=(obtener_ofuscador,),
+                                          name="preparacion-motores", daemon=True)
+            self._hilo.start()
+
+    def _preparar(self, obtener_ofuscador):
+        ejecutor = EjecutorInferencia.instancia()
+        for motor in self.motores:
+            estado = self._estado[motor]
+            try:
+                ofuscador = obtener_ofuscador(motor)
+                if ofuscador is None:
+                    raise ValueError(f"Motor no reconocido: {motor}")
+
+                estado["estado"] = "cargando"
+                inicio = time.perf_counter()
+                ofuscador.precargar()
+                estado["segundos_carga"] = round(time.perf_counter() - inicio, 3)
+
+                estado["estado"] = "calentando"
+                inicio = time.perf_counter()
+                for _ in range(self.rondas):
+                    ejecutor.enviar(ofuscador.detectar_lote, TEXTOS_CALENTAMIENTO).result()
+                    for texto in TEXTOS_CALENTAMIENTO:
+                        ejecutor.enviar(ofuscador.detectar, texto).result()
+                estado["segundos_calentamiento"] = round(time.perf_counter() - inicio, 3)
+                estado["estado"] = "listo"
+                print(f"🔥 Motor {motor} listo (carga {estado['segundos_carga']}s, "
+                      f"calentamiento {estado['segundos_calentamiento']}s)")
+            except Exception as e:
+                estado["estado"] = "error"
+                estado["error"] = str(e)
+                print(f"❌ Error al preparar el motor {motor}: {e}")
+
+    @property
+    def listo(self) -> bool:
+        return self._hilo is not None and all(e["estado"] == "listo" for e in self._estado.values())
+
+    def estado(self) -> dict:
+        return {"listo": self.listo, "motores": {motor: dict(e) for motor, e in self._estado.items()}}
@@ -1,66 +1,99 @@
-import csv
-import hashlib
 import os
-import re
-import unicodedata
-from presidio_analyzer import AnalyzerEngine, PatternRecognizer, Pattern, RecognizerResult
-from presidio_analyzer.nlp_engine import TransformersNlpEngine
+import threading
+import time
+import psutil
+import spacy
+from presidio_analyzer import AnalyzerEngine, LocalRecognizer, PatternRecognizer, Pattern, RecognizerResult
 from presidio_analyzer.nlp_engine import TransformersNlpEngine, NerModelConfiguration
+from diccionario_utils import GestorDiccionarios
+from download_utils import DownloadUtils
+from modelos_utils import ModelosUtils
+from patrones_utils import PATRON_DNI, PATRON_EMAIL, PATRON_IPP, PATRON_NOTA, PATRON_TELEFONO
+from reescritura_utils import Entidad, ReescrituraUtils
+from telemetria_utils import contar_entidades, etapa
+
+class AccentInsensitiveNameRecognizer(LocalRecognizer):
+    """
+    Reconocedor de diccionarios (nombres, organizaciones, calles...), sin
+    distinguir acentos ni mayúsculas. Usa los matchers vigentes del
+    GestorDiccionarios, así una recarga aplica sin reconstruir el analyzer.
+    """
+
+    def __init__(self, gestor: GestorDiccionarios, supported_language="es"):
+        self.gestor = gestor
+        super().__init__(supported_entities=[], supported_language=supported_language)
+
+    @property
+    def supported_entities(self):
+        return sorted(self.gestor.matchers())
+
+    @supported_entities.setter
+    def supported_entities(self, valor):
+        # Las entidades salen de los diccionarios cargados
+        pass
 
-class AccentInsensitiveNameRecognizer(PatternRecognizer):
-    supported_entity: str
-    supported_language: str
-
-    def quitar_acentos_simple(self, s: str) -> str:
-        return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
-
-    def __init__(self, deny_list, supported_entity="CUSTOM_NAME", supported_language="es"):
-        super().__init__(supported_entity=supported_entity, supported_language=supported_language, deny_list=deny_list)
-        self.supported_entity = supported_entity
-        self.supported_language = supported_language
-        # Preprocesamos deny_list para normalizar y preparar el patrón regex
-        nombres_normalizados = [re.escape(self.quitar_acentos_simple(n.lower())) for n in deny_list]
-        # Construimos un solo patrón regex que busque coincidencias por palabra completa
-        self.regex = re.compile(r"\b(" + "|".join(nombres_normalizados) + r")\b", re.UNICODE)
-
-    def analyze(self, text, entities, nlp_artifacts=None, regex_flags=None):
-        text_lower = text.lower()
-
-        # Creamos texto normalizado (sin acentos)
-        normalized_chars = []
-        orig_index_map = []
-        for i, ch in enumerate(text_lower):
-            norm = ''.join(
-                c for c in unicodedata.normalize('NFD', ch)
-                if unicodedata.category(c) != 'Mn'
-            )
-            for c in norm:
-                normalized_chars.append(c)
-                orig_index_map.append(i)
-
-        normalized_text = ''.join(normalized_chars)
+    def load(self) -> None:
+        pass
 
+    def analyze(self, text, entities, nlp_artifacts=None):
         results = []
-        for match in self.regex.finditer(normalized_text):
-            start_norm, end_norm = match.span()
-            start_orig = orig_index_map[start_norm]
-            end_orig = orig_index_map[end_norm - 1] + 1
-            results.append(
-                RecognizerResult(
-                    entity_type=self.supported_entity,
-                    start=start_orig,
-                    end=end_orig,
-                    score=1.0
+        with etapa("diccionarios", "presidio", caracteres=len(text)):
+            for entidad, matcher in self.gestor.matchers().items():
+                if entities and entidad not in entities:
+                    continue
+                results.extend(
+                    RecognizerResult(
+                        entity_type=entidad,
+                        start=inicio,
+                        end=fin,
+                        score=1.0
+                    )
+                    for inicio, fin in matcher.buscar(text)
                 )
-            )
         return results
 
 
+class PodadoTransformersNlpEngine(TransformersNlpEngine):
+    """
+    TransformersNlpEngine que carga spaCy solo con los componentes que usa
+    presidio (ver ModelosUtils.pipelines) en lugar de deshabilitar parser y ner.
+    """
+
+    def _cargar_spacy(self, spacy_model: str):
+        ruta = DownloadUtils.ruta_spacy(spacy_model)
+        if ruta == spacy_model:
+            # No está aprovisionado en disco: se usa (o se instala) el paquete
+            self._download_spacy_model_if_needed(spacy_model)
+        nlp = spacy.load(ruta, **ModelosUtils.opciones_spacy("presidio"))
+        ModelosUtils.validar_pipeline(nlp, "presidio")
+        return nlp
+
+    def _agregar_ner(self, nlp, model: dict):
+        nlp.add_pipe(
+            "hf_token_pipe",
+            config={
+                "model": model["model_name"]["transformers"],
+                "annotate": "spans",
+                "stride": self.ner_model_configuration.stride,
+                "alignment_mode": self.ner_model_configuration.alignment_mode,
+                "aggregation_strategy": self.ner_model_configuration.aggregation_strategy,
+                "annotate_spans_key": self.entity_key,
+            },
+        )
+
+    def load(self) -> None:
+        self.nlp = {}
+        for model in self.models:
+            self._validate_model_params(model)
+            nlp = self._cargar_spacy(model["model_name"]["spacy"])
+            self._agregar_ner(nlp, model)
+            self.nlp[model["lang_code"]] = nlp
+
+
 class PresidioUtils:
 
     apertura = os.getenv("TAG_APERTURA", "")
     cierre = os.getenv("TAG_CIERRE", "")
-    path_diccionarios = os.getenv("PATH_DICCIONARIOS", "diccionarios")
 
     # Configuración del modelo en español
     model_config = [{
@@ -68,31 +101,118 @@ class PresidioUtils:
         "model_name": {
             #"spacy": "modelos/es_core_news_lg-3.8.0/es_core_news_lg/es_core_news_lg-3.8.0",
             "spacy": "es_core_news_lg",            
-            "transformers": "modelos/roberta-base-bne-ner"
+            "transformers": DownloadUtils.ruta_modelo("roberta-base-bne-ner")
     }
     }]
 
 
 
 
-    def __init__(self):
-        pass
+    entity_map = {
+        "PERSON": "nombres",
+        "URL": "urls",
+        "EMAIL": "emails",
+        "DNI": "dnis",
+        "NOTA": "notas",
+        "IPP": "ipps",
+        "PHONE_NUMBER": "telefonos",
+        "PHONE": "telefonos",
+        "DATE_TIME": "fechas",
+        "CUSTOM_NAME" : "nombres"
+    }
 
-    def hash_text(self, cadena: str)-> str:
-        return hashlib.sha256(cadena.encode('utf-8')).hexdigest()[:8]
+    # Backend del NER: "torch" (por defecto), "onnx" u "onnx-int8". Los modelos
+    # ONNX los exporta `python download_utils.py` con EXPORTAR_ONNX=1 (requirements-onnx.txt).
+    backend = os.getenv("PRESIDIO_BACKEND", "torch")
 
-    def ofuscar(self, text: str):
+    # Parámetros del NER: solapamiento entre ventanas de tokens, cómo se agrupan
+    # los subtokens en entidades y el score mínimo para aceptar un resultado
+    stride = int(os.getenv("PRESIDIO_STRIDE", "14"))
+    agregacion = os.getenv("PRESIDIO_AGREGACION", "simple")
+    umbral = float(os.getenv("PRESIDIO_UMBRAL", "0.5"))
+
+    tamanio_lote = int(os.getenv("OFUSCAR_LOTE_TAMANIO", "32"))
+    procesos = int(os.getenv("OFUSCAR_LOTE_PROCESOS", "1"))
+
+    entidades = ["PERSON", "CUSTOM_NAME", "DATE_TIME", "URL", "PHONE_NUMBER", "PHONE", "EMAIL", "DNI", "NOTA", "IPP"]
+
+    # Registro de proceso: el analyzer (modelo NER, reconocedores y diccionario)
+    # se construye una sola vez y se comparte entre requests.
+    _analyzer = None
+    _lock = threading.Lock()
 
-        mapping = {}
+    usa_ner = True
 
-        ner_model_configuration = NerModelConfiguration(aggregation_strategy="simple", stride=14)
-        nlp_engine = TransformersNlpEngine(models=self.model_config, ner_model_configuration=ner_model_configuration)
-        analyzer = AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=["en", "es"])
+    def __init__(self):
+        pass
+
+    @classmethod
+    def cargar(cls) -> AnalyzerEngine:
+        """
+        Devuelve el analyzer compartido, construyéndolo en el primer uso.
+        """
+        analyzer = cls._analyzer
+        if analyzer is None:
+            with cls._lock:
+                if cls._analyzer is None:
+                    with etapa("construccion", "presidio"):
+                        cls._analyzer = cls._construir_analyzer()
+                analyzer = cls._analyzer
+        return analyzer
+
+    def precargar(self):
+        """
+        Construye el analyzer antes del primer uso (ver PreparacionMotores).
+        """
+        self.cargar()
+
+    def configuracion(self) -> dict:
+        """
+        Configuración efectiva del motor que cambia su salida (forma parte de la
+        clave de CacheResultados).
+        """
+        return {
+            "modelos": self.model_config,
+            "backend": self.backend,
+            "stride": self.stride,
+            "agregacion": self.agregacion,
+            "umbral": self.umbral,
+            "spacy": ModelosUtils.componentes_spacy("presidio"),
+        }
+
+    @classmethod
+    def recargar(cls) -> AnalyzerEngine:
+        """
+        Reconstruye el analyzer (por ejemplo, tras cambiar la configuración) y lo
+        reemplaza de forma atómica. Las requests en curso terminan con el anterior.
+        """
+        with etapa("construccion", "presidio"):
+            analyzer = cls._construir_analyzer()
+        with cls._lock:
+            cls._analyzer = analyzer
+        return analyzer
+
+    @classmethod
+    def _construir_analyzer(cls) -> AnalyzerEngine:
+        print("⚙️ Construyendo analyzer de presidio...")
+        proceso = psutil.Process()
+        rss_antes = proceso.memory_info().rss
+        inicio = time.perf_counter()
+        with etapa("carga_modelo", "presidio", backend=cls.backend):
+            nlp_engine = cls._construir_nlp_engine()
+            analyzer = AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=["en", "es"])
+        ModelosUtils.registrar(
+            nlp_engine.models[0]["model_name"]["transformers"],
+            time.perf_counter() - inicio,
+            max(proceso.memory_info().rss - rss_antes, 0),
+            spacy=nlp_engine.models[0]["model_name"]["spacy"],
+            backend=cls.backend,
+        )
 
         # --- Reconocedor de teléfonos ---
         pattern_phone = Pattern(
             name="es_phone",
-            regex=r"\(?\d{2,4}\)?[\s\-]\d{3,4}[\s\-]?\d{3,4}",
+            regex=PATRON_TELEFONO,
             score=0.8
         )
         phone_recognizer = PatternRecognizer(
@@ -105,7 +225,7 @@ class PresidioUtils:
         # --- Reconocedor de emails ---
         pattern_email = Pattern(
             name="es_email",
-            regex=r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+",
+            regex=PATRON_EMAIL,
             score=0.9
         )
         email_recognizer = PatternRecognizer(
@@ -118,7 +238,7 @@ class PresidioUtils:
         # --- Reconocedor de dni ---
         pattern_dni = Pattern(
             name="es_dnu",
-            regex=r"\b\d{1,2}\.?\d{3}\.?\d{3}\b",
+            regex=PATRON_DNI,
             score=0.9
         )
         dni_recognizer = PatternRecognizer(
@@ -131,7 +251,7 @@ class PresidioUtils:
         # --- Reconocedor de nota ---
         pattern_nota = Pattern(
             name="es_nota",
-            regex=r'NOTA-\d{1,6}-\d{1,2}-\d{1,2}',
+            regex=PATRON_NOTA,
             score=0.9
         )
         nota_recognizer = PatternRecognizer(
@@ -144,7 +264,7 @@ class PresidioUtils:
         # --- Reconocedor de IPP ---
         pattern_ipp = Pattern(
             name="es_ipp",
-            regex=r'[A-Za-z]{2}-\d{2}-\d{2}-\d{1,6}-\d{2}[-/]\d{2}',
+            regex=PATRON_IPP,
             score=0.9
         )
         ipp_recognizer = PatternRecognizer(
@@ -154,80 +274,105 @@ class PresidioUtils:
         )
         analyzer.registry.add_recognizer(ipp_recognizer)
 
-        # Crear directorio diccionarios si no existe
-        os.makedirs(self.path_diccionarios, exist_ok=True)            
-
-        # Verifico si existe el archivo nombres.csv en el directorio diccionarios
-        if not os.path.exists(f"{self.path_diccionarios}/nombres.csv"):
-            with open(f"{self.path_diccionarios}/nombres.csv", "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                nombres_example = [ 'Amarillo', 'Irma', 'Pablo','Walter','Juan', 'María', 'Carlos', 'Ana', 'José', 'Laura', 'Pedro', 
-                            'Miguel', 'Carmen', 'Antonio', 'Isabel', 'Francisco', 'Patricia', 'Manuel', 'Rosa','Sofía', 
-                            'Jorge', 'Marta', 'Roberto', 'Lucia', 'Diego', 'Paula', 'Fernando', 'Andrea','Luis', 'Elena',
-                            'Raúl', 'Gabriela', 'Alberto', 'Silvia', 'Ricardo', 'Cristina', 'Eduardo', 'Beatriz', 'María'
-                            'Sergio', 'Mónica', 'Daniel', 'Claudia', 'Martín', 'Sandra', 'Alejandro', 'Teresa', 'Javier',
-                            'Natalia', 'Guillermo', 'Victoria', 'Manuel', 'Paula', 'Fernando', 'Andrea', 'Raúl', 'Gabriela',
-                            'Alberto', 'Silvia', 'Ricardo', 'Cristina', 'Eduardo', 'Beatriz', 'Sergio', 'Mónica', 'Daniel',
-                            'Claudia', 'Martín', 'Sandra', 'Alejandro', 'Teresa', 'Javier', 'Natalia', 'Guillermo', 'Victoria',
-                            'Garcia', 'García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez',
-                            'Pérez', 'Gómez', 'Martín', 'Jiménez', 'Ruiz', 'Hernández', 'Díaz', 'Moreno',
-                            'Álvarez', 'Muñoz', 'Romero', 'Alonso', 'Gutiérrez', 'Navarro', 'Torres',
-                            'Domínguez', 'Vázquez', 'Ramos', 'Gil', 'Ramírez', 'Serrano', 'Blanco', 'Molina'
-                        ]                
-                for nombre in nombres_example:
-                    writer.writerow([nombre]) 
-
-        with open(f"{self.path_diccionarios}/nombres.csv", "r", encoding="utf-8") as f:
-            nombres = [row[0] for row in csv.reader(f)]
-
-        nombres_recognizer = AccentInsensitiveNameRecognizer(
-            supported_entity="CUSTOM_NAME", 
-            deny_list=nombres,
-            supported_language="es"
-        )
+        nombres_recognizer = AccentInsensitiveNameRecognizer(GestorDiccionarios.instancia(), supported_language="es")
         analyzer.registry.add_recognizer(nombres_recognizer)
 
-        entity_map = {
-            "PERSON": "nombres",
-            "URL": "urls",
-            "EMAIL": "emails",
-            "DNI": "dnis",
-            "NOTA": "notas",
-            "IPP": "ipps",
-            "PHONE_NUMBER": "telefonos",
-            "PHONE": "telefonos",
-            "DATE_TIME": "fechas",
-            "CUSTOM_NAME" : "nombres"
-        }        
-
-        # --- Análisis del texto ---
-        results = analyzer.analyze(
-            text=text,
-            entities=["PERSON", "CUSTOM_NAME", "DATE_TIME", "URL", "PHONE_NUMBER", "PHONE", "EMAIL", "DNI", "NOTA", "IPP"],
-            language='es'
-        )
-        # Construcción del mapa de reemplazo
+        return analyzer
+
+    @classmethod
+    def _construir_nlp_engine(cls, backend: str = None) -> TransformersNlpEngine:
+        backend = backend or cls.backend
+        ner_model_configuration = NerModelConfiguration(aggregation_strategy=cls.agregacion, stride=cls.stride)
+        if backend == "torch":
+            return PodadoTransformersNlpEngine(models=cls.model_config, ner_model_configuration=ner_model_configuration)
+
+        from onnx_utils import RUTAS_ONNX, OnnxTransformersNlpEngine
+        if backend not in RUTAS_ONNX:
+            raise ValueError(f"PRESIDIO_BACKEND no reconocido: {backend}. Opciones: torch, {', '.join(RUTAS_ONNX)}")
+        ruta, archivo = DownloadUtils.ruta_onnx(backend)
+        models = [{**model, "model_name": {**model["model_name"], "transformers": ruta}} for model in cls.model_config]
+        return OnnxTransformersNlpEngine(models=models, ner_model_configuration=ner_model_configuration,
+                                         file_name=archivo)
+
+    def detectar(self, text: str) -> list:
+        """
+        Devuelve las Entidad detectadas en el texto (sin reescribir).
+        """
+        analyzer = self.cargar()
+
+        # --- NER (spaCy + transformers) y después los reconocedores ---
+        with etapa("ner", "presidio", caracteres=len(text)):
+            nlp_artifacts = analyzer.nlp_engine.process_text(text, 'es')
+        with etapa("reconocedores", "presidio", caracteres=len(text)):
+            results = analyzer.analyze(
+                text=text,
+                entities=self.entidades_vigentes(),
+                language='es',
+                nlp_artifacts=nlp_artifacts
+            )
+        with etapa("entidades", "presidio") as span:
+            entidades = self._entidades(results)
+            contar_entidades(span, entidades)
+        return entidades
+
+    def detectar_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        """
+        Como `detectar`, pero pasando el NER por lotes (nlp_engine.process_batch),
+        igual que BatchAnalyzerEngine.
+        """
+        analyzer = self.cargar()
+        entidades = self.entidades_vigentes()
+        caracteres = sum(len(text) for text in textos)
+
+        with etapa("ner", "presidio", textos=len(textos), caracteres=caracteres):
+            artefactos = list(analyzer.nlp_engine.process_batch(
+                textos,
+                language='es',
+                batch_size=tamanio_lote or self.tamanio_lote,
+                n_process=procesos or self.procesos,
+            ))
+        with etapa("reconocedores", "presidio", textos=len(textos), caracteres=caracteres):
+            resultados = [
+                analyzer.analyze(text=str(text), entities=entidades, language='es', nlp_artifacts=nlp_artifacts)
+                for text, nlp_artifacts in artefactos
+            ]
+        with etapa("entidades", "presidio", textos=len(textos)) as span:
+            lotes = [self._entidades(results) for results in resultados]
+            contar_entidades(span, [e for lote in lotes for e in lote])
+        return lotes
+
+    def ofuscar(self, text: str):
+        return self.resultado(text, self.detectar(text))
+
+    def ofuscar_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        """
+        Ofusca varios textos pasando el NER por lotes.
+        Devuelve un resultado por texto, con el mismo formato que `ofuscar`.
+        """
+        lotes = self.detectar_lote(textos, tamanio_lote, procesos)
+        return [self.resultado(text, entidades) for text, entidades in zip(textos, lotes)]
+
+    def entidades_vigentes(self) -> list:
+        # Entidades fijas más las de los diccionarios cargados
+        diccionarios = GestorDiccionarios.instancia().matchers()
+        return self.entidades + [e for e in diccionarios if e not in self.entidades]
+
+    def _entidades(self, results: list) -> list:
+        grupos = GestorDiccionarios.instancia().grupos()
+        entidades = []
         for result in results:
-            fragment: str = text[result.start:result.end]
-            #print("result:", result , "valor:", fragment)
-            if (result.score <= 0.5):
+            if (result.score <= self.umbral):
                 continue
-            entity_key = entity_map.get(result.entity_type)
+            entity_key = self.entity_map.get(result.entity_type) or grupos.get(result.entity_type)
             if not entity_key:
                 continue
+            entidades.append(Entidad(result.start, result.end, entity_key, result.entity_type))
+        return entidades
 
-            if entity_key not in mapping:
-                mapping[entity_key] = {}
-
-            hashed = f"{self.apertura}{result.entity_type}_{self.hash_text(fragment)}{self.cierre}"
-            mapping[entity_key][fragment] = hashed
-
-        # Reemplazo en el texto original
-        new_text = text
-        for entity_key, texts in mapping.items():
-            for original_text in sorted(texts.keys(), key=len, reverse=True):
-                new_text = new_text.replace(original_text, texts[original_text])
-
+    def resultado(self, text: str, entidades: list):
+        # Mapeos y texto ofuscado se arman en una sola pasada
+        with etapa("reescritura", "presidio", caracteres=len(text), entidades=len(entidades)):
+            new_text, mapping = ReescrituraUtils(self.apertura, self.cierre).aplicar(text, entidades)
 
         # Retornamos el texto ofuscado y los mapeos
         return {
@@ -0,0 +1,83 @@
+import os
+import re
+
+from diccionario_utils import GestorDiccionarios
+from patrones_utils import (PATRON_CBU, PATRON_DNI, PATRON_EMAIL, PATRON_IPP, PATRON_NOTA, PATRON_TARJETA,
+                            PATRON_TELEFONO, PATRON_URL)
+from reescritura_utils import Entidad, ReescrituraUtils
+
+
+class RapidoUtils:
+    """
+    Motor "rapido": solo identificadores estructurados y diccionarios, sin NER.
+
+    Todos los patrones se combinan en una única expresión regular con grupos con
+    nombre, así el texto se recorre una sola vez. Los diccionarios se buscan con
+    los matchers precompilados del GestorDiccionarios. La salida tiene el mismo
+    formato de `mapeos` que los otros motores, por lo que /desofuscar no cambia.
+    """
+
+    apertura = os.getenv("TAG_APERTURA", "")
+    cierre = os.getenv("TAG_CIERRE", "")
+
+    usa_ner = False
+
+    # grupo de la regex -> (grupo de mapeo, prefijo, patrón). El orden define la
+    # prioridad cuando dos patrones coinciden en la misma posición.
+    field_config = {
+        "email": ("emails", "MAIL", PATRON_EMAIL),
+        "url": ("urls", "URL", PATRON_URL),
+        "ipp": ("ipps", "IPP", PATRON_IPP),
+        "nota": ("notas", "NOTA", PATRON_NOTA),
+        "cbu": ("cbus", "CBU", PATRON_CBU),
+        "credit_card": ("tarjetas", "CREDID_CARD", PATRON_TARJETA),
+        "phone": ("telefonos", "PHONE", PATRON_TELEFONO),
+        "dni": ("dnis", "DNI", PATRON_DNI),
+    }
+
+    prefijos_diccionario = {"CUSTOM_NAME": "NAME"}
+
+    regex = re.compile("|".join(f"(?P<{nombre}>{patron})" for nombre, (_, _, patron) in field_config.items()))
+
+    def __init__(self):
+        pass
+
+    def precargar(self):
+        # Sin modelos: solo los diccionarios compilados
+        GestorDiccionarios.instancia().matchers()
+
+    def configuracion(self) -> dict:
+        # Sin parámetros propios: la salida depende solo de los patrones y diccionarios
+        return {}
+
+    def detectar(self, text: str) -> list:
+        entidades = []
+        for match in self.regex.finditer(text):
+            clave, prefijo, _ = self.field_config[match.lastgroup]
+            entidades.append(Entidad(match.start(), match.end(), clave, prefijo))
+
+        gestor = GestorDiccionarios.instancia()
+        grupos = gestor.grupos()
+        for entidad, matcher in gestor.matchers().items():
+            prefijo = self.prefijos_diccionario.get(entidad, entidad)
+            entidades.extend(Entidad(inicio, fin, grupos[entidad], prefijo) for inicio, fin in matcher.buscar(text))
+        return entidades
+
+    def detectar_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        return [self.detectar(text) for text in textos]
+
+    def resultado(self, text: str, entidades: list):
+        texto_ofuscado, mapeos = ReescrituraUtils(self.apertura, self.cierre).aplicar(text, entidades)
+
+        # Retornamos el texto ofuscado y los mapeos
+        return {
+            "texto_ofuscado": texto_ofuscado,
+            "mapeos": mapeos,
+            "motor": "rapido"
+        }
+
+    def ofuscar(self, text: str):
+        return self.resultado(text, self.detectar(text))
+
+    def ofuscar_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        return [self.ofuscar(text) for text in textos]
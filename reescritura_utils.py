@@ -0,0 +1,82 @@
+import hashlib
+from typing import NamedTuple
+
+
+class Entidad(NamedTuple):
+    """
+    Fragmento detectado en el texto: posición [inicio, fin), grupo de mapeo
+    ("nombres", "dnis", ...) y prefijo del reemplazo ("NAME", "DNI", ...).
+    """
+    inicio: int
+    fin: int
+    clave: str
+    prefijo: str
+
+
+class ReescrituraUtils:
+    """
+    Etapa de reescritura común a los motores: recibe las posiciones que
+    detectaron (filth.beg/end, RecognizerResult.start/end), resuelve los
+    solapamientos y arma el texto ofuscado en una sola pasada lineal.
+    """
+
+    def __init__(self, apertura: str = "", cierre: str = ""):
+        self.apertura = apertura
+        self.cierre = cierre
+
+    @staticmethod
+    def hash_text(cadena: str) -> str:
+        return hashlib.sha256(cadena.encode('utf-8')).hexdigest()[:8]
+
+    @staticmethod
+    def resolver_solapamientos(entidades: list) -> list:
+        """
+        Ordena las entidades por posición y une las que se solapan en una sola
+        que cubre las dos (como MergedFilth en scrubadub), así no queda en claro
+        la cola de una entidad que se solapa en parte con otra ("Juan Carlos" y
+        "Carlos Pérez"). La unión lleva la etiqueta de la más larga, o de la
+        primera si miden lo mismo; las contenidas en otra simplemente se absorben.
+        """
+        resultado = []
+        etiqueta = None
+        for entidad in sorted(entidades, key=lambda e: (e.inicio, -e.fin)):
+            if entidad.inicio >= entidad.fin:
+                continue
+            if resultado and entidad.inicio < resultado[-1].fin:
+                if entidad.fin - entidad.inicio > etiqueta.fin - etiqueta.inicio:
+                    etiqueta = entidad
+                actual = resultado[-1]
+                resultado[-1] = actual._replace(fin=max(actual.fin, entidad.fin),
+                                                clave=etiqueta.clave, prefijo=etiqueta.prefijo)
+                continue
+            resultado.append(entidad)
+            etiqueta = entidad
+        return resultado
+
+    def reemplazo(self, prefijo: str, fragmento: str) -> str:
+        return f"{self.apertura}{prefijo}_{self.hash_text(fragmento)}{self.cierre}"
+
+    def aplicar(self, text: str, entidades: list, mapeos: dict = None):
+        """
+        Reemplaza cada entidad por su marcador y devuelve (texto_ofuscado, mapeos).
+        Solo se reemplazan las posiciones detectadas, nunca otras apariciones.
+        Si se pasa `mapeos`, se completa ese diccionario en lugar de uno nuevo.
+        """
+        if mapeos is None:
+            mapeos = {}
+        partes = []
+        posicion = 0
+
+        for entidad in self.resolver_solapamientos(entidades):
+            fragmento = text[entidad.inicio:entidad.fin]
+            grupo = mapeos.setdefault(entidad.clave, {})
+            marcador = grupo.get(fragmento)
+            if marcador is None:
+                marcador = grupo[fragmento] = self.reemplazo(entidad.prefijo, fragmento)
+
+            partes.append(text[posicion:entidad.inicio])
+            partes.append(marcador)
+            posicion = entidad.fin
+
+        partes.append(text[posicion:])
+        return "".join(partes), mapeos
@@ -1,11 +1,14 @@
 import re
 import os
-import hashlib
+import threading
 import scrubadub
-import spacy
 from scrubadub.filth import Filth
 from scrubadub.detectors.catalogue import register_detector
 from scrubadub.detectors import Detector
+from modelos_utils import ModelosUtils
+from patrones_utils import PATRON_CBU, PATRON_DNI, PATRON_IPP, PATRON_NOTA, PATRON_TARJETA
+from reescritura_utils import Entidad, ReescrituraUtils
+from telemetria_utils import contar_entidades, etapa
 
 # --- Definición de Filths personalizados ---
 class CBUFilth(Filth):
@@ -34,18 +37,61 @@ class ScrubadubUtils:
     @register_detector
     class LocalSpacyDetector(Detector):
         name = "local_spacy"
-        nlp = spacy.load("en_core_web_trf")
+        modelo = os.getenv("SCRUBADUB_MODELO_SPACY", "en_core_web_trf")
 
-        def iter_filth(self, text, document_name=None):
-            doc = self.nlp(text)
-            print("ENTITIES SPACY:")
+        @classmethod
+        def cargar_modelo(cls):
+            # El modelo se carga recién en el primer uso, solo con los componentes
+            # que usa el detector, y se comparte entre requests
+            return ModelosUtils.spacy_motor("scrubadub", cls.modelo)
+
+        @property
+        def nlp(self):
+            return self.cargar_modelo()
+
+        def _filths_doc(self, doc, document_name=None):
             for ent in doc.ents:
-                print(ent.text, ent.label_)
                 if ent.label_ == "PERSON":
-                    yield NameFilth(beg=ent.start_char, end=ent.end_char, text=ent.text)
+                    yield NameFilth(beg=ent.start_char, end=ent.end_char, text=ent.text, document_name=document_name)
                 elif ent.label_ == "DATE":
-                    yield DateFilth(beg=ent.start_char, end=ent.end_char, text=ent.text)
+                    yield DateFilth(beg=ent.start_char, end=ent.end_char, text=ent.text, document_name=document_name)
 
+        def iter_filth(self, text, document_name=None):
+            yield from self._filths_doc(self.nlp(text), document_name)
+
+        def iter_filth_documents(self, document_list, document_names, batch_size=None, n_process=None):
+            # Inferencia por lotes con nlp.pipe en lugar de un forward pass por texto
+            docs = self.nlp.pipe(
+                document_list,
+                batch_size=batch_size or ScrubadubUtils.tamanio_lote,
+                n_process=n_process or ScrubadubUtils.procesos,
+            )
+            for doc, document_name in zip(docs, document_names):
+                yield from self._filths_doc(doc, document_name)
+
+
+    # Scrubber y detector de spaCy compartidos por el proceso, se arman en el primer uso
+    _scrubber = None
+    _detector_spacy = None
+    _lock = threading.Lock()
+
+    tamanio_lote = int(os.getenv("OFUSCAR_LOTE_TAMANIO", "32"))
+    procesos = int(os.getenv("OFUSCAR_LOTE_PROCESOS", "1"))
+
+    field_config = {
+        "name": {"output": "nombres", "prefix": "NAME"},
+        "phone": {"output": "telefonos", "prefix": "PHONE"},
+        "email": {"output": "emails", "prefix": "MAIL"},
+        "cbu": {"output": "cbus", "prefix": "CBU"},
+        "url": {"output": "urls", "prefix": "URL"},
+        "credit_card": {"output": "tarjetas", "prefix": "CREDID_CARD"},
+        "dni": {"output": "dnis", "prefix": "DNI"},
+        "ipp": {"output": "ipps", "prefix": "IPP"},
+        "nota": {"output": "notas", "prefix": "NOTA"},
+        "date": {"output": "fechas", "prefix": "DATE"},
+    }
+
+    usa_ner = True
 
     def __init__(self):
         pass
@@ -54,84 +100,132 @@ class ScrubadubUtils:
     class CBUDetector(scrubadub.detectors.RegexDetector):
         name = 'cbu_detector'
         filth_cls = CBUFilth
-        regex = re.compile(r"\b\d{22}\b")
+        regex = re.compile(PATRON_CBU)
 
     class CreditCardDetector(scrubadub.detectors.RegexDetector):
         name = 'creditCard_detector'
         filth_cls = CreditCardFilth
-        regex = re.compile(r"\d{4}[- ]\d{4}[- ]\d{4}[- ]\d{4}")
+        regex = re.compile(PATRON_TARJETA)
 
     class DNIDetector(scrubadub.detectors.RegexDetector):
         name = 'dni_detector'
         filth_cls = DNIFilth
-        regex = re.compile(r"\b\d{1,2}\.?\d{3}\.?\d{3}\b")
+        regex = re.compile(PATRON_DNI)
 
     class NOTADetector(scrubadub.detectors.RegexDetector):
         name = 'nota_detector'
         filth_cls = NOTAFilth
-        regex = re.compile(r'NOTA-\d{1,6}-\d{1,2}-\d{1,2}')
+        regex = re.compile(PATRON_NOTA)
 
     class IPPDetector(scrubadub.detectors.RegexDetector):
         name = 'ipp_detector'
         filth_cls = IPPFilth
-        regex = re.compile(r'[A-Za-z]{2}-\d{2}-\d{2}-\d{1,6}-\d{2}[-/]\d{2}')
+        regex = re.compile(PATRON_IPP)
 
     apertura = os.getenv("TAG_APERTURA", "")
     cierre = os.getenv("TAG_CIERRE", "")
 
-    def ofuscar(self, text: str):
-        field_config = {
-            "name": {"output": "nombres", "prefix": "NAME"},
-            "phone": {"output": "telefonos", "prefix": "PHONE"},
-            "email": {"output": "emails", "prefix": "MAIL"},
-            "cbu": {"output": "cbus", "prefix": "CBU"},
-            "url": {"output": "urls", "prefix": "URL"},
-            "credit_card": {"output": "tarjetas", "prefix": "CREDID_CARD"},
-            "dni": {"output": "dnis", "prefix": "DNI"},
-            "ipp": {"output": "ipps", "prefix": "IPP"},
-            "nota": {"output": "notas", "prefix": "NOTA"},
-            "date": {"output": "fechas", "prefix": "DATE"},
-        }
-
-        # --- Inicialización ---
+    @classmethod
+    def cargar(cls) -> scrubadub.Scrubber:
+        """
+        Devuelve el Scrubber compartido, configurándolo en el primer uso.
+        El modelo de spaCy no se carga hasta que el detector lo necesita.
+        """
+        scrubber = cls._scrubber
+        if scrubber is None:
+            with cls._lock:
+                if cls._scrubber is None:
+                    with etapa("construccion", "scrubadub"):
+                        cls._detector_spacy = cls.LocalSpacyDetector()
+                        cls._scrubber = cls._construir_scrubber()
+                scrubber = cls._scrubber
+        return scrubber
+
+    def precargar(self):
+        """
+        Configura el Scrubber y carga el modelo de spaCy antes del primer uso.
+        """
+        self.cargar()
+        self.LocalSpacyDetector.cargar_modelo()
+
+    def configuracion(self) -> dict:
+        """
+        Configuración efectiva del motor que cambia su salida (forma parte de la
+        clave de CacheResultados).
+        """
+        return {"modelo": self.LocalSpacyDetector.modelo, "spacy": ModelosUtils.componentes_spacy("scrubadub")}
+
+    @classmethod
+    def _construir_scrubber(cls) -> scrubadub.Scrubber:
+        # El detector de spaCy queda fuera del Scrubber para poder pasarle
+        # el tamaño de lote y la cantidad de procesos de cada llamada
         scrubber = scrubadub.Scrubber(locale="es_AR")
-        scrubber.add_detector(self.LocalSpacyDetector())
-        scrubber.add_detector(self.CBUDetector)
-        scrubber.add_detector(self.CreditCardDetector)
-        scrubber.add_detector(self.DNIDetector)
-        scrubber.add_detector(self.NOTADetector)
-        scrubber.add_detector(self.IPPDetector)
-
-        temp_maps = {
-        }
-
-        try:
-            filths = list(scrubber.iter_filth(text))
-        except:
-            filths = []
-    
+        scrubber.add_detector(cls.CBUDetector)
+        scrubber.add_detector(cls.CreditCardDetector)
+        scrubber.add_detector(cls.DNIDetector)
+        scrubber.add_detector(cls.NOTADetector)
+        scrubber.add_detector(cls.IPPDetector)
+        return scrubber
+
+    def _filths_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        scrubber = self.cargar()
+        nombres = [str(i) for i in range(len(textos))]
+        filths = {nombre: [] for nombre in nombres}
+
+        caracteres = sum(len(text) for text in textos)
+        # Un error se propaga: devolver el lote sin detecciones dejaría los datos sin ofuscar
+        with etapa("regex", "scrubadub", textos=len(textos), caracteres=caracteres):
+            for filth in scrubber.iter_filth_documents(documents=dict(zip(nombres, textos))):
+                filths[filth.document_name].append(filth)
+        with etapa("ner", "scrubadub", textos=len(textos), caracteres=caracteres):
+            for filth in self._detector_spacy.iter_filth_documents(textos, nombres, tamanio_lote, procesos):
+                filths[filth.document_name].append(filth)
+
+        return [filths[nombre] for nombre in nombres]
+
+    def _entidades(self, filths: list) -> list:
+        entidades = []
         for filth in filths:
-            # Procesar solo si el tipo está en la configuración
-            config = field_config.get(filth.type, None)
-            if config:
-                original_text = filth.text
-
-                key = config["output"]
-                if key not in temp_maps:
-                    temp_maps[key] = {}
-
-                text_map = temp_maps[key]
-                prefix = config["prefix"]
-
-                if original_text not in text_map:
-                    unique_id = hashlib.sha256(original_text.encode('utf-8')).hexdigest()[:8]
-                    text_map[original_text] = f"{self.apertura}{prefix}_{unique_id}{self.cierre}"
-
-                text = text.replace(original_text, text_map[original_text])
+            # Los MergedFilth del Scrubber se abren: los solapamientos se resuelven al reescribir
+            for parte in getattr(filth, "filths", [filth]):
+                # Procesar solo si el tipo está en la configuración
+                config = self.field_config.get(parte.type, None)
+                if config:
+                    entidades.append(Entidad(parte.beg, parte.end, config["output"], config["prefix"]))
+        return entidades
+
+    def resultado(self, text: str, entidades: list):
+        # Mapeos y texto ofuscado se arman en una sola pasada
+        with etapa("reescritura", "scrubadub", caracteres=len(text), entidades=len(entidades)):
+            texto_ofuscado, temp_maps = ReescrituraUtils(self.apertura, self.cierre).aplicar(text, entidades)
 
         # Retornamos el texto ofuscado y los mapeos
         return {
-            "texto_ofuscado": text,
+            "texto_ofuscado": texto_ofuscado,
             "mapeos": temp_maps,
             "motor": "scrubadub"
         }
+
+    def detectar(self, text: str) -> list:
+        return self.detectar_lote([text])[0]
+
+    def detectar_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        """
+        Devuelve, por cada texto, la lista de Entidad detectadas (sin reescribir).
+        """
+        lotes = self._filths_lote(textos, tamanio_lote, procesos)
+        with etapa("entidades", "scrubadub", textos=len(textos)) as span:
+            entidades = [self._entidades(filths) for filths in lotes]
+            contar_entidades(span, [e for lote in entidades for e in lote])
+        return entidades
+
+    def ofuscar(self, text: str):
+        return self.resultado(text, self.detectar(text))
+
+    def ofuscar_lote(self, textos: list, tamanio_lote: int = None, procesos: int = None) -> list:
+        """
+        Ofusca varios textos corriendo el NER de spaCy por lotes (nlp.pipe).
+        Devuelve un resultado por texto, con el mismo formato que `ofuscar`.
+        """
+        lotes = self.detectar_lote(textos, tamanio_lote, procesos)
+        return [self.resultado(text, entidades) for text, entidades in zip(textos, lotes)]
@@ -0,0 +1,97 @@
+import os
+
+from reescritura_utils import ReescrituraUtils
+
+
+class OfuscadorStreaming:
+    """
+    Ofusca un documento largo por fragmentos, a medida que llega el texto.
+
+    El texto se corta en límites de párrafo u oración. Cada fragmento se analiza
+    junto con `solapamiento` caracteres del fragmento anterior (contexto) y del
+    siguiente (anticipo), así el NER ve el entorno y una entidad que cruza el
+    corte se detecta entera: el corte se corre hasta el final de esa entidad.
+
+    Los marcadores son deterministas, por lo que el mapeo es consistente entre
+    fragmentos. Cada resultado trae solo los mapeos nuevos, y la memoria queda
+    acotada al fragmento en curso más el conjunto de fragmentos ya mapeados.
+    """
+
+    tamanio_fragmento = int(os.getenv("STREAM_TAMANIO_FRAGMENTO", "4000"))
+    solapamiento = int(os.getenv("STREAM_SOLAPAMIENTO", "200"))
+
+    # Límites preferidos para cortar, de mejor a peor
+    separadores = ("\n\n", "\n", ". ", "? ", "! ", "; ", " ")
+
+    def __init__(self, ofuscador, tamanio_fragmento: int = None, solapamiento: int = None):
+        self.ofuscador = ofuscador
+        self.tamanio_fragmento = self.tamanio_fragmento if tamanio_fragmento is None else tamanio_fragmento
+        if self.tamanio_fragmento <= 0:
+            raise ValueError(f"tamanio_fragmento debe ser mayor que 0 (es {self.tamanio_fragmento})")
+        # Sin solapamiento explícito, el de STREAM_SOLAPAMIENTO acotado al tamaño del fragmento
+        self.solapamiento = min(self.solapamiento, self.tamanio_fragmento // 4) if solapamiento is None else solapamiento
+        if not 0 <= self.solapamiento < self.tamanio_fragmento:
+            raise ValueError(f"solapamiento debe estar entre 0 y tamanio_fragmento - 1 (es {self.solapamiento})")
+        self.reescritura = ReescrituraUtils(ofuscador.apertura, ofuscador.cierre)
+        self._buffer = ""
+        self._contexto = ""
+        self._vistos = {}
+
+    def _corte(self) -> int:
+        minimo = self.tamanio_fragmento * 3 // 4
+        for separador in self.separadores:
+            posicion = self._buffer.rfind(separador, minimo, self.tamanio_fragmento)
+            if posicion != -1:
+                return posicion + len(separador)
+        return self.tamanio_fragmento
+
+    def _procesar(self, final: bool) -> dict:
+        corte = len(self._buffer) if final else self._corte()
+        ventana = self._contexto + self._buffer[:corte + self.solapamiento]
+        desplazamiento = len(self._contexto)
+
+        # Unidas antes de mover el corte: una unión que lo cruza se emite entera
+        entidades = ReescrituraUtils.resolver_solapamientos([
+            e._replace(inicio=e.inicio - desplazamiento, fin=e.fin - desplazamiento)
+            for e in self.ofuscador.detectar(ventana)
+            if e.inicio >= desplazamiento
+        ])
+
+        # Una entidad que cruza el corte se emite completa en este fragmento
+        for entidad in entidades:
+            if entidad.inicio < corte < entidad.fin:
+                corte = entidad.fin
+
+        fragmento = self._buffer[:corte]
+        texto_ofuscado, mapeos = self.reescritura.aplicar(fragmento, [e for e in entidades if e.fin <= corte])
+
+        nuevos = {}
+        for clave, grupo in mapeos.items():
+            vistos = self._vistos.setdefault(clave, set())
+            for original, reemplazo in grupo.items():
+                if original not in vistos:
+                    vistos.add(original)
+                    nuevos.setdefault(clave, {})[original] = reemplazo
+
+        self._contexto = fragmento[-self.solapamiento:] if self.solapamiento else ""
+        self._buffer = self._buffer[corte:]
+        return {"texto_ofuscado": texto_ofuscado, "mapeos": nuevos}
+
+    def alimentar(self, texto: str) -> list:
+        """
+        Agrega texto y devuelve los fragmentos que ya se pueden emitir.
+        """
+        self._buffer += texto
+        resultados = []
+        while len(self._buffer) >= self.tamanio_fragmento + self.solapamiento:
+            resultados.append(self._procesar(final=False))
+        return resultados
+
+    def finalizar(self, texto: str = "") -> list:
+        """
+        Procesa el texto pendiente y devuelve los últimos fragmentos.
+        """
+        resultados = self.alimentar(texto)
+        if self._buffer:
+            resultados.append(self._procesar(final=True))
+        return resultados
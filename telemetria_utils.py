@@ -0,0 +1,66 @@
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from opentelemetry import metrics, trace
+
+tracer = trace.get_tracer(__name__)
+meter = metrics.get_meter(__name__)
+duracion_etapa = meter.create_histogram(
+    name="ofuscar_etapa_duracion",
+    description="Duración de cada etapa del pipeline de ofuscación",
+    unit="ms",
+)
+
+# TELEMETRIA_ETAPAS=0 desactiva los spans e histogramas por etapa
+activa = os.getenv("TELEMETRIA_ETAPAS", "1") == "1"
+
+
+class _EtapaNula:
+    """Lo que devuelve `etapa` con la telemetría desactivada: no hace nada."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, clave, valor):
+        pass
+
+
+_ETAPA_NULA = _EtapaNula()
+
+
+@contextmanager
+def _etapa(nombre: str, motor: str, atributos: dict):
+    inicio = time.perf_counter()
+    with tracer.start_as_current_span(f"{motor}.{nombre}", attributes={"motor": motor, **atributos}) as span:
+        try:
+            yield span
+        finally:
+            duracion_etapa.record((time.perf_counter() - inicio) * 1000, {"motor": motor, "etapa": nombre})
+
+
+def etapa(nombre: str, motor: str, **atributos):
+    """
+    Span hijo `<motor>.<nombre>` más una medición del histograma
+    ofuscar_etapa_duracion con los atributos motor y etapa. Se usa como
+    `with etapa("ner", "presidio", caracteres=len(text)) as span: ...`
+    """
+    if not activa:
+        return _ETAPA_NULA
+    return _etapa(nombre, motor, atributos)
+
+
+def contar_entidades(span, entidades: list):
+    """
+    Agrega al span la cantidad total de entidades y la cantidad por clave
+    (entidades.nombres, entidades.dnis, ...).
+    """
+    if not activa:
+        return
+    span.set_attribute("entidades", len(entidades))
+    for clave, cantidad in Counter(e.clave for e in entidades).items():
+        span.set_attribute(f"entidades.{clave}", cantidad)
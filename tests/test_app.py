@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+
+from fastapi.testclient import TestClient
+
+from app import app
+
+cliente = TestClient(app)
+
+
+def test_desofuscar_con_la_boveda_requiere_el_token():
+    ofuscado = cliente.post("/ofuscar", json={
+        "texto": "Escribime a pepe@argento.com", "motor": "rapido", "conversacion_id": "chat-token",
+    }).json()
+    token = ofuscado["token_conversacion"]
+    datos = {"texto_ofuscado": ofuscado["texto_ofuscado"], "conversacion_id": "chat-token"}
+
+    assert cliente.post("/desofuscar", json=datos).status_code == 404
+    assert cliente.post("/desofuscar", json=datos, headers={"X-Token-Conversacion": "otro"}).status_code == 404
+    respuesta = cliente.post("/desofuscar", json=datos, headers={"X-Token-Conversacion": token})
+    assert respuesta.json() == {"texto_desofuscado": "Escribime a pepe@argento.com"}
+
+    fragmento = {"conversacion_id": "chat-token", "sesion": "m1", "fragmento": ofuscado["texto_ofuscado"], "fin": True}
+    assert cliente.post("/desofuscar/fragmento", json=fragmento).status_code == 404
+    respuesta = cliente.post("/desofuscar/fragmento", json=fragmento, headers={"X-Token-Conversacion": token})
+    assert respuesta.json() == {"texto": "Escribime a pepe@argento.com"}
+
+    stream = cliente.post("/desofuscar/stream?conversacion_id=chat-token", content=ofuscado["texto_ofuscado"])
+    assert stream.status_code == 404
+
+
+def test_un_jsonl_invalido_a_mitad_de_archivo_termina_con_un_registro_de_error():
+    cuerpo = '{"email": "pepe@argento.com"}\n{"email": \n{"email": "ana@argento.com"}\n'
+    respuesta = cliente.post("/ofuscar/archivo?formato=jsonl&columnas=email&motor=rapido", content=cuerpo)
+
+    assert respuesta.status_code == 200
+    *filas, ultima = [json.loads(linea) for linea in respuesta.text.splitlines()]
+    assert "error" in ultima and ultima["filas"] == len(filas)
+    assert all("pepe@argento.com" not in json.dumps(fila) for fila in filas)
+
+
+def test_un_csv_que_termina_dentro_de_comillas_termina_con_un_registro_de_error():
+    cuerpo = 'nombre,email\nPepe,pepe@argento.com\nAna,"ana@argento.com\n'
+    respuesta = cliente.post("/ofuscar/archivo?columnas=email&motor=rapido", content=cuerpo)
+
+    assert respuesta.status_code == 200
+    registros = list(csv.reader(io.StringIO(respuesta.text)))
+    assert registros[0] == ["nombre", "email"]
+    assert registros[-1][0] == "#ERROR" and "comillas" in registros[-1][1]
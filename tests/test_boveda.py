@@ -0,0 +1,40 @@
+from boveda_utils import BovedaMapeos
+from desofuscar_utils import DesofuscarUtils
+
+
+def desofuscar(boveda: BovedaMapeos, conversacion_id: str, token: str, texto: str) -> str:
+    version, marcadores = boveda.obtener(conversacion_id, token)
+    return DesofuscarUtils().desofuscar(texto, clave=f"boveda:{conversacion_id}:{version}", marcadores=marcadores)
+
+
+def test_marcadores_distintos_para_el_mismo_dato_se_conservan():
+    boveda = BovedaMapeos(path_disco="")
+    token = boveda.crear("chat")
+    boveda.fusionar("chat", {"nombres": {"Juan Pérez": "{{PERSON_51c4ad29}}"}})
+    total = boveda.fusionar("chat", {"nombres": {"Juan Pérez": "{{CUSTOM_NAME_51c4ad29}}"}})
+
+    assert total == 2
+    texto = "Hola {{PERSON_51c4ad29}}, soy {{CUSTOM_NAME_51c4ad29}}"
+    assert desofuscar(boveda, "chat", token, texto) == "Hola Juan Pérez, soy Juan Pérez"
+
+
+def test_marcadores_sobreviven_al_desalojo_a_disco(tmp_path):
+    boveda = BovedaMapeos(max_conversaciones=1, path_disco=str(tmp_path / "boveda.db"))
+    token_a, token_b = boveda.crear("a"), boveda.crear("b")
+    boveda.fusionar("a", {"nombres": {"Juan Pérez": "{{PERSON_51c4ad29}}"}})
+    boveda.fusionar("b", {"emails": {"pepe@argento.com": "{{EMAIL_0a1b2c3d}}"}})
+    boveda.fusionar("a", {"nombres": {"Juan Pérez": "{{CUSTOM_NAME_51c4ad29}}"}})
+
+    assert desofuscar(boveda, "a", token_a, "{{PERSON_51c4ad29}} {{CUSTOM_NAME_51c4ad29}}") == "Juan Pérez Juan Pérez"
+    assert desofuscar(boveda, "b", token_b, "{{EMAIL_0a1b2c3d}}") == "pepe@argento.com"
+
+
+def test_sin_el_token_no_se_leen_los_marcadores():
+    boveda = BovedaMapeos(path_disco="")
+    token = boveda.crear("chat")
+    boveda.fusionar("chat", {"nombres": {"Juan Pérez": "{{PERSON_51c4ad29}}"}})
+
+    assert boveda.crear("chat") is None
+    assert boveda.obtener("chat", None) is None
+    assert boveda.obtener("chat", token[:-1] + "x") is None
+    assert boveda.obtener("chat", token)[1] == {"{{PERSON_51c4ad29}}": "Juan Pérez"}
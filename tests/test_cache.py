@@ -0,0 +1,40 @@
+import asyncio
+
+from cache_utils import CacheResultados
+
+
+def test_la_configuracion_del_motor_cambia_la_clave(tmp_path):
+    path = str(tmp_path / "cache.db")
+    torch = {"backend": "torch", "umbral": 0.5}
+    onnx = {"backend": "onnx-int8", "umbral": 0.5}
+    clave_torch = CacheResultados.clave("Hola Juan", "presidio", "dic", "{{", "}}", torch)
+
+    CacheResultados(path_disco=path).guardar(clave_torch, {"texto_ofuscado": "Hola {{PERSON_1}}"})
+    # Tras un reinicio con otro backend, el nivel en disco no devuelve el resultado anterior
+    reiniciada = CacheResultados(path_disco=path)
+    assert reiniciada.obtener(CacheResultados.clave("Hola Juan", "presidio", "dic", "{{", "}}", onnx)) is None
+    assert reiniciada.obtener(clave_torch) == {"texto_ofuscado": "Hola {{PERSON_1}}"}
+
+
+def test_buscar_y_almacenar_usan_la_memoria_y_el_disco(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = CacheResultados(path_disco=path)
+    asyncio.run(cache.almacenar([("a", {"texto_ofuscado": "A"}), ("b", {"texto_ofuscado": "B"})]))
+
+    # Otra instancia (un reinicio) solo los tiene en disco y los sube a memoria al buscarlos
+    reiniciada = CacheResultados(path_disco=path)
+    assert reiniciada.obtener_memoria("a") is None
+    assert asyncio.run(reiniciada.buscar(["a", "c", "b"])) == [{"texto_ofuscado": "A"}, None, {"texto_ofuscado": "B"}]
+    assert reiniciada.obtener_memoria("b") == {"texto_ofuscado": "B"}
+
+
+def test_el_disco_se_poda_por_intervalo_y_no_en_cada_escritura(tmp_path):
+    cache = CacheResultados(path_disco=str(tmp_path / "cache.db"))
+    cache.max_entradas_disco = 1
+    cache.guardar("a", {"texto_ofuscado": "A"})
+    cache.guardar("b", {"texto_ofuscado": "B"})
+    assert cache._disco.execute("SELECT COUNT(*) FROM resultados").fetchone()[0] == 2
+
+    cache.intervalo_poda = 0
+    cache.guardar("c", {"texto_ofuscado": "C"})
+    assert cache._disco.execute("SELECT clave FROM resultados").fetchall() == [("c",)]
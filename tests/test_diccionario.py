@@ -0,0 +1,27 @@
+import json
+import os
+
+from diccionario_utils import MatcherDiccionario
+
+
+def test_el_indice_es_json_y_se_reutiliza(tmp_path):
+    ruta_csv = tmp_path / "nombres.csv"
+    ruta_csv.write_text("Juan Pérez\nMaría\n", encoding="utf-8")
+
+    matcher = MatcherDiccionario.desde_csv(str(ruta_csv))
+    with open(MatcherDiccionario.ruta_indice(str(ruta_csv)), encoding="utf-8") as f:
+        assert sorted(json.load(f)["frases"]) == ["juan perez", "maria"]
+
+    reutilizado = MatcherDiccionario.desde_csv(str(ruta_csv))
+    assert reutilizado.frases == matcher.frases
+    assert reutilizado.buscar("Hola juan perez") == [(5, 15)]
+
+
+def test_un_indice_corrupto_se_reconstruye(tmp_path):
+    ruta_csv = tmp_path / "nombres.csv"
+    ruta_csv.write_text("María\n", encoding="utf-8")
+    with open(MatcherDiccionario.ruta_indice(str(ruta_csv)), "wb") as f:
+        f.write(b"\x80\x04\x95 no es un indice")
+
+    assert MatcherDiccionario.desde_csv(str(ruta_csv)).buscar("Soy Maria") == [(4, 9)]
+    assert os.path.getsize(MatcherDiccionario.ruta_indice(str(ruta_csv))) > 0
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from inferencia_utils import EjecutorInferencia, PlanificadorLotes
+
+
+def test_un_texto_que_falla_no_deja_sin_detecciones_al_resto_del_lote():
+    lotes = []
+
+    def detectar_lote(textos):
+        lotes.append(list(textos))
+        if "roto" in textos:
+            raise RuntimeError("falló el NER")
+        return [[texto.upper()] for texto in textos]
+
+    async def correr():
+        planificador = PlanificadorLotes("prueba", detectar_lote, EjecutorInferencia(workers=1, cola_max=8))
+        planificador.espera_ms = 50
+        return await asyncio.gather(*(planificador.detectar(t) for t in ("hola", "roto", "chau")),
+                                    return_exceptions=True)
+
+    hola, roto, chau = asyncio.run(correr())
+
+    assert lotes[0] == ["hola", "roto", "chau"]
+    assert hola == ["HOLA"] and chau == ["CHAU"]
+    assert isinstance(roto, RuntimeError)
+
+
+def test_un_lote_de_un_solo_texto_propaga_el_error():
+    def detectar_lote(textos):
+        raise RuntimeError("falló el NER")
+
+    async def correr():
+        planificador = PlanificadorLotes("prueba", detectar_lote, EjecutorInferencia(workers=1, cola_max=8))
+        return await planificador.detectar("hola")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(correr())
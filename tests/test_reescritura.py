@@ -0,0 +1,20 @@
+from reescritura_utils import Entidad, ReescrituraUtils
+
+
+def test_entidades_solapadas_en_parte_se_unen():
+    texto = "Firmó Juan Carlos Pérez ayer"
+    entidades = [Entidad(6, 17, "nombres", "CUSTOM_NAME"), Entidad(11, 23, "nombres", "PERSON")]
+
+    ofuscado, mapeos = ReescrituraUtils("{{", "}}").aplicar(texto, entidades)
+
+    assert "Pérez" not in ofuscado
+    assert mapeos == {"nombres": {"Juan Carlos Pérez": ReescrituraUtils("{{", "}}").reemplazo("PERSON", "Juan Carlos Pérez")}}
+
+
+def test_union_lleva_la_etiqueta_de_la_mas_larga_y_absorbe_las_contenidas():
+    entidades = [Entidad(0, 4, "nombres", "NAME"), Entidad(2, 12, "direcciones", "ADDRESS"),
+                 Entidad(5, 7, "dnis", "DNI"), Entidad(12, 15, "emails", "EMAIL")]
+
+    resultado = ReescrituraUtils.resolver_solapamientos(entidades)
+
+    assert resultado == [Entidad(0, 12, "direcciones", "ADDRESS"), Entidad(12, 15, "emails", "EMAIL")]
@@ -11,7 +11,8 @@ export class OfuscarManager {
   http = inject(HttpClient);
   
   ofuscar(texto: string, motor?: string) : Observable<Ofuscar> {
-    return this.http.post<Ofuscar>(environment.URL_API + '/ofuscar', { texto, motor});
+    // incremental: el servidor solo vuelve a analizar los párrafos editados
+    return this.http.post<Ofuscar>(environment.URL_API + '/ofuscar', { texto, motor, incremental: true });
   }
 
   desofuscar(texto: Ofuscar) : Observable<Desofuscar> {